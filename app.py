@@ -88,4 +88,8 @@ log.addFilter(NoSuccessfulRequestLoggingFilter())
 
 
 if __name__ == "__main__":
+    # 模型加载并预热完成后才开始监听端口
+    from core.utils.embedding import preload_models
+
+    preload_models()
     app.run(host="0.0.0.0", port=config_data.get("server", {}).get("port", 5000))
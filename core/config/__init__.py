@@ -15,6 +15,7 @@ database_config = config_data.get("database", {})
 vector_config = config_data.get("vector", {})
 sql_store_config = config_data.get("sql_store", {})
 embeddings_config = config_data.get("embeddings", {"models": []})
+reranker_config = config_data.get("reranker", {})
 proxy_config = config_data.get("proxy", {})
 internal_minio_endpoint = config_data.get("internal_minio_endpoint", None)
 
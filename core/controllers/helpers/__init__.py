@@ -1,19 +1,18 @@
 from flask import request, jsonify
 from flask_restx import Resource
-from core.utils import ROOT_FOLDER
-from core.utils.embedding import SUPPORTED_EMBEDDING_MODELS, generate_embedding_of_model
+from core.utils.embedding import (
+    SUPPORTED_EMBEDDING_MODELS,
+    generate_embedding_of_model,
+    generate_query_embedding,
+    model_registry,
+)
+from core.utils.embedding.cache import get_embedding_cache
+from core.utils.embedding.client import encode_vectors
+from core.utils.reranker import compute_rerank_scores, top_k_indexes
+from core.utils.reranker.cache import get_rerank_score_cache
+from core.storage.vectorstore.search_cache import get_search_result_cache
 from core.utils.oss.aliyunoss import AliyunOSSClient
 from core.utils.oss.tos import TOSClient
-import os
-from FlagEmbedding import FlagReranker
-import json
-import numpy as np
-
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
 
 
 def register(api):
@@ -28,6 +27,43 @@ def register(api):
             """List all supported embedding models"""
             return jsonify({"data": SUPPORTED_EMBEDDING_MODELS})
 
+    @helpers_ns.route("/loaded-models")
+    class LoadedModels(Resource):
+        @helpers_ns.doc("get_loaded_models")
+        def get(self):
+            """List models loaded in this process"""
+            return model_registry.stats()
+
+    @helpers_ns.route("/embedding-cache")
+    class EmbeddingCacheStats(Resource):
+        @helpers_ns.doc("get_embedding_cache_stats")
+        def get(self):
+            """Get embedding cache hit/miss stats"""
+            cache = get_embedding_cache()
+            if cache is None:
+                return {"enabled": False}
+            return {"enabled": True, **cache.stats()}
+
+    @helpers_ns.route("/rerank-cache")
+    class RerankCacheStats(Resource):
+        @helpers_ns.doc("get_rerank_cache_stats")
+        def get(self):
+            """Get reranker score cache hit/miss stats"""
+            cache = get_rerank_score_cache()
+            if cache is None:
+                return {"enabled": False}
+            return {"enabled": True, **cache.stats()}
+
+    @helpers_ns.route("/search-cache")
+    class SearchCacheStats(Resource):
+        @helpers_ns.doc("get_search_cache_stats")
+        def get(self):
+            """Get search result cache hit/miss stats"""
+            cache = get_search_result_cache()
+            if cache is None:
+                return {"enabled": False}
+            return {"enabled": True, **cache.stats()}
+
     @helpers_ns.route("/oss-connection")
     class OssConnection(Resource):
         """Shows a list of all todos, and lets you POST to add new tasks"""
@@ -168,23 +204,8 @@ def register(api):
             array = input_data.get("array")
             top_k = input_data.get("topK")
 
-            model_or_path = (
-                os.path.join(ROOT_FOLDER, "models/bge-reranker-large")
-                if os.path.exists(
-                    os.path.join(ROOT_FOLDER, "models/bge-reranker-large")
-                )
-                else "BAAI/bge-reranker-large"
-            )
-            reranker = FlagReranker(model_or_path, use_fp16=True)
-            args = [[query, item] for item in array]
-
-            scores = reranker.compute_score(args)
-            sorted_array = [
-                item for score, item in sorted(zip(scores, array), reverse=True)
-            ]
-
-            if top_k != None:
-                sorted_array = sorted_array[:top_k]
+            scores = compute_rerank_scores(query, array)
+            sorted_array = [array[i] for i in top_k_indexes(scores, top_k)]
             return {
                 "scores": scores,
                 "sortedArray": sorted_array,
@@ -259,10 +280,138 @@ def register(api):
             input_data = request.json
             text = input_data.get("text")
             embeddingModel = input_data.get("embeddingModel")
-            vector = generate_embedding_of_model(
-                embeddingModel, [text]
-            )[0]
-            json_dump = json.dumps(vector, cls=NumpyEncoder)
+            vector = generate_query_embedding(embeddingModel, text)
+            return {
+                "vector": vector.tolist(),
+            }
+
+    @helpers_ns.route("/texts-to-embeddings")
+    class TextsToEmbeddings(Resource):
+        @helpers_ns.doc("texts_to_embeddings")
+        @helpers_ns.vendor(
+            {
+                "x-monkey-tool-name": "texts_to_embeddings",
+                "x-monkey-tool-categories": ["query", "text"],
+                "x-monkey-tool-display-name": {
+                    "zh-CN": "批量文本转向量",
+                    "en-US": "Texts to Embeddings",
+                },
+                "x-monkey-tool-description": {
+                    "zh-CN": "将一组文本批量转换为向量",
+                    "en-US": "Convert a list of texts to embeddings in one request",
+                },
+                "x-monkey-tool-icon": "emoji:💿:#e58c3a",
+                "x-monkey-tool-input": [
+                    {
+                        "displayName": {
+                            "zh-CN": "文本列表",
+                            "en-US": "Text List",
+                        },
+                        "name": "texts",
+                        "type": "string",
+                        "required": True,
+                        "typeOptions": {
+                            "multipleValues": True,
+                        },
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "Embedding Model",
+                            "en-US": "Embedding Model",
+                        },
+                        "name": "embeddingModel",
+                        "type": "options",
+                        "options": [
+                            {
+                                "name": item.get("displayName"),
+                                "value": item.get("name"),
+                                "disabled": not item.get("enabled"),
+                            }
+                            for item in SUPPORTED_EMBEDDING_MODELS
+                        ],
+                        "default": SUPPORTED_EMBEDDING_MODELS[0].get("name"),
+                        "required": True,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "输出格式",
+                            "en-US": "Output Format",
+                        },
+                        "name": "outputFormat",
+                        "type": "options",
+                        "options": [
+                            {"name": "float", "value": "float"},
+                            {"name": "base64 (float32)", "value": "base64"},
+                        ],
+                        "default": "float",
+                        "required": False,
+                    },
+                ],
+                "x-monkey-tool-output": [
+                    {
+                        "name": "vectors",
+                        "displayName": {
+                            "zh-CN": "向量列表",
+                            "en-US": "Vector List",
+                        },
+                        "type": "collection",
+                    },
+                    {
+                        # 仅在 outputFormat 为 base64 时返回，此时没有 vectors
+                        "name": "vectorsBase64",
+                        "displayName": {
+                            "zh-CN": "向量 (base64)",
+                            "en-US": "Vectors (base64)",
+                        },
+                        "type": "json",
+                        "properties": [
+                            {
+                                "name": "dtype",
+                                "displayName": {
+                                    "zh-CN": "数据类型",
+                                    "en-US": "Data Type",
+                                },
+                                "type": "string",
+                            },
+                            {
+                                "name": "shape",
+                                "displayName": {
+                                    "zh-CN": "形状",
+                                    "en-US": "Shape",
+                                },
+                                "type": "number",
+                                "typeOptions": {
+                                    "multipleValues": True,
+                                },
+                            },
+                            {
+                                "name": "data",
+                                "displayName": {
+                                    "zh-CN": "数据",
+                                    "en-US": "Data",
+                                },
+                                "type": "string",
+                            },
+                        ],
+                    },
+                ],
+                "x-monkey-tool-extra": {
+                    "estimateTime": 5,
+                },
+            }
+        )
+        def post(self):
+            """Convert a list of texts to embeddings"""
+            input_data = request.json
+            texts = input_data.get("texts")
+            if not isinstance(texts, list) or not texts:
+                raise Exception("texts must be a non-empty list")
+            embeddingModel = input_data.get("embeddingModel")
+            output_format = input_data.get("outputFormat", "float")
+            vectors = generate_embedding_of_model(embeddingModel, texts)
+            if output_format == "base64":
+                # 紧凑格式：小端 float32 按行拼接后 base64 编码，shape 为 [len(texts), dimension]
+                return {"vectorsBase64": encode_vectors(vectors)}
             return {
-                "vector": json.loads(json_dump),
+                "vectors": vectors.tolist(),
             }
@@ -6,7 +6,10 @@ from core.utils.embedding import (
     get_dimension_by_embedding_model,
 )
 from core.models.knowledge_base import KnowledgeBaseEntity
+from core.models.task import TaskEntity, TaskStatus
 import uuid
+from core.queue.pub import submit_task
+from core.queue.queue_name import QUEUE_NAME_PROCESS_FILE, TASK_TYPE_BUILD_VECTOR_INDEX
 from core.storage.vectorstore.vector_store_factory import VectorStoreFactory
 
 
@@ -64,6 +67,45 @@ def register(api):
                 logger.warning(f"Failed to delete vector store: {e}")
             return {"success": True}
 
+    @knowledge_base_ns.route("/<string:knowledge_base_id>/vector-index")
+    @knowledge_base_ns.response(404, "Knowledge base not found")
+    @knowledge_base_ns.param("knowledge_base_id", "The knowledge base identifier")
+    class KnowledgeBaseVectorIndex(Resource):
+        """Build the vector index of an existing Knowledge Base"""
+
+        @knowledge_base_ns.doc("build_knowledge_base_vector_index")
+        @knowledge_base_ns.response(202, "Vector index build queued")
+        def post(self, knowledge_base_id):
+            """Queue the ANN index build on the worker (pgvector CREATE INDEX CONCURRENTLY), it can take minutes"""
+            knowledge_base_entity = KnowledgeBaseEntity.get_by_id(knowledge_base_id)
+            vector_store = VectorStoreFactory(knowledgebase=knowledge_base_entity)
+            if not hasattr(vector_store, "build_vector_index"):
+                return {"error": "Vector store does not support building the vector index"}, 400
+
+            task_id = str(uuid.uuid4())
+            task_entity = TaskEntity(
+                id=task_id,
+                knowledge_base_id=knowledge_base_id,
+                status=TaskStatus.PENDING.value,
+                progress=0,
+                latest_message="Added to queue",
+            )
+            db.session.add(task_entity)
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+            submit_task(
+                QUEUE_NAME_PROCESS_FILE,
+                {
+                    "type": TASK_TYPE_BUILD_VECTOR_INDEX,
+                    "knowledge_base_id": knowledge_base_id,
+                    "task_id": task_id,
+                },
+            )
+            return {"task_id": task_id}, 202
+
     @knowledge_base_ns.route("/<string:knowledge_base_id>/copy")
     @knowledge_base_ns.response(404, "Knowledge base not found")
     @knowledge_base_ns.param("knowledge_base_name", "The knowledge base identifier")
@@ -1,7 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from flask import request
 from flask_restx import Resource
+from loguru import logger
+from core.config import vector_config
 from core.storage.vectorstore.vector_store_factory import VectorStoreFactory
 from core.models.knowledge_base import KnowledgeBaseEntity
+from core.utils.embedding import generate_query_embedding
+from core.utils.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from core.utils.reranker import compute_rerank_scores, top_k_indexes
+
+search_timeout_ms = vector_config.get("search_timeout_ms", 5000)
+# 多路检索共用的线程池，限制单个进程内并发访问后端的线程数
+search_executor = ThreadPoolExecutor(
+    max_workers=vector_config.get("search_max_workers", 16),
+    thread_name_prefix="search",
+)
+
+
+def serialize_documents(documents):
+    return {
+        "hits": [document.serialize() for document in documents],
+        "text": "\n\n".join([document.page_content for document in documents]),
+    }
+
+
+def rerank_documents(query, documents, top_n):
+    scores = compute_rerank_scores(
+        query, [document.page_content for document in documents]
+    )
+    reranked = []
+    for i in top_k_indexes(scores, top_n):
+        documents[i].metadata["rerank_score"] = scores[i]
+        reranked.append(documents[i])
+    return reranked
+
+
+QUERIES_INPUT = {
+    "displayName": {
+        "zh-CN": "批量关键词",
+        "en-US": "Queries",
+    },
+    "name": "queries",
+    "type": "string",
+    "typeOptions": {"multipleValues": True},
+    "required": False,
+    "description": {
+        "zh-CN": "一次请求搜索多个关键词，结果按顺序返回在 results 中",
+        "en-US": "Search several queries in one request, results are returned in order in `results`",
+    },
+}
+
+RESULTS_OUTPUT = {
+    "name": "results",
+    "displayName": {
+        "zh-CN": "批量搜索结果",
+        "en-US": "Results of each query",
+    },
+    "type": "json",
+    "typeOptions": {
+        "multipleValues": True,
+    },
+}
 
 
 def register(api):
@@ -57,6 +117,7 @@ def register(api):
                         "default": "",
                         "required": False,
                     },
+                    QUERIES_INPUT,
                     {
                         "displayName": "TopK",
                         "name": "topK",
@@ -104,8 +165,8 @@ def register(api):
                         "default": "",
                         "required": False,
                         "description": {
-                            "zh-CN": "根据元数据的字段进行过滤",
-                            "en-US": "Filter by metadata field",
+                            "zh-CN": "根据元数据的字段进行过滤，支持 {\"field\": {\"gte\": 1}}、in、exists 以及 and / or / not 组合",
+                            "en-US": "Filter by metadata field, supports {\"field\": {\"gte\": 1}}, in, exists and and / or / not groups",
                         },
                         "displayOptions": {"show": {"filterType": ["simple"]}},
                     },
@@ -182,6 +243,7 @@ def register(api):
                         },
                         "type": "string",
                     },
+                    RESULTS_OUTPUT,
                 ],
                 "x-monkey-tool-extra": {
                     "estimateTime": 5,
@@ -198,17 +260,47 @@ def register(api):
             size = data.get("size", 30)
             metadata_filter = data.get("metadata_filter", None)
             sort_by_created_at = data.get("sortByCreatedAt", False)
+            projection = {
+                "fields": data.get("fields", None),
+                "include_vectors": data.get("include_vectors", False),
+            }
+            cursor = data.get("cursor", None)
+            if cursor or data.get("useCursor", False):
+                # 游标分页，不受 from + size 的深度限制
+                page = vector_store.search_by_full_text_page(
+                    query,
+                    metadata_filter=metadata_filter,
+                    size=size,
+                    sort_by_created_at=sort_by_created_at,
+                    cursor=cursor,
+                    track_total_hits=data.get("trackTotalHits", True),
+                    **projection,
+                )
+                return {
+                    **serialize_documents(page.documents),
+                    "cursor": page.cursor,
+                    "total": page.total,
+                }
+            queries = data.get("queries", None)
+            if queries:
+                results = vector_store.search_by_full_texts(
+                    queries,
+                    metadata_filter=metadata_filter,
+                    from_=from_,
+                    size=size,
+                    sort_by_created_at=sort_by_created_at,
+                    **projection,
+                )
+                return {"results": [serialize_documents(documents) for documents in results]}
             documents = vector_store.search_by_full_text(
                 query,
                 metadata_filter=metadata_filter,
                 from_=from_,
                 size=size,
                 sort_by_created_at=sort_by_created_at,
+                **projection,
             )
-            return {
-                "hits": [document.serialize() for document in documents],
-                "text": "\n\n".join([document.page_content for document in documents]),
-            }
+            return serialize_documents(documents)
 
     @knowledge_base_ns.route("/<string:knowledge_base_id>/vector-search")
     @knowledge_base_ns.response(404, "Knowledge base not found")
@@ -250,6 +342,7 @@ def register(api):
                         "default": "",
                         "required": True,
                     },
+                    QUERIES_INPUT,
                     {
                         "displayName": "topK",
                         "name": "topK",
@@ -271,8 +364,36 @@ def register(api):
                         "default": "",
                         "required": False,
                         "description": {
-                            "zh-CN": "根据元数据的字段进行过滤",
-                            "en-US": "Filter by metadata field",
+                            "zh-CN": "根据元数据的字段进行过滤，支持 {\"field\": {\"gte\": 1}}、in、exists 以及 and / or / not 组合",
+                            "en-US": "Filter by metadata field, supports {\"field\": {\"gte\": 1}}, in, exists and and / or / not groups",
+                        },
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "重排序",
+                            "en-US": "Rerank",
+                        },
+                        "name": "rerank",
+                        "type": "json",
+                        "default": "",
+                        "required": False,
+                        "description": {
+                            "zh-CN": "先召回 candidates 个结果，使用 reranker 模型重排序后返回前 topN 个，例如 {\"topN\": 3, \"candidates\": 30}",
+                            "en-US": "Retrieve `candidates` hits, rerank them with the reranker model and return the top `topN`, e.g. {\"topN\": 3, \"candidates\": 30}",
+                        },
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "搜索参数",
+                            "en-US": "Search Params",
+                        },
+                        "name": "search_params",
+                        "type": "json",
+                        "default": "",
+                        "required": False,
+                        "description": {
+                            "zh-CN": "精确或近似搜索以及召回率参数，例如 {\"mode\": \"approximate\", \"ef\": 128}，可选 mode、ef、num_candidates、nprobe",
+                            "en-US": "Exact or approximate search and recall knobs, e.g. {\"mode\": \"approximate\", \"ef\": 128}. Keys: mode, ef, num_candidates, nprobe",
                         },
                     },
                 ],
@@ -314,6 +435,15 @@ def register(api):
                         },
                         "type": "string",
                     },
+                    {
+                        "name": "timing",
+                        "displayName": {
+                            "zh-CN": "各阶段耗时（毫秒）",
+                            "en-US": "Per-stage timing (ms)",
+                        },
+                        "type": "json",
+                    },
+                    RESULTS_OUTPUT,
                 ],
                 "x-monkey-tool-extra": {
                     "estimateTime": 5,
@@ -326,126 +456,551 @@ def register(api):
             knowledge_base = KnowledgeBaseEntity.get_by_id(knowledge_base_id)
             vector_store = VectorStoreFactory(knowledgebase=knowledge_base)
             query = input_data.get("query")
-            if not query:
+            queries = input_data.get("queries", None)
+            if not query and not queries:
                 raise Exception("query is empty")
             top_k = input_data.get("topK", 3)
             metadata_filter = input_data.get("metadata_filter", None)
-            documents = vector_store.search_by_vector(
-                query=query,
-                metadata_filter=metadata_filter,
-                top_k=top_k,
+            rerank = input_data.get("rerank") or None
+            projection = {
+                "fields": input_data.get("fields", None),
+                "include_vectors": input_data.get("include_vectors", False),
+            }
+            # exact / approximate 以及 ef、num_candidates、nprobe，由各向量库映射到自己的参数
+            search_params = input_data.get("search_params") or None
+
+            if rerank:
+                top_n = rerank.get("topN", top_k)
+                candidates = max(rerank.get("candidates", top_n * 10), top_n)
+            else:
+                candidates = top_k
+
+            timing = {}
+            if queries:
+                start = time.perf_counter()
+                query_vectors = vector_store.embed_queries(queries)
+                timing["embeddingMs"] = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                results = vector_store.search_by_query_vectors(
+                    query_vectors,
+                    metadata_filter=metadata_filter,
+                    top_k=candidates,
+                    search_params=search_params,
+                    **projection,
+                )
+                timing["searchMs"] = (time.perf_counter() - start) * 1000
+
+                if rerank:
+                    start = time.perf_counter()
+                    results = [
+                        rerank_documents(query, documents, top_n) if documents else documents
+                        for query, documents in zip(queries, results)
+                    ]
+                    timing["rerankMs"] = (time.perf_counter() - start) * 1000
+                return {
+                    "results": [serialize_documents(documents) for documents in results],
+                    "timing": timing,
+                }
+
+            def search():
+                start = time.perf_counter()
+                query_vector = vector_store.embed_query(query)
+                timing["embeddingMs"] = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                documents = vector_store.search_by_query_vector(
+                    query_vector,
+                    metadata_filter=metadata_filter,
+                    top_k=candidates,
+                    search_params=search_params,
+                    **projection,
+                )
+                timing["searchMs"] = (time.perf_counter() - start) * 1000
+                return documents
+
+            # 命中缓存时跳过 embedding 和检索，timing 中没有 embeddingMs / searchMs
+            documents = vector_store.cached_search(
+                "vector",
+                {
+                    "query": query,
+                    "metadata_filter": metadata_filter,
+                    "top_k": candidates,
+                    "search_params": search_params,
+                    **projection,
+                },
+                search,
             )
+
+            if rerank and documents:
+                start = time.perf_counter()
+                documents = rerank_documents(query, documents, top_n)
+                timing["rerankMs"] = (time.perf_counter() - start) * 1000
+
+            return {**serialize_documents(documents), "timing": timing}
+
+    @knowledge_base_ns.route("/<string:knowledge_base_id>/hybird-search")
+    @knowledge_base_ns.response(404, "Knowledge base not found")
+    @knowledge_base_ns.param("knowledge_base_name", "The knowledge base identifier")
+    class KnowledgeBaseHybirdSearch(Resource):
+        @knowledge_base_ns.doc("hybird_search")
+        @knowledge_base_ns.vendor(
+            {
+                "x-monkey-tool-name": "hybird_search",
+                "x-monkey-tool-categories": ["query"],
+                "x-monkey-tool-display-name": {
+                    "zh-CN": "综合搜索",
+                    "en-US": "Hybrid Search",
+                },
+                "x-monkey-tool-description": {
+                    "zh-CN": "同时进行向量搜索和全文搜索，并融合两路结果",
+                    "en-US": "Run vector search and full text search concurrently and fuse the results",
+                },
+                "x-monkey-tool-icon": "emoji:💿:#e58c3a",
+                "x-monkey-tool-input": [
+                    {
+                        "displayName": {
+                            "zh-CN": "文本数据库",
+                            "en-US": "Knowledge Base",
+                        },
+                        "name": "knowledge_base_id",
+                        "type": "string",
+                        "typeOptions": {"assetType": "knowledge-base"},
+                        "default": "",
+                        "required": True,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "关键词",
+                            "en-US": "Query",
+                        },
+                        "name": "query",
+                        "type": "string",
+                        "default": "",
+                        "required": True,
+                    },
+                    {
+                        "displayName": "TopK",
+                        "name": "topK",
+                        "type": "number",
+                        "default": 3,
+                        "required": False,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "根据元数据字段进行过滤",
+                            "en-US": "Filter by Metadata Field",
+                        },
+                        "name": "metadata_filter",
+                        "type": "json",
+                        "typeOptions": {
+                            "multiFieldObject": True,
+                            "multipleValues": False,
+                        },
+                        "default": "",
+                        "required": False,
+                        "description": {
+                            "zh-CN": "根据元数据的字段进行过滤，支持 {\"field\": {\"gte\": 1}}、in、exists 以及 and / or / not 组合",
+                            "en-US": "Filter by metadata field, supports {\"field\": {\"gte\": 1}}, in, exists and and / or / not groups",
+                        },
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "融合方式",
+                            "en-US": "Fusion",
+                        },
+                        "name": "fusion",
+                        "type": "options",
+                        "options": [
+                            {
+                                "name": {
+                                    "zh-CN": "倒数排名融合 (RRF)",
+                                    "en-US": "Reciprocal Rank Fusion",
+                                },
+                                "value": "rrf",
+                            },
+                            {
+                                "name": {
+                                    "zh-CN": "加权分数融合",
+                                    "en-US": "Weighted Score",
+                                },
+                                "value": "weighted",
+                            },
+                        ],
+                        "default": "rrf",
+                        "required": False,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "向量搜索权重",
+                            "en-US": "Vector Weight",
+                        },
+                        "name": "vectorWeight",
+                        "type": "number",
+                        "default": 0.5,
+                        "required": False,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "单路超时时间（毫秒）",
+                            "en-US": "Per Leg Timeout (ms)",
+                        },
+                        "name": "timeoutMs",
+                        "type": "number",
+                        "default": search_timeout_ms,
+                        "required": False,
+                    },
+                ],
+                "x-monkey-tool-output": [
+                    {
+                        "name": "hits",
+                        "displayName": {
+                            "zh-CN": "段落列表",
+                            "en-US": "Paragraph List",
+                        },
+                        "type": "json",
+                        "typeOptions": {
+                            "multipleValues": True,
+                        },
+                        "properties": [
+                            {
+                                "name": "metadata",
+                                "displayName": {
+                                    "zh-CN": "元数据",
+                                    "en-US": "Metadata",
+                                },
+                                "type": "json",
+                            },
+                            {
+                                "name": "page_content",
+                                "displayName": {
+                                    "zh-CN": "文本内容",
+                                    "en-US": "Text Content",
+                                },
+                                "type": "string",
+                            },
+                        ],
+                    },
+                    {
+                        "name": "text",
+                        "displayName": {
+                            "zh-CN": "所有搜索的结果组合的字符串",
+                            "en-US": "All search results combined string",
+                        },
+                        "type": "string",
+                    },
+                    {
+                        "name": "timing",
+                        "displayName": {
+                            "zh-CN": "各阶段耗时（毫秒）",
+                            "en-US": "Per-stage timing (ms)",
+                        },
+                        "type": "json",
+                    },
+                ],
+                "x-monkey-tool-extra": {
+                    "estimateTime": 5,
+                },
+            }
+        )
+        def post(self, knowledge_base_id):
+            """Execute full-text search and vector search concurrently, and fuse both rankings to select the best match for the user's query."""
+            input_data = request.json
+            knowledge_base = KnowledgeBaseEntity.get_by_id(knowledge_base_id)
+            vector_store = VectorStoreFactory(knowledgebase=knowledge_base)
+            query = input_data.get("query")
+            if not query:
+                raise Exception("query is empty")
+            top_k = input_data.get("topK", 3)
+            metadata_filter = input_data.get("metadata_filter", None)
+            fusion = input_data.get("fusion", "rrf")
+            vector_weight = float(input_data.get("vectorWeight", 0.5))
+            timeout = input_data.get("timeoutMs", search_timeout_ms) / 1000
+            # 每一路多召回一些，融合后的排序才有意义
+            candidates = max(input_data.get("candidates", top_k * 4), top_k)
+            if fusion not in ("rrf", "weighted"):
+                raise Exception(f"Unsupported fusion: {fusion}")
+
+            timing = {}
+
+            # 每一路返回自己的耗时，超时的一路在后台结束时不会改动已返回的结果
+            def vector_leg():
+                leg_timing = {}
+                start = time.perf_counter()
+                query_vector = vector_store.embed_query(query)
+                leg_timing["embeddingMs"] = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                documents = vector_store.search_by_query_vector(
+                    query_vector, metadata_filter=metadata_filter, top_k=candidates
+                )
+                leg_timing["vectorSearchMs"] = (time.perf_counter() - start) * 1000
+                return documents, leg_timing
+
+            def full_text_leg():
+                leg_timing = {}
+                start = time.perf_counter()
+                documents = vector_store.search_by_full_text(
+                    query,
+                    metadata_filter=metadata_filter,
+                    size=candidates,
+                    top_k=candidates,
+                )
+                leg_timing["fullTextSearchMs"] = (time.perf_counter() - start) * 1000
+                return documents, leg_timing
+
+            start = time.perf_counter()
+            futures = {
+                "vector": search_executor.submit(vector_leg),
+                "fullText": search_executor.submit(full_text_leg),
+            }
+            results = {}
+            failed = []
+            for leg, future in futures.items():
+                # 各路共享同一个截止时间，超时或失败的一路不影响另一路的结果
+                remaining = max(timeout - (time.perf_counter() - start), 0)
+                try:
+                    results[leg], leg_timing = future.result(timeout=remaining)
+                    timing.update(leg_timing)
+                except TimeoutError:
+                    logger.warning(f"Hybrid search {leg} leg timed out after {timeout}s")
+                    timing[f"{leg}TimedOut"] = True
+                    results[leg] = []
+                    failed.append(leg)
+                except Exception as e:
+                    logger.warning(f"Hybrid search {leg} leg failed: {e}")
+                    results[leg] = []
+                    failed.append(leg)
+            if len(failed) == len(futures):
+                raise Exception("Both vector search and full text search failed")
+
+            start = time.perf_counter()
+            result_lists = [results["vector"], results["fullText"]]
+            weights = [vector_weight, 1 - vector_weight]
+            if fusion == "weighted":
+                fused = weighted_score_fusion(result_lists, weights)
+            else:
+                fused = reciprocal_rank_fusion(
+                    result_lists, weights, k=input_data.get("rrfK", 60)
+                )
+            documents = []
+            for document, score in fused[:top_k]:
+                document.metadata["hybrid_score"] = score
+                documents.append(document)
+            timing["fusionMs"] = (time.perf_counter() - start) * 1000
+
             return {
                 "hits": [document.serialize() for document in documents],
                 "text": "\n\n".join([document.page_content for document in documents]),
+                "timing": timing,
+            }
+
+    @knowledge_base_ns.route("/federated-search")
+    class KnowledgeBaseFederatedSearch(Resource):
+        @knowledge_base_ns.doc("federated_search")
+        @knowledge_base_ns.vendor(
+            {
+                "x-monkey-tool-name": "federated_search_vector",
+                "x-monkey-tool-categories": ["query"],
+                "x-monkey-tool-display-name": {
+                    "zh-CN": "多知识库向量搜索",
+                    "en-US": "Multi Knowledge Base Vector Search",
+                },
+                "x-monkey-tool-description": {
+                    "zh-CN": "在多个文本数据库中同时进行相似性搜索，按相似度合并结果",
+                    "en-US": "Search several knowledge bases at once and merge the hits by similarity",
+                },
+                "x-monkey-tool-icon": "emoji:💿:#e58c3a",
+                "x-monkey-tool-input": [
+                    {
+                        "displayName": {
+                            "zh-CN": "文本数据库",
+                            "en-US": "Knowledge Bases",
+                        },
+                        "name": "knowledge_base_ids",
+                        "type": "string",
+                        "typeOptions": {
+                            "assetType": "knowledge-base",
+                            "multipleValues": True,
+                        },
+                        "default": [],
+                        "required": True,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "关键词",
+                            "en-US": "Query",
+                        },
+                        "name": "query",
+                        "type": "string",
+                        "default": "",
+                        "required": True,
+                    },
+                    {
+                        "displayName": "topK",
+                        "name": "topK",
+                        "type": "number",
+                        "default": 3,
+                        "required": False,
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "根据元数据字段进行过滤",
+                            "en-US": "Filter by Metadata Field",
+                        },
+                        "name": "metadata_filter",
+                        "type": "json",
+                        "typeOptions": {
+                            "multiFieldObject": True,
+                            "multipleValues": False,
+                        },
+                        "default": "",
+                        "required": False,
+                        "description": {
+                            "zh-CN": "根据元数据的字段进行过滤，支持 {\"field\": {\"gte\": 1}}、in、exists 以及 and / or / not 组合",
+                            "en-US": "Filter by metadata field, supports {\"field\": {\"gte\": 1}}, in, exists and and / or / not groups",
+                        },
+                    },
+                    {
+                        "displayName": {
+                            "zh-CN": "单个知识库超时时间（毫秒）",
+                            "en-US": "Per Knowledge Base Timeout (ms)",
+                        },
+                        "name": "timeoutMs",
+                        "type": "number",
+                        "default": search_timeout_ms,
+                        "required": False,
+                    },
+                ],
+                "x-monkey-tool-output": [
+                    {
+                        "name": "hits",
+                        "displayName": {
+                            "zh-CN": "段落列表",
+                            "en-US": "Paragraph List",
+                        },
+                        "type": "json",
+                        "typeOptions": {
+                            "multipleValues": True,
+                        },
+                        "properties": [
+                            {
+                                "name": "metadata",
+                                "displayName": {
+                                    "zh-CN": "元数据",
+                                    "en-US": "Metadata",
+                                },
+                                "type": "json",
+                            },
+                            {
+                                "name": "page_content",
+                                "displayName": {
+                                    "zh-CN": "文本内容",
+                                    "en-US": "Text Content",
+                                },
+                                "type": "string",
+                            },
+                            {
+                                "name": "knowledge_base_id",
+                                "displayName": {
+                                    "zh-CN": "来源文本数据库",
+                                    "en-US": "Source Knowledge Base",
+                                },
+                                "type": "string",
+                            },
+                        ],
+                    },
+                    {
+                        "name": "text",
+                        "displayName": {
+                            "zh-CN": "所有搜索的结果组合的字符串",
+                            "en-US": "All search results combined string",
+                        },
+                        "type": "string",
+                    },
+                    {
+                        "name": "failed",
+                        "displayName": {
+                            "zh-CN": "搜索失败或超时的文本数据库",
+                            "en-US": "Knowledge bases that failed or timed out",
+                        },
+                        "type": "json",
+                    },
+                ],
+                "x-monkey-tool-extra": {
+                    "estimateTime": 5,
+                },
+            }
+        )
+        def post(self):
+            """Search several knowledge bases concurrently, embedding the query once per embedding model, and merge the hits by score."""
+            input_data = request.json
+            knowledge_base_ids = list(dict.fromkeys(input_data.get("knowledge_base_ids") or []))
+            if not knowledge_base_ids:
+                raise Exception("knowledge_base_ids is empty")
+            query = input_data.get("query")
+            if not query:
+                raise Exception("query is empty")
+            top_k = input_data.get("topK", 3)
+            metadata_filter = input_data.get("metadata_filter", None)
+            timeout = input_data.get("timeoutMs", search_timeout_ms) / 1000
+
+            knowledge_bases = KnowledgeBaseEntity.get_by_ids(knowledge_base_ids)
+            vector_stores = {
+                knowledge_base.id: VectorStoreFactory(knowledgebase=knowledge_base)
+                for knowledge_base in knowledge_bases
+            }
+
+            # timeoutMs 同时限制 query 编码和检索两个阶段
+            start = time.perf_counter()
+
+            def remaining():
+                return max(timeout - (time.perf_counter() - start), 0)
+
+            # 相同 embedding 模型的知识库只需要对 query 编码一次
+            embedding_models = {knowledge_base.embedding_model for knowledge_base in knowledge_bases}
+            embedding_futures = {
+                model: search_executor.submit(generate_query_embedding, model, query)
+                for model in embedding_models
             }
+            query_vectors = {}
+            for model, future in embedding_futures.items():
+                try:
+                    query_vectors[model] = future.result(timeout=remaining())
+                except Exception as e:
+                    # 编码失败或超时的模型，只有使用它的知识库记为失败
+                    logger.warning(f"Federated search embedding of {model} failed: {e!r}")
+            failed = [
+                knowledge_base.id
+                for knowledge_base in knowledge_bases
+                if knowledge_base.embedding_model not in query_vectors
+            ]
 
-    # @knowledge_base_ns.route("/<string:knowledge_base_id>/hybird-search")
-    # @knowledge_base_ns.response(404, "Knowledge base not found")
-    # @knowledge_base_ns.param("knowledge_base_name", "The knowledge base identifier")
-    # class KnowledgeBaseHybirdSearch(Resource):
-    #     @knowledge_base_ns.doc("hybird_search")
-    #     @knowledge_base_ns.vendor(
-    #         {
-    #             "x-monkey-tool-name": "hybird_search",
-    #             "x-monkey-tool-categories": ["query"],
-    #             "x-monkey-tool-display-name": "综合搜索",
-    #             "x-monkey-tool-description": "根据提供的文本对进行相似性搜索",
-    #             "x-monkey-tool-icon": "emoji:💿:#e58c3a",
-    #             "x-monkey-tool-input": [
-    #                 {
-    #                     "displayName": "文本数据库",
-    #                     "name": "knowledgeBaseName",
-    #                     "type": "string",
-    #                     "typeOptions": {"assetType": "knowledge-base"},
-    #                     "default": "",
-    #                     "required": True,
-    #                 },
-    #                 {
-    #                     "displayName": "关键词",
-    #                     "name": "question",
-    #                     "type": "string",
-    #                     "default": "",
-    #                     "required": True,
-    #                 },
-    #                 {
-    #                     "displayName": "TopK",
-    #                     "name": "topK",
-    #                     "type": "number",
-    #                     "default": 3,
-    #                     "required": False,
-    #                 },
-    #                 {
-    #                     "displayName": "根据元数据字段进行过滤",
-    #                     "name": "metadata_filter",
-    #                     "type": "json",
-    #                     "typeOptions": {
-    #                         "multiFieldObject": True,
-    #                         "multipleValues": False,
-    #                     },
-    #                     "default": "",
-    #                     "required": False,
-    #                     "description": "根据元数据的字段进行过滤",
-    #                 },
-    #             ],
-    #             "x-monkey-tool-output": [
-    #                 {
-    #                     "name": "result",
-    #                     "displayName": "相似性集合",
-    #                     "type": "json",
-    #                     "typeOptions": {
-    #                         "multipleValues": True,
-    #                     },
-    #                     "properties": [
-    #                         {
-    #                             "name": "metadata",
-    #                             "displayName": "元数据",
-    #                             "type": "json",
-    #                         },
-    #                         {
-    #                             "name": "page_content",
-    #                             "displayName": "文本内容",
-    #                             "type": "string",
-    #                         },
-    #                     ],
-    #                 },
-    #                 {
-    #                     "name": "text",
-    #                     "displayName": "所有搜索的结果组合的字符串",
-    #                     "type": "string",
-    #                 },
-    #             ],
-    #             "x-monkey-tool-extra": {
-    #                 "estimateTime": 5,
-    #             },
-    #         }
-    #     )
-    #     def post(self, knowledgeBaseName):
-    #         """Execute full-text search and vector searches simultaneously, re-rank to select the best match for the user's query. Configuration of the Rerank model APIis necessary."""
-    #         input_data = request.json
-    #         team_id = request.team_id
-    #         query = input_data.get("query")
-    #         if not query:
-    #             raise Exception("query is empty")
-    #         top_k = input_data.get("topK", 3)
-    #         metadata_filter = input_data.get("metadata_filter", None)
-
-    #         app_id = request.app_id
-    #         collection = get_knowledge_base_or_fail(app_id, team_id, knowledgeBaseName)
-
-    #         es_client = ESClient(app_id=app_id, index_name=knowledgeBaseName)
-    #         embedding_model = collection.embedding_model
-    #         embedding = generate_embedding_of_model(embedding_model, query)
-
-    #         data = es_client.vector_search(embedding, top_k, metadata_filter)
-    #         data = [
-    #             {
-    #                 "page_content": item["_source"]["page_content"],
-    #                 "metadata": item["_source"]["metadata"],
-    #             }
-    #             for item in data
-    #         ]
-    #         texts = [item["page_content"] for item in data]
-    #         text = "\n".join(texts)
-
-    #         return {"result": data, "text": text}
+            futures = {
+                knowledge_base.id: search_executor.submit(
+                    vector_stores[knowledge_base.id].search_by_query_vector,
+                    query_vectors[knowledge_base.embedding_model],
+                    metadata_filter=metadata_filter,
+                    top_k=top_k,
+                )
+                for knowledge_base in knowledge_bases
+                if knowledge_base.embedding_model in query_vectors
+            }
+            hits = []
+            for knowledge_base_id, future in futures.items():
+                try:
+                    documents = future.result(timeout=remaining())
+                except Exception as e:
+                    logger.warning(f"Federated search of {knowledge_base_id} failed: {e!r}")
+                    failed.append(knowledge_base_id)
+                    continue
+                hits.extend((knowledge_base_id, document) for document in documents)
+
+            # 每个向量库都返回越大越相似的 metadata.score，见 BaseVectorStore.search_by_vector
+            hits.sort(key=lambda hit: hit[1].metadata["score"], reverse=True)
+            hits = hits[:top_k]
+            return {
+                "hits": [
+                    {**document.serialize(), "knowledge_base_id": knowledge_base_id}
+                    for knowledge_base_id, document in hits
+                ],
+                "text": "\n\n".join([document.page_content for _, document in hits]),
+                "failed": failed,
+            }
@@ -21,12 +21,18 @@ class Document(BaseModel):
     """
     metadata: Optional[dict] = Field(default_factory=dict)
 
+    """Embedding of the page content, only set when a search asks for `include_vectors`."""
+    vector: Optional[list[float]] = None
+
     def serialize(self):
-        return {
+        data = {
             "page_content": self.page_content,
             "metadata": self.metadata,
             "pk": self.pk,
         }
+        if self.vector is not None:
+            data["vector"] = self.vector
+        return data
 
 
 class DocumentEntity(db.Model):
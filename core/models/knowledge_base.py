@@ -41,6 +41,16 @@ class KnowledgeBaseEntity(db.Model):
             raise ValueError(f"Knowledge base with id {id} not found")
         return knowledge_base
 
+    @staticmethod
+    def get_by_ids(ids: list[str]):
+        knowledge_bases = KnowledgeBaseEntity.query.filter(
+            KnowledgeBaseEntity.id.in_(ids)
+        ).all()
+        missing = set(ids) - {knowledge_base.id for knowledge_base in knowledge_bases}
+        if missing:
+            raise ValueError(f"Knowledge base with id {', '.join(missing)} not found")
+        return knowledge_bases
+
     @staticmethod
     def delete_by_id(id: str):
         # db.handle_invalid_transaction()
@@ -1 +1,4 @@
 QUEUE_NAME_PROCESS_FILE = "queue:monkey-tools-vector:process-file"
+
+# 同一个队列中除了文件导入任务以外的任务类型
+TASK_TYPE_BUILD_VECTOR_INDEX = "build-vector-index"
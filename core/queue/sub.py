@@ -21,6 +21,7 @@ from core.utils.zip import extract_files_from_zip
 from core.utils.oss.aliyunoss import AliyunOSSClient
 from core.utils.oss.tos import TOSClient
 from core.models.metadata_field import MetadataFieldEntity
+from core.queue.queue_name import TASK_TYPE_BUILD_VECTOR_INDEX
 
 
 def _download_file(file_url):
@@ -214,6 +215,8 @@ def _load_single_document(
             MetadataFieldEntity.add_keys_if_not_exists(
                 knowledge_base_id, metadata_fields
             )
+            # 批量导入后在 worker 里创建向量索引，不阻塞 HTTP 写入
+            vector_store.ensure_vector_index()
 
             on_prgress(TaskStatus.COMPLETED, "Loaded to vector store", 1)
             DocumentEntity.update_status_by_id(
@@ -371,6 +374,36 @@ def consume_task(task_data):
             traceback.print_exc()
 
 
+def consume_build_vector_index_task(task_data):
+    task_id = task_data["task_id"]
+    with app.app_context():
+        try:
+            TaskEntity.update_progress_by_id(
+                task_id,
+                status=TaskStatus.IN_PROGRESS,
+                latest_message="Building vector index",
+            )
+            knowledge_base = KnowledgeBaseEntity.get_by_id(task_data["knowledge_base_id"])
+            result = VectorStoreFactory(knowledgebase=knowledge_base).build_vector_index()
+            if result.get("building"):
+                message = f"Vector index {result['index']} is being built by another task"
+            elif result.get("created"):
+                message = f"Built vector index {result['index']}"
+            else:
+                message = "Vector index already exists"
+            TaskEntity.update_progress_by_id(
+                task_id, status=TaskStatus.COMPLETED, progress=1, latest_message=message
+            )
+        except Exception as e:
+            TaskEntity.update_progress_by_id(
+                task_id,
+                status=TaskStatus.FAILED,
+                latest_message=f"Failed to build vector index: {str(e)}",
+            )
+            logger.error(f"Failed to process task: {task_data}")
+            traceback.print_exc()
+
+
 # 从队列中获取并处理任务
 def consume_task_forever(queue_name):
     logger.info(f"Start consuming tasks from queue: {queue_name}")
@@ -380,7 +413,10 @@ def consume_task_forever(queue_name):
             _, task_json_str = redis_client.blpop(queue_name)
             task_data = json.loads(task_json_str)
             logger.info(f"Processing task: {task_data}")
-            consume_task(task_data)
+            if task_data.get("type") == TASK_TYPE_BUILD_VECTOR_INDEX:
+                consume_build_vector_index_task(task_data)
+            else:
+                consume_task(task_data)
         except Exception as e:
             logger.error(f"Failed to process task: {task_data}")
             traceback.print_exc()
@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from loguru import logger
+from pydantic import VERSION as PYDANTIC_VERSION
+from pydantic import BaseModel
+
+from core.config import vector_config
+from core.utils import generate_md5
+
+
+class _RegistryEntry:
+    def __init__(self, client: Any, close: Optional[Callable[[Any], None]]):
+        self.client = client
+        self.close = close
+        self.created_at = time.time()
+        self.checked_at = self.created_at
+
+
+class ClientRegistry:
+    """
+    Long-lived backend clients shared by every vector store of the process, keyed by
+    (backend, config). Vector stores are cheap views that bind one of these clients to a
+    collection name, so requests reuse the pooled keep-alive connections instead of
+    building a new client (and TLS handshake) each time.
+
+    A client not used for `health_check_interval` seconds is health checked on its next
+    use, and rebuilt when the check fails. Other threads may still be using the failed
+    client, so it is retired instead of closed right away, and closed by a later `get`
+    once `retire_grace_period` seconds have passed.
+    """
+
+    def __init__(self, health_check_interval: float = 30, retire_grace_period: float = 60):
+        self._health_check_interval = health_check_interval
+        self._retire_grace_period = retire_grace_period
+        self._entries: dict[str, _RegistryEntry] = {}
+        # (entry, 可以关闭的时间)，按时间顺序追加
+        self._retired: list[tuple[_RegistryEntry, float]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(backend: str, config: BaseModel) -> str:
+        # pydantic v2 中 dict() 已废弃，每次调用都会产生警告
+        values = config.dict() if PYDANTIC_VERSION.startswith("1.") else config.model_dump()
+        normalized = json.dumps(values, sort_keys=True, default=str)
+        return f"{backend}:{generate_md5(normalized)}"
+
+    def get(
+        self,
+        backend: str,
+        config: BaseModel,
+        create: Callable[[], Any],
+        health_check: Optional[Callable[[Any], Any]] = None,
+        close: Optional[Callable[[Any], None]] = None,
+    ) -> Any:
+        if self._retired:
+            self._close_retired()
+        key = self.make_key(backend, config)
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    logger.info(f"Creating {backend} client")
+                    entry = _RegistryEntry(create(), close)
+                    self._entries[key] = entry
+            return entry.client
+
+        if health_check is not None and time.time() - entry.checked_at > self._health_check_interval:
+            entry.checked_at = time.time()
+            try:
+                healthy = health_check(entry.client) is not False
+            except Exception as e:
+                logger.warning(f"Health check of {backend} client failed: {e}")
+                healthy = False
+            if not healthy:
+                return self._replace(backend, key, entry, create, close)
+        return entry.client
+
+    def _replace(self, backend: str, key: str, entry: _RegistryEntry, create, close) -> Any:
+        with self._lock:
+            current = self._entries.get(key)
+            # 其他线程可能已经重建过
+            if current is not None and current is not entry:
+                return current.client
+            logger.info(f"Recreating {backend} client")
+            current = _RegistryEntry(create(), close)
+            self._entries[key] = current
+            self._retired.append((entry, time.time() + self._retire_grace_period))
+        return current.client
+
+    def _close_retired(self):
+        now = time.time()
+        with self._lock:
+            due = [entry for entry, close_at in self._retired if close_at <= now]
+            if not due:
+                return
+            self._retired = [(entry, close_at) for entry, close_at in self._retired if close_at > now]
+        for entry in due:
+            self._close(entry)
+
+    @staticmethod
+    def _close(entry: _RegistryEntry):
+        try:
+            if entry.close is not None:
+                entry.close(entry.client)
+            elif hasattr(entry.client, "close"):
+                entry.client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close client: {e}")
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._entries.values()) + [entry for entry, _ in self._retired]
+            self._entries.clear()
+            self._retired = []
+        for entry in entries:
+            self._close(entry)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                key: {"ageSeconds": int(now - entry.created_at)}
+                for key, entry in self._entries.items()
+            }
+
+
+_client_registry = None
+_client_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    global _client_registry
+    if _client_registry is None:
+        with _client_registry_lock:
+            if _client_registry is None:
+                registry_config = vector_config.get("client_registry", {})
+                _client_registry = ClientRegistry(
+                    health_check_interval=registry_config.get("health_check_interval", 30),
+                    retire_grace_period=registry_config.get("retire_grace_period", 60),
+                )
+    return _client_registry
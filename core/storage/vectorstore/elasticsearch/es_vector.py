@@ -1,25 +1,65 @@
+import json
 import logging
+import threading
+import time
 import traceback
 from typing import Any
 import elasticsearch
+import numpy as np
 from pydantic import BaseModel
 from core.models.document import Document
-from core.storage.vectorstore.vector_store_base import BaseVectorStore
+from core.storage.vectorstore.client_registry import get_client_registry
+from core.storage.vectorstore.filters import parse_filter, to_elasticsearch
+from core.storage.vectorstore.vector_store_base import (
+    BaseVectorStore,
+    SearchPage,
+    decode_cursor,
+    encode_cursor,
+    normalize_search_params,
+)
 from elasticsearch import Elasticsearch, helpers
 from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JsonSerializer
 
 from core.utils import chunk_list, generate_md5
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# 进程内缓存每个 (index, filter) 匹配的文档数，避免每次过滤搜索都多一次 _count 请求
+_FILTER_COUNTS_MAX_ENTRIES = 10000
+_filter_counts = {}
+_filter_counts_lock = threading.Lock()
+
+
+class VectorJsonSerializer(JsonSerializer):
+    """
+    Serialize float32 ndarray vectors straight from their buffers with orjson,
+    instead of converting each of them to a list of Python floats first.
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        if orjson is None or isinstance(data, (str, bytes)):
+            return super().dumps(data)
+        return orjson.dumps(
+            data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY
+        )
+
 
 class ElasticSearchConfig(BaseModel):
     url: str
     username: str
     password: str
     knn_num_candidates: int = 100
+    exact_search_max_docs: int = 10000
+    filter_count_ttl: int = 60
     secure: bool = False
     batch_size: int = 100
+    pool_size: int = 10
 
     def validate_config(cls, values: dict) -> dict:
         if not values["url"]:
@@ -36,7 +76,9 @@ class ElasticSearchConfig(BaseModel):
             "username": self.username,
             "password": self.password,
             "knn_num_candidates": self.knn_num_candidates,
+            "exact_search_max_docs": self.exact_search_max_docs,
             "batch_size": self.batch_size,
+            "pool_size": self.pool_size,
         }
 
 
@@ -97,9 +139,12 @@ class ElasticsearchVectorStore(BaseVectorStore):
     def __upsert_documents_batch(self, all_documents):
         # 准备批量数据
         chunks = chunk_list(all_documents, self._client_config.batch_size)
-        for chunk in chunks:
+        for index, chunk in enumerate(chunks):
+            # 最后一批等到下一次 refresh 后才返回，之前的批次也随之可见，
+            # 写入后失效的搜索缓存不会缓存到写入前的结果
+            refresh = "wait_for" if index == len(chunks) - 1 else False
             try:
-                helpers.bulk(self._client, chunk)
+                helpers.bulk(self._client, chunk, refresh=refresh)
             except BulkIndexError as e:
                 print(f"An error occurred: {e}")
                 for i, error in enumerate(e.errors):
@@ -113,7 +158,7 @@ class ElasticsearchVectorStore(BaseVectorStore):
     def add_texts(
         self,
         texts: list[Document],
-        embeddings: list[list[float]],
+        embeddings: np.ndarray,
         **kwargs,
     ):
         es_documents = []
@@ -152,13 +197,19 @@ class ElasticsearchVectorStore(BaseVectorStore):
         res = self._client.delete_by_query(
             index=self._collection_name,
             body={"query": {"term": {f"metadata.{key}": value}}},
+            # delete_by_query 不支持 wait_for
+            refresh=True,
         )
         logger.info(f"Deleted {res['deleted']} documents")
 
     def delete_by_ids(self, doc_ids: list[str]) -> None:
         # TODO: Delete by batch
-        for pk in doc_ids:
-            self._client.delete(index=self._collection_name, id=pk)
+        for index, pk in enumerate(doc_ids):
+            self._client.delete(
+                index=self._collection_name,
+                id=pk,
+                refresh="wait_for" if index == len(doc_ids) - 1 else False,
+            )
 
     def update_by_id(self, id: str, document: Document) -> None:
         self._client.update(
@@ -170,42 +221,193 @@ class ElasticsearchVectorStore(BaseVectorStore):
                     "metadata": document.metadata,
                 }
             },
+            refresh="wait_for",
         )
 
     def delete(self) -> None:
         # delete the entire index
         self._client.indices.delete(index=self._collection_name)
 
-    def search_by_vector(
-        self, query_vector: list[float], **kwargs: Any
-    ) -> list[Document]:
-        must_statements = []
-        metadata_filter = kwargs.get("metadata_filter", None)
+    @staticmethod
+    def _vector_filter(**kwargs: Any) -> list[dict]:
+        node = parse_filter(kwargs.get("metadata_filter", None))
+        return [to_elasticsearch(node)] if node is not None else []
+
+    def _plan_vector_search(self, **kwargs: Any) -> dict:
+        """
+        Pick exact or approximate search and the knn candidates of a request.
+        Without an explicit mode, a filter matching few documents is searched exactly
+        (a brute force script_score over the filtered documents is cheap and has full
+        recall), otherwise knn candidates grow with top_k and with the filter.
+        """
+        search_params = normalize_search_params(kwargs.get("search_params"))
         top_k = kwargs.get("top_k", 3)
-        if metadata_filter:
-            for key, value in metadata_filter.items():
-                must_statements.append({"term": {f"metadata.{key}.keyword": value}})
+        filters = self._vector_filter(**kwargs)
+        mode = search_params.get("mode")
+        if mode is None and filters:
+            if self._count_filtered(filters) <= self._client_config.exact_search_max_docs:
+                mode = "exact"
+        num_candidates = search_params.get("num_candidates") or search_params.get("ef")
+        if num_candidates is None:
+            num_candidates = max(self._client_config.knn_num_candidates, top_k * 10)
+            if filters:
+                # 过滤后剩余的候选变少，多取一些保证召回
+                num_candidates *= 2
+        return {
+            "mode": mode or "approximate",
+            "top_k": top_k,
+            "filters": filters,
+            # ES 限制 num_candidates 不超过 10000，且不能小于 k
+            "num_candidates": min(max(num_candidates, top_k), 10000),
+        }
+
+    def _count_filtered(self, filters: list[dict]) -> int:
+        """Documents matching the filters, cached for filter_count_ttl seconds"""
+        key = (self._collection_name, json.dumps(filters, sort_keys=True, default=str))
+        now = time.time()
+        with _filter_counts_lock:
+            cached = _filter_counts.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        count = self._client.count(
+            index=self._collection_name, query={"bool": {"filter": filters}}
+        )["count"]
+        with _filter_counts_lock:
+            if len(_filter_counts) >= _FILTER_COUNTS_MAX_ENTRIES:
+                for expired in [k for k, (_, expires_at) in _filter_counts.items() if expires_at <= now]:
+                    del _filter_counts[expired]
+                if len(_filter_counts) >= _FILTER_COUNTS_MAX_ENTRIES:
+                    _filter_counts.clear()
+            _filter_counts[key] = (count, now + self._client_config.filter_count_ttl)
+        return count
 
+    def _vector_search_body(self, query_vector: np.ndarray, plan: dict, **kwargs: Any) -> dict:
+        if plan["mode"] == "exact":
+            # 与 l2_norm 相似度的 knn _score 一致：1 / (1 + l2_norm^2)
+            return {
+                "query": {
+                    "script_score": {
+                        "query": {"bool": {"filter": plan["filters"]}},
+                        "script": {
+                            "source": "1 / (1 + Math.pow(l2norm(params.query_vector, 'embeddings'), 2))",
+                            "params": {"query_vector": query_vector},
+                        },
+                    }
+                },
+                "size": plan["top_k"],
+                "_source": self._source_filter(**kwargs),
+            }
+        knn = {
+            "field": "embeddings",
+            "query_vector": query_vector,
+            "k": plan["top_k"],
+            "num_candidates": plan["num_candidates"],
+        }
+        if plan["filters"]:
+            # knn.filter 在近似搜索过程中过滤，顶层 query 只会与 knn 结果合并而不会过滤
+            knn["filter"] = {"bool": {"filter": plan["filters"]}}
+        return {
+            "knn": knn,
+            "size": plan["top_k"],
+            "_source": self._source_filter(**kwargs),
+        }
+
+    def _full_text_search_body(self, query: str, **kwargs: Any) -> dict:
+        metadata_filter = kwargs.get("metadata_filter", None)
+        from_ = kwargs.get("from_", 0)
+        size = kwargs.get("size", 10)
+        sort_by_created_at = kwargs.get("sort_by_created_at", False)
+
+        must_statements = []
+        if query:
+            must_statements.append({"match": {"page_content": query}})
+
+        # 过滤条件放在 filter 上下文，不参与相关性打分
+        filter_statements = self._vector_filter(metadata_filter=metadata_filter)
         search_body = {
-            "knn": {
-                "field": "embeddings",
-                "query_vector": query_vector,
-                "k": top_k,
-                "num_candidates": self._client_config.knn_num_candidates,
-            },
-            "fields": ["page_content", "metadata"],
+            "query": {"bool": {"must": must_statements, "filter": filter_statements}},
+            "from": from_,
+            "size": size,
+            "_source": self._source_filter(**kwargs),
         }
-        if len(must_statements) > 0:
-            search_body["query"] = {"bool": {"must": must_statements}}
-        response = self._client.search(index=self._collection_name, body=search_body)
+        if sort_by_created_at:
+            search_body["sort"] = [{"metadata.created_at": {"order": "desc"}}]
+        return search_body
 
-        return [
-            Document(
-                pk=hit["_id"],
-                page_content=hit["_source"]["page_content"],
-                metadata=hit["_source"]["metadata"],
+    @staticmethod
+    def _source_filter(**kwargs: Any) -> dict:
+        """Only fetch what the response needs, the embeddings are skipped by default"""
+        fields = kwargs.get("fields", None)
+        include_vectors = kwargs.get("include_vectors", False)
+        if fields is None:
+            source = {"includes": ["page_content", "metadata"]}
+        else:
+            source = {
+                "includes": ["page_content"] + [f"metadata.{field}" for field in fields]
+            }
+        if include_vectors:
+            source["includes"].append("embeddings")
+        return source
+
+    def _msearch(self, search_bodies: list[dict]) -> list[dict]:
+        """Send several searches in one msearch request, returns the response of each search"""
+        searches = []
+        for search_body in search_bodies:
+            searches.append({"index": self._collection_name})
+            searches.append(search_body)
+        responses = self._client.msearch(searches=searches)["responses"]
+        for index, response in enumerate(responses):
+            if "error" in response:
+                # 与 search_by_full_text 一致，索引不存在时返回空结果
+                if response["error"].get("type") == "index_not_found_exception":
+                    responses[index] = {"hits": {"hits": []}}
+                    continue
+                raise Exception(f"Elasticsearch msearch failed: {response['error']}")
+        return responses
+
+    @staticmethod
+    def _documents_from_response(response, with_score=False) -> list[Document]:
+        documents = []
+        for hit in response["hits"]["hits"]:
+            metadata = hit["_source"].get("metadata") or {}
+            if with_score:
+                metadata = {**metadata, "score": hit["_score"]}
+            documents.append(
+                Document(
+                    pk=hit["_id"],
+                    page_content=hit["_source"]["page_content"],
+                    metadata=metadata,
+                    vector=hit["_source"].get("embeddings"),
+                )
             )
-            for hit in response["hits"]["hits"]
+        return documents
+
+    def search_by_vector(
+        self, query_vector: np.ndarray, **kwargs: Any
+    ) -> list[Document]:
+        response = self._client.search(
+            index=self._collection_name,
+            body=self._vector_search_body(
+                query_vector, self._plan_vector_search(**kwargs), **kwargs
+            ),
+        )
+        return self._documents_from_response(response, with_score=True)
+
+    def search_by_vectors(
+        self, query_vectors: np.ndarray, **kwargs: Any
+    ) -> list[list[Document]]:
+        if len(query_vectors) == 0:
+            return []
+        plan = self._plan_vector_search(**kwargs)
+        responses = self._msearch(
+            [
+                self._vector_search_body(query_vector, plan, **kwargs)
+                for query_vector in query_vectors
+            ]
+        )
+        return [
+            self._documents_from_response(response, with_score=True)
+            for response in responses
         ]
 
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
@@ -216,53 +418,85 @@ class ElasticsearchVectorStore(BaseVectorStore):
         :param size:
         :return:
         """
-        metadata_filter = kwargs.get("metadata_filter", None)
-        from_ = kwargs.get("from_", 0)
-        size = kwargs.get("size", 10)
-        sort_by_created_at = kwargs.get("sort_by_created_at", False)
-
-        must_statements = []
-        if query:
-            must_statements.append({"match": {"page_content": query}})
-
-        if metadata_filter:
-            for key, value in metadata_filter.items():
-                if value is not None:
-                    must_statements.append({"term": {f"metadata.{key}.keyword": value}})
         try:
-            sort = (
-                [{"metadata.created_at": {"order": "desc"}}]
-                if sort_by_created_at
-                else None
-            )
             response = self._client.search(
                 index=self._collection_name,
-                query={"bool": {"must": must_statements}},
-                from_=from_,
-                size=size,
-                sort=sort,
+                body=self._full_text_search_body(query, **kwargs),
             )
-
-            return [
-                Document(
-                    pk=hit["_id"],
-                    page_content=hit["_source"]["page_content"],
-                    metadata=hit["_source"]["metadata"],
-                )
-                for hit in response["hits"]["hits"]
-            ]
+            return self._documents_from_response(response)
         except elasticsearch.NotFoundError:
             return []
 
+    def search_by_full_texts(self, queries: list[str], **kwargs: Any) -> list[list[Document]]:
+        if not queries:
+            return []
+        responses = self._msearch(
+            [self._full_text_search_body(query, **kwargs) for query in queries]
+        )
+        return [self._documents_from_response(response) for response in responses]
+
+    def search_by_full_text_page(self, query: str, **kwargs: Any) -> SearchPage:
+        """Deep pagination with search_after on a point in time, no from/size window limit"""
+        size = kwargs.get("size", 10)
+        keep_alive = kwargs.get("keep_alive", "1m")
+        state = decode_cursor(kwargs.get("cursor", None)) or {}
+
+        pit_id = state.get("pit")
+        if pit_id is None:
+            try:
+                pit_id = self._client.open_point_in_time(
+                    index=self._collection_name, keep_alive=keep_alive
+                )["id"]
+            except elasticsearch.NotFoundError:
+                return SearchPage(documents=[], total=0)
+
+        search_body = self._full_text_search_body(query, **kwargs)
+        search_body.pop("from", None)
+        # _shard_doc 作为最后的排序键，保证 search_after 翻页结果稳定
+        search_body["sort"] = search_body.get("sort", [{"_score": {"order": "desc"}}]) + [
+            {"_shard_doc": {"order": "asc"}}
+        ]
+        search_body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+        search_body["track_total_hits"] = kwargs.get("track_total_hits", True)
+        if state.get("search_after"):
+            search_body["search_after"] = state["search_after"]
+
+        response = self._client.search(body=search_body)
+        hits = response["hits"]["hits"]
+        pit_id = response.get("pit_id", pit_id)
+        total = response["hits"].get("total", {}).get("value") if search_body["track_total_hits"] else None
+
+        if len(hits) == size:
+            cursor = encode_cursor({"pit": pit_id, "search_after": hits[-1]["sort"]})
+        else:
+            cursor = None
+            try:
+                self._client.close_point_in_time(id=pit_id)
+            except elasticsearch.ApiError as e:
+                logger.warning(f"Failed to close point in time: {e}")
+        return SearchPage(
+            documents=self._documents_from_response(response),
+            cursor=cursor,
+            total=total,
+        )
+
     def _init_client(self, config: ElasticSearchConfig) -> Elasticsearch:
-        return Elasticsearch(
-            config.url,
-            http_auth=(
-                (config.username, config.password)
-                if config.username and config.password
-                else None
+        return get_client_registry().get(
+            "elasticsearch",
+            config,
+            lambda: Elasticsearch(
+                config.url,
+                http_auth=(
+                    (config.username, config.password)
+                    if config.username and config.password
+                    else None
+                ),
+                verify_certs=False,
+                serializer=VectorJsonSerializer(),
+                # 每个节点保持的 keep-alive 连接数
+                connections_per_node=config.pool_size,
             ),
-            verify_certs=False,
+            health_check=lambda client: client.ping(),
         )
 
     def text_exists(self, id: str) -> bool:
@@ -0,0 +1,376 @@
+"""
+Backend independent metadata filter.
+
+A filter is a JSON object, every key of an object must hold (AND):
+
+    {"filename": "a.pdf"}                          eq (a list value means in)
+    {"user_id": {"in": ["u1", "u2"]}}              in
+    {"created_at": {"gte": 1700000000, "lt": ...}} range: gt / gte / lt / lte
+    {"page": {"exists": true}}                     the field is set and not null
+    {"and": [...]}, {"or": [...]}, {"not": {...}}  boolean combinations
+
+Fields are metadata keys, and a field should hold one scalar type across documents
+(Elasticsearch maps every field to a single type, and Elasticsearch / qdrant match array
+values by member). Ranges only apply to numbers, `created_at` also accepts ISO 8601
+strings which are converted to epoch seconds like the stored value.
+
+Compared with the previous `{key: value}` filters:
+- a shorthand value of None, "" or [] still means "do not filter on this key";
+- equality is type strict on every backend, {"page": "1"} no longer matches a stored 1
+  (pgvector used to compare the text of the value), use {"page": 1}.
+
+`parse_filter` builds the filter tree, each backend compiles it to its native
+pre-filter. A filter a backend cannot express raises `UnsupportedFilterError`,
+it is never dropped or applied after the search.
+"""
+import json
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from pydantic import VERSION as PYDANTIC_VERSION
+from pydantic import BaseModel
+
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+FIELD_OPERATORS = ("eq", "in", "exists") + RANGE_OPERATORS
+TIMESTAMP_FIELDS = ("created_at",)
+
+
+class UnsupportedFilterError(ValueError):
+    pass
+
+
+class Condition(BaseModel):
+    field: str
+    op: str
+    value: Any = None
+
+
+class Group(BaseModel):
+    op: str
+    children: list[Union["Group", Condition]]
+
+
+if PYDANTIC_VERSION.startswith("1."):
+    Group.update_forward_refs()
+else:
+    Group.model_rebuild()
+
+FilterNode = Union[Group, Condition]
+
+
+def _normalize_range_value(field: str, value):
+    if field in TIMESTAMP_FIELDS and isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+        except ValueError:
+            raise ValueError(f"Invalid {field} value: {value}")
+    if not _is_number(value):
+        raise ValueError(f"Range on {field} expects a number, got {value!r}")
+    return value
+
+
+def _parse_field(field: str, spec) -> list[FilterNode]:
+    if not isinstance(field, str) or not field:
+        raise ValueError(f"Invalid filter field: {field!r}")
+    if not isinstance(spec, dict):
+        if isinstance(spec, list):
+            return [Condition(field=field, op="in", value=spec)]
+        return [Condition(field=field, op="eq", value=spec)]
+
+    conditions = []
+    for op, value in spec.items():
+        if op not in FIELD_OPERATORS:
+            raise ValueError(f"Unsupported filter operator on {field}: {op}")
+        if op == "in":
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"Operator in on {field} expects a non empty list")
+        elif op == "exists":
+            value = bool(value)
+        elif op in RANGE_OPERATORS:
+            value = _normalize_range_value(field, value)
+        elif isinstance(value, (dict, list)):
+            raise ValueError(f"Operator eq on {field} expects a scalar value")
+        conditions.append(Condition(field=field, op=op, value=value))
+    if not conditions:
+        raise ValueError(f"Empty filter on {field}")
+    return conditions
+
+
+def _parse(raw) -> FilterNode:
+    if not isinstance(raw, dict) or not raw:
+        raise ValueError(f"Invalid filter: {raw!r}")
+    children = []
+    for key, value in raw.items():
+        if key in ("and", "or"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"Operator {key} expects a non empty list of filters")
+            children.append(Group(op=key, children=[_parse(item) for item in value]))
+        elif key == "not":
+            children.append(Group(op="not", children=[_parse(value)]))
+        elif _is_empty(value):
+            # 与原有的简单过滤一致，值为 None、"" 或 [] 的字段表示不过滤
+            continue
+        else:
+            children.extend(_parse_field(key, value))
+    if not children:
+        raise ValueError(f"Invalid filter: {raw!r}")
+    return children[0] if len(children) == 1 else Group(op="and", children=children)
+
+
+def parse_filter(raw: Optional[dict]) -> Optional[FilterNode]:
+    """Parse a metadata filter, returns None when there is nothing to filter on"""
+    if not raw:
+        return None
+    if all(key not in ("and", "or", "not") and _is_empty(value) for key, value in raw.items()):
+        return None
+    return _parse(raw)
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == []
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _equals(value, expected) -> bool:
+    # 数字之间按数值比较，其他类型必须类型相同，"5" 与 5 不相等
+    if _is_number(value) and _is_number(expected):
+        return value == expected
+    return type(value) is type(expected) and value == expected
+
+
+def matches(node: Optional[FilterNode], metadata: dict) -> bool:
+    """Reference semantics of a filter, every backend compiler must agree with it"""
+    if node is None:
+        return True
+    if isinstance(node, Group):
+        if node.op == "and":
+            return all(matches(child, metadata) for child in node.children)
+        if node.op == "or":
+            return any(matches(child, metadata) for child in node.children)
+        return not matches(node.children[0], metadata)
+
+    value = (metadata or {}).get(node.field)
+    if node.op == "exists":
+        return (value is not None) == node.value
+    if node.op == "eq":
+        return _equals(value, node.value)
+    if node.op == "in":
+        return any(_equals(value, item) for item in node.value)
+    if not _is_number(value):
+        return False
+    return {
+        "gt": value > node.value,
+        "gte": value >= node.value,
+        "lt": value < node.value,
+        "lte": value <= node.value,
+    }[node.op]
+
+
+def to_elasticsearch(node: FilterNode, prefix: str = "metadata") -> dict:
+    """Compile to an Elasticsearch query, used as knn `filter` and in bool `filter`"""
+    if isinstance(node, Group):
+        children = [to_elasticsearch(child, prefix) for child in node.children]
+        if node.op == "and":
+            return {"bool": {"filter": children}}
+        if node.op == "or":
+            return {"bool": {"should": children, "minimum_should_match": 1}}
+        return {"bool": {"must_not": children}}
+
+    field = f"{prefix}.{node.field}"
+    # 动态映射下字符串是 text + keyword 子字段，精确匹配需要使用 .keyword
+    if node.op == "eq":
+        key = f"{field}.keyword" if isinstance(node.value, str) else field
+        return {"term": {key: node.value}}
+    if node.op == "in":
+        if all(isinstance(item, str) for item in node.value):
+            return {"terms": {f"{field}.keyword": node.value}}
+        if any(isinstance(item, str) for item in node.value):
+            return {"bool": {"should": [
+                to_elasticsearch(Condition(field=node.field, op="eq", value=item), prefix)
+                for item in node.value
+            ], "minimum_should_match": 1}}
+        return {"terms": {field: node.value}}
+    if node.op == "exists":
+        query = {"exists": {"field": field}}
+        return query if node.value else {"bool": {"must_not": [query]}}
+    return {"range": {field: {node.op: node.value}}}
+
+
+def _milvus_literal(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    # json 字符串转义规则与 Milvus 字符串字面量一致
+    return json.dumps(value, ensure_ascii=False)
+
+
+def to_milvus_expr(node: FilterNode, json_field: str = "metadata") -> str:
+    """Compile to a Milvus boolean expression on the JSON metadata field"""
+    if isinstance(node, Group):
+        children = [f"({to_milvus_expr(child, json_field)})" for child in node.children]
+        if node.op == "and":
+            return " and ".join(children)
+        if node.op == "or":
+            return " or ".join(children)
+        return f"not {children[0]}"
+
+    field = f"{json_field}[{json.dumps(node.field, ensure_ascii=False)}]"
+    if node.op == "eq":
+        return f"{field} == {_milvus_literal(node.value)}"
+    if node.op == "in":
+        return f"{field} in [{', '.join(_milvus_literal(item) for item in node.value)}]"
+    if node.op == "exists":
+        raise UnsupportedFilterError("Milvus does not support the exists filter on JSON fields")
+    operator = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}[node.op]
+    return f"{field} {operator} {_milvus_literal(node.value)}"
+
+
+def to_qdrant_filter(node: FilterNode, prefix: str = "metadata"):
+    """Compile to a qdrant `Filter`"""
+    from qdrant_client.http import models
+
+    if isinstance(node, Group):
+        children = [to_qdrant_filter(child, prefix) for child in node.children]
+        if node.op == "and":
+            return models.Filter(must=children)
+        if node.op == "or":
+            return models.Filter(should=children)
+        return models.Filter(must_not=children)
+
+    key = f"{prefix}.{node.field}"
+    if node.op == "eq":
+        condition = _qdrant_equals(models, key, node.value)
+    elif node.op == "in":
+        kinds = {_qdrant_value_kind(value) for value in node.value}
+        if len(kinds) > 1:
+            raise UnsupportedFilterError(f"qdrant cannot match {node.field} against values of mixed types")
+        if kinds == {"str"}:
+            condition = models.FieldCondition(key=key, match=models.MatchAny(any=node.value))
+        elif kinds == {"int"}:
+            values = [int(value) for value in node.value]
+            condition = models.FieldCondition(key=key, match=models.MatchAny(any=values))
+        else:
+            # MatchAny 只接受字符串或整数列表
+            return models.Filter(should=[_qdrant_equals(models, key, value) for value in node.value])
+    elif node.op == "exists":
+        empty = models.IsEmptyCondition(is_empty=models.PayloadField(key=key))
+        return models.Filter(must_not=[empty]) if node.value else models.Filter(must=[empty])
+    else:
+        condition = models.FieldCondition(key=key, range=models.Range(**{node.op: node.value}))
+    return models.Filter(must=[condition])
+
+
+def _qdrant_value_kind(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        # 整数值的浮点数与整数一样可以用 MatchAny
+        return "int" if value.is_integer() else "float"
+    if isinstance(value, str):
+        return "str"
+    raise UnsupportedFilterError(f"qdrant cannot match the value {value!r}")
+
+
+def _qdrant_equals(models, key: str, value):
+    kind = _qdrant_value_kind(value)
+    if kind == "float":
+        # MatchValue 不接受浮点数，数值相等用闭区间表示
+        return models.FieldCondition(key=key, range=models.Range(gte=value, lte=value))
+    if kind == "int":
+        value = int(value)
+    return models.FieldCondition(key=key, match=models.MatchValue(value=value))
+
+
+def to_sql(node: FilterNode, column: str = "meta_data", param_prefix: str = "filter") -> tuple[str, dict]:
+    """
+    Compile to a parameterized predicate on a JSON(B) column. Keys and values are
+    bound parameters, every leaf is two-valued so `not` also matches missing keys.
+    """
+    params = {}
+    document = f"{column}::jsonb"
+
+    def param(value) -> str:
+        name = f"{param_prefix}_{len(params)}"
+        params[name] = value
+        return f":{name}"
+
+    def compile_node(node: FilterNode) -> str:
+        if isinstance(node, Group):
+            children = [compile_node(child) for child in node.children]
+            if node.op == "and":
+                return "(" + " AND ".join(children) + ")"
+            if node.op == "or":
+                return "(" + " OR ".join(children) + ")"
+            return f"(NOT {children[0]})"
+
+        key = f"CAST({param(node.field)} AS text)"
+        # jsonb 相等比较区分类型，"5" 与 5 不相等；不用 @> 包含运算，它会匹配数组中的元素
+        if node.op == "eq":
+            predicate = f"({document} -> {key}) = CAST({param(json.dumps(node.value))} AS jsonb)"
+        elif node.op == "in":
+            predicate = (
+                f"EXISTS (SELECT 1 FROM jsonb_array_elements(CAST({param(json.dumps(node.value))} AS jsonb)) "
+                f"AS item(value) WHERE item.value = ({document} -> {key}))"
+            )
+        elif node.op == "exists":
+            predicate = f"COALESCE(jsonb_typeof({document} -> {key}), 'null') <> 'null'"
+            if not node.value:
+                predicate = f"NOT ({predicate})"
+        else:
+            operator = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}[node.op]
+            # CASE 保证只对数字做类型转换，其他类型的值不满足范围条件
+            predicate = (
+                f"CASE WHEN jsonb_typeof({document} -> {key}) = 'number' "
+                f"THEN ({document} ->> {key})::numeric {operator} {param(node.value)} END"
+            )
+        return f"COALESCE({predicate}, false)"
+
+    return compile_node(node), params
+
+
+def to_weaviate_where(node: FilterNode) -> dict:
+    """Compile to a Weaviate `where` filter on object properties"""
+    if isinstance(node, Group):
+        if node.op == "not":
+            raise UnsupportedFilterError("Weaviate does not support the not filter")
+        return {
+            "operator": "And" if node.op == "and" else "Or",
+            "operands": [to_weaviate_where(child) for child in node.children],
+        }
+
+    def value_key(value) -> str:
+        if isinstance(value, bool):
+            return "valueBoolean"
+        if isinstance(value, int):
+            return "valueInt"
+        if isinstance(value, float):
+            return "valueNumber"
+        return "valueText"
+
+    path = [node.field]
+    if node.op == "eq":
+        return {"path": path, "operator": "Equal", value_key(node.value): node.value}
+    if node.op == "in":
+        return {
+            "operator": "Or",
+            "operands": [
+                {"path": path, "operator": "Equal", value_key(item): item}
+                for item in node.value
+            ],
+        }
+    if node.op == "exists":
+        return {"path": path, "operator": "IsNull", "valueBoolean": not node.value}
+    operator = {
+        "gt": "GreaterThan",
+        "gte": "GreaterThanEqual",
+        "lt": "LessThan",
+        "lte": "LessThanEqual",
+    }[node.op]
+    return {"path": path, "operator": operator, value_key(node.value): node.value}
+
@@ -1,4 +1,5 @@
-import logging
+import threading
+import time
 from typing import Any
 from uuid import uuid4
 
@@ -9,7 +10,12 @@ from pymilvus import MilvusClient, MilvusException, connections
 from core.middleware.redis_client import redis_client
 from core.models.document import Document
 from core.models.field import Field
-from core.storage.vectorstore.vector_store_base import BaseVectorStore
+from core.storage.vectorstore.client_registry import get_client_registry
+from core.storage.vectorstore.filters import parse_filter, to_milvus_expr
+from core.storage.vectorstore.vector_store_base import (
+    BaseVectorStore,
+    normalize_search_params,
+)
 
 
 class MilvusConfig(BaseModel):
@@ -19,6 +25,13 @@ class MilvusConfig(BaseModel):
     password: str
     secure: bool = False
     batch_size: int = 100
+    replica_number: int = 1
+    collection_state_ttl: int = 60
+
+    @property
+    def uri(self) -> str:
+        scheme = "https" if self.secure else "http"
+        return f"{scheme}://{self.host}:{self.port}"
 
     def validate_config(cls, values: dict) -> dict:
         if not values["host"]:
@@ -41,12 +54,21 @@ class MilvusConfig(BaseModel):
         }
 
 
+_collection_states = {}
+_collection_states_lock = threading.Lock()
+
+
+def _close_connection(alias: str):
+    connections.disconnect(alias)
+
+
 class MilvusVector(BaseVectorStore):
 
     def __init__(self, collection_name: str, config: MilvusConfig):
         super().__init__(collection_name)
         self._client_config = config
         self._client = self._init_client(config)
+        self._alias = self._init_connection(config)
         self._consistency_level = "Session"
         self._fields = []
 
@@ -102,9 +124,13 @@ class MilvusVector(BaseVectorStore):
             self._client.delete(collection_name=self._collection_name, pks=ids)
 
     def get_ids_by_metadata_field(self, key: str, value: str):
+        node = parse_filter({key: value})
+        if node is None:
+            # 值为空时没有过滤条件，不能当作匹配所有文档
+            return None
         result = self._client.query(
             collection_name=self._collection_name,
-            filter=f'metadata["{key}"] == "{value}"',
+            filter=to_milvus_expr(node, Field.METADATA_KEY.value),
             output_fields=["id"],
         )
         if result:
@@ -122,84 +148,86 @@ class MilvusVector(BaseVectorStore):
         self._client.delete(collection_name=self._collection_name, pks=doc_ids)
 
     def delete(self) -> None:
-        alias = uuid4().hex
-        if self._client_config.secure:
-            uri = (
-                "https://"
-                + str(self._client_config.host)
-                + ":"
-                + str(self._client_config.port)
-            )
-        else:
-            uri = (
-                "http://"
-                + str(self._client_config.host)
-                + ":"
-                + str(self._client_config.port)
-            )
-        connections.connect(
-            alias=alias,
-            uri=uri,
-            user=self._client_config.user,
-            password=self._client_config.password,
-        )
-
         from pymilvus import utility
 
-        if utility.has_collection(self._collection_name, using=alias):
-            utility.drop_collection(self._collection_name, None, using=alias)
+        if self._has_collection():
+            utility.drop_collection(self._collection_name, using=self._alias)
+        self._invalidate_collection_state()
+        redis_client.delete("vector_indexing_{}".format(self._collection_name))
 
     def text_exists(self, id: str) -> bool:
-        alias = uuid4().hex
-        if self._client_config.secure:
-            uri = (
-                "https://"
-                + str(self._client_config.host)
-                + ":"
-                + str(self._client_config.port)
-            )
-        else:
-            uri = (
-                "http://"
-                + str(self._client_config.host)
-                + ":"
-                + str(self._client_config.port)
+        return id in self.texts_exist([id])
+
+    def texts_exist(self, ids: list[str]) -> set[str]:
+        """Doc ids of `ids` that are already stored, checked with one query per 1000 ids"""
+        if not ids or not self._ensure_loaded():
+            return set()
+        existing = set()
+        for i in range(0, len(ids), 1000):
+            result = self._client.query(
+                collection_name=self._collection_name,
+                filter=to_milvus_expr(
+                    parse_filter({"doc_id": ids[i : i + 1000]}), Field.METADATA_KEY.value
+                ),
+                output_fields=[Field.METADATA_KEY.value],
             )
-        connections.connect(
-            alias=alias,
-            uri=uri,
-            user=self._client_config.user,
-            password=self._client_config.password,
-        )
-
+            existing.update(item[Field.METADATA_KEY.value]["doc_id"] for item in result)
+        return existing
+
+    def _collection_state(self) -> dict:
+        """
+        In process cache of has_collection / load state, expires after collection_state_ttl.
+        Only a collection that exists is cached, so one created by another process is seen
+        on the next call.
+        """
+        key = (self._alias, self._collection_name)
+        with _collection_states_lock:
+            state = _collection_states.get(key)
+            if state is None or state["expires_at"] < time.time():
+                state = {
+                    "exists": None,
+                    "loaded": False,
+                    "expires_at": time.time() + self._client_config.collection_state_ttl,
+                }
+                _collection_states[key] = state
+            return state
+
+    def _invalidate_collection_state(self):
+        with _collection_states_lock:
+            _collection_states.pop((self._alias, self._collection_name), None)
+
+    def _has_collection(self) -> bool:
         from pymilvus import utility
 
-        if not utility.has_collection(self._collection_name, using=alias):
-            return False
-
-        result = self._client.query(
-            collection_name=self._collection_name,
-            filter=f'metadata["doc_id"] == "{id}"',
-            output_fields=["id"],
-        )
-
-        return len(result) > 0
+        state = self._collection_state()
+        if not state["exists"]:
+            state["exists"] = utility.has_collection(
+                self._collection_name, using=self._alias
+            )
+        return state["exists"]
 
-    def search_by_vector(
-        self, query_vector: list[float], **kwargs: Any
-    ) -> list[Document]:
+    def _ensure_loaded(self) -> bool:
+        """Load the collection with the configured replicas if needed, False when it does not exist"""
+        if not self._has_collection():
+            return False
+        state = self._collection_state()
+        if not state["loaded"]:
+            from pymilvus import Collection, utility
+            from pymilvus.client.types import LoadState
+
+            if utility.load_state(self._collection_name, using=self._alias) != LoadState.Loaded:
+                Collection(self._collection_name, using=self._alias).load(
+                    replica_number=self._client_config.replica_number
+                )
+            state["loaded"] = True
+        return True
 
-        # Set search parameters.
-        results = self._client.search(
-            collection_name=self._collection_name,
-            data=[query_vector],
-            limit=kwargs.get("top_k", 4),
-            output_fields=[Field.CONTENT_KEY.value, Field.METADATA_KEY.value],
-        )
-        # Organize results.
+    def _documents_from_hits(self, hits, **kwargs: Any) -> list[Document]:
         docs = []
-        for result in results[0]:
-            metadata = result["entity"].get(Field.METADATA_KEY.value)
+        for result in hits:
+            metadata = self._project_metadata(
+                result["entity"].get(Field.METADATA_KEY.value), kwargs.get("fields", None)
+            )
             metadata["score"] = result["distance"]
             score_threshold = (
                 kwargs.get("score_threshold") if kwargs.get("score_threshold") else 0.0
@@ -209,10 +237,55 @@ class MilvusVector(BaseVectorStore):
                     page_content=result["entity"].get(Field.CONTENT_KEY.value),
                     metadata=metadata,
                     pk=str(result["id"]),
+                    vector=result["entity"].get(Field.VECTOR.value),
                 )
                 docs.append(doc)
         return docs
 
+    @staticmethod
+    def _search_params(**kwargs: Any) -> dict:
+        """
+        Map search_params to the HNSW `ef` (or IVF `nprobe`) of the search.
+        Milvus has no brute force search on an indexed collection, `exact` searches
+        with the largest ef Milvus accepts instead.
+        """
+        search_params = normalize_search_params(kwargs.get("search_params"))
+        top_k = kwargs.get("top_k", 4)
+        params = {}
+        if search_params.get("mode") == "exact":
+            params["ef"] = 32768
+        elif search_params.get("ef"):
+            params["ef"] = max(search_params["ef"], top_k)
+        if search_params.get("nprobe"):
+            params["nprobe"] = search_params["nprobe"]
+        return {"metric_type": "IP", "params": params}
+
+    def search_by_vector(
+        self, query_vector: list[float], **kwargs: Any
+    ) -> list[Document]:
+        return self.search_by_vectors([query_vector], **kwargs)[0]
+
+    def search_by_vectors(self, query_vectors, **kwargs: Any) -> list[list[Document]]:
+        if len(query_vectors) == 0:
+            return []
+        if not self._ensure_loaded():
+            return [[] for _ in query_vectors]
+        output_fields = [Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
+        if kwargs.get("include_vectors", False):
+            output_fields.append(Field.VECTOR.value)
+        node = parse_filter(kwargs.get("metadata_filter", None))
+        # Milvus searches every query vector of `data` in one request.
+        results = self._client.search(
+            collection_name=self._collection_name,
+            data=list(query_vectors),
+            filter=to_milvus_expr(node, Field.METADATA_KEY.value) if node is not None else "",
+            limit=kwargs.get("top_k", 4),
+            output_fields=output_fields,
+            search_params=self._search_params(**kwargs),
+        )
+        # Organize results.
+        return [self._documents_from_hits(hits, **kwargs) for hits in results]
+
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
         # milvus/zilliz doesn't support bm25 search
         return []
@@ -226,32 +299,8 @@ class MilvusVector(BaseVectorStore):
             )
             if redis_client.get(collection_exist_cache_key):
                 return
-            # Grab the existing collection if it exists
-            from pymilvus import utility
-
-            alias = uuid4().hex
-            if self._client_config.secure:
-                uri = (
-                    "https://"
-                    + str(self._client_config.host)
-                    + ":"
-                    + str(self._client_config.port)
-                )
-            else:
-                uri = (
-                    "http://"
-                    + str(self._client_config.host)
-                    + ":"
-                    + str(self._client_config.port)
-                )
-            connections.connect(
-                alias=alias,
-                uri=uri,
-                user=self._client_config.user,
-                password=self._client_config.password,
-            )
-            if not utility.has_collection(self._collection_name, using=alias):
-                from pymilvus import CollectionSchema, DataType, FieldSchema
+            if not self._has_collection():
+                from pymilvus import Collection, CollectionSchema, DataType, FieldSchema
 
                 # Determine embedding dim
                 fields = []
@@ -291,25 +340,51 @@ class MilvusVector(BaseVectorStore):
                 # Create the collection
                 collection_name = self._collection_name
 
-                self._client.create_collection_with_schema(
-                    collection_name=collection_name,
-                    schema=schema,
-                    index_param={
+                collection = Collection(
+                    collection_name,
+                    schema,
+                    using=self._alias,
+                    consistency_level=self._consistency_level,
+                )
+                collection.create_index(
+                    Field.VECTOR.value,
+                    {
                         "metric_type": "IP",
                         "index_type": "HNSW",
                         "params": {"M": 8, "efConstruction": 64},
                     },
-                    consistency_level=self._consistency_level,
                 )
+                self._invalidate_collection_state()
+            self._ensure_loaded()
             redis_client.set(collection_exist_cache_key, 1, ex=3600)
 
     def _init_client(self, config: MilvusConfig) -> MilvusClient:
-        if config.secure:
-            uri = "https://" + str(config.host) + ":" + str(config.port)
-        else:
-            uri = "http://" + str(config.host) + ":" + str(config.port)
-        client = MilvusClient(uri=uri, user=config.user, password=config.password)
-        return client
+        return get_client_registry().get(
+            "milvus",
+            config,
+            lambda: MilvusClient(uri=config.uri, user=config.user, password=config.password),
+            health_check=lambda client: client.list_collections(),
+        )
+
+    @staticmethod
+    def _init_connection(config: MilvusConfig) -> str:
+        """Alias of the ORM connection used by utility / Collection, one per config"""
+
+        def create():
+            alias = uuid4().hex
+            connections.connect(
+                alias=alias, uri=config.uri, user=config.user, password=config.password
+            )
+            return alias
+
+        def health_check(alias: str):
+            from pymilvus import utility
+
+            return utility.get_server_version(using=alias)
+
+        return get_client_registry().get(
+            "milvus-connection", config, create, health_check=health_check, close=_close_connection
+        )
 
     def get_metadata_key_unique_values(self, key: str) -> list[str]:
         return []
@@ -1,10 +1,25 @@
+import io
+import json
+import struct
+import threading
+from typing import Optional
+import numpy as np
+from loguru import logger
 from pydantic import BaseModel
 from core.models.document import Document
-from core.storage.vectorstore.vector_store_base import BaseVectorStore
+from core.storage.vectorstore.client_registry import get_client_registry
+from core.storage.vectorstore.filters import parse_filter, to_sql
+from core.storage.vectorstore.vector_store_base import (
+    BaseVectorStore,
+    SearchPage,
+    decode_cursor,
+    encode_cursor,
+    normalize_search_params,
+)
 from sqlalchemy import create_engine, Column, String, Text, JSON, select, DateTime, and_
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from core.utils import chunk_list, generate_md5
+from sqlalchemy.orm import scoped_session, sessionmaker
+from core.utils import generate_md5
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.sql.expression import text
 from sqlalchemy.dialects.postgresql import array
@@ -12,11 +27,33 @@ from sqlalchemy.dialects.postgresql import array
 Base = declarative_base()
 
 
+# distance -> (pgvector comparator, SQL operator, operator class of the index)
+DISTANCES = {
+    "l2": ("l2_distance", "<->", "vector_l2_ops"),
+    "cosine": ("cosine_distance", "<=>", "vector_cosine_ops"),
+    "ip": ("max_inner_product", "<#>", "vector_ip_ops"),
+}
+INDEX_TYPES = ("hnsw", "ivfflat", "none")
+
+
 class PGVectorConfig(BaseModel):
     url: str
     pool_size: int = 5
     max_overflow: int = 10
-    batch_size: int = 100
+    pool_recycle: int = 3600
+    # 每批 COPY + upsert 的行数，每批单独提交
+    batch_size: int = 1000
+    distance: str = "l2"
+    index_type: str = "hnsw"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    # 0 表示按行数自动选择：rows / 1000，超过 100 万行时 sqrt(rows)
+    ivfflat_lists: int = 0
+    ivfflat_probes: int = 1
+    # 向量索引推迟到表里至少有这么多行时再建，IVFFlat 需要数据来训练聚类中心
+    index_min_rows: int = 1000
+    maintenance_work_mem: Optional[str] = None
 
     def validate_config(cls, values: dict) -> dict:
         if not values["url"]:
@@ -24,21 +61,95 @@ class PGVectorConfig(BaseModel):
         return values
 
 
-session = None
-engine = None
+def create_session(config: PGVectorConfig):
+    """Engine and thread-local sessions shared by every knowledge base with the same config"""
 
+    def create():
+        engine = create_engine(
+            config.url,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            # 取出连接前检查是否可用，数据库重启后不会拿到失效连接
+            pool_pre_ping=True,
+            pool_recycle=config.pool_recycle,
+        )
+        # 每个线程使用独立的 session，并发的检索和写入不会共用同一个连接
+        return engine, scoped_session(sessionmaker(bind=engine))
+
+    return get_client_registry().get(
+        "pgvector", config, create, close=lambda client: client[0].dispose()
+    )
+
+
+# Postgres 会把超过 63 字节的标识符截断，截断后按名字就查不到索引了
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def vector_index_name(collection_name: str) -> str:
+    """Name of the vector index, at most 63 characters so Postgres never truncates it"""
+    name = f"idx_{collection_name}_vec"
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        name = f"idx_{generate_md5(collection_name)}_vec"
+    return name
 
-def create_session(config: PGVectorConfig):
-    global engine
-    global session
-    
-    if session and engine:
-        return engine, session
-    
-    engine = create_engine(config.url, pool_size=config.pool_size, max_overflow=config.max_overflow)
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    return engine, session
+
+_tables = {}
+_tables_lock = threading.Lock()
+# 已经确认有向量索引的表，避免每次写入后都查询 pg_indexes
+_indexed_tables = set()
+
+
+def get_table(collection_name: str, dimension: int):
+    """ORM class of a knowledge base table, declared once per process"""
+    key = (collection_name, dimension)
+    table = _tables.get(key)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(key)
+            if table is None:
+
+                class PGVectorDocument(Base):
+                    __tablename__ = collection_name
+                    __table_args__ = {"extend_existing": True}
+                    id = Column(String(64), primary_key=True)
+                    meta_data = Column(JSON)
+                    page_content = Column(Text)
+                    created_at = Column(
+                        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)")
+                    )
+                    updated_at = Column(
+                        DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)")
+                    )
+                    embeddings = Column(Vector(dimension))  # 使用 BYTEA 存储向量数据
+
+                table = _tables[key] = PGVectorDocument
+    return table
+
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+
+def encode_copy_rows(texts: list[Document], embeddings: np.ndarray) -> bytes:
+    """
+    Encode (id, meta_data, page_content, embeddings) rows in the binary COPY format.
+    jsonb is a version byte followed by the json text, vector is int16 dim,
+    int16 unused, then big-endian float4 values.
+    """
+    vectors = np.asarray(embeddings, dtype=">f4")
+    vector_header = struct.pack("!hh", vectors.shape[1], 0) if len(vectors) else b""
+    buffer = [COPY_HEADER]
+    for doc, vector in zip(texts, vectors):
+        id_ = generate_md5(doc.page_content).encode("utf-8")
+        meta_data = b"\x01" + json.dumps(doc.metadata, ensure_ascii=False).encode("utf-8")
+        page_content = doc.page_content.encode("utf-8")
+        vector = vector_header + vector.tobytes()
+        buffer.append(struct.pack("!h", 4))
+        for value in (id_, meta_data, page_content, vector):
+            buffer.append(struct.pack("!i", len(value)))
+            buffer.append(value)
+    buffer.append(COPY_TRAILER)
+    return b"".join(buffer)
 
 
 class PGVectorStore(BaseVectorStore):
@@ -46,22 +157,12 @@ class PGVectorStore(BaseVectorStore):
         super().__init__(collection_name)
         self._client_config = config
         self._engine, self._session = create_session(config)
-
-        class PGVectorDocument(Base):
-            __tablename__ = self._collection_name
-            __table_args__ = {"extend_existing": True}
-            id = Column(String(64), primary_key=True)
-            meta_data = Column(JSON)
-            page_content = Column(Text)
-            created_at = Column(
-                DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)")
-            )
-            updated_at = Column(
-                DateTime, nullable=False, server_default=text("CURRENT_TIMESTAMP(0)")
-            )
-            embeddings = Column(Vector(dimension))  # 使用 BYTEA 存储向量数据
-
-        self._table = PGVectorDocument
+        self._table = get_table(self._collection_name, dimension)
+        if config.distance not in DISTANCES:
+            raise ValueError(f"config vector.pgvector.distance must be one of {list(DISTANCES)}")
+        if config.index_type not in INDEX_TYPES:
+            raise ValueError(f"config vector.pgvector.index_type must be one of {list(INDEX_TYPES)}")
+        self._distance_method, self._distance_operator, self._index_opclass = DISTANCES[config.distance]
 
     def create_collection(self, **kwargs) -> BaseVectorStore:
         dimension = kwargs.get("dimension")
@@ -86,46 +187,181 @@ class PGVectorStore(BaseVectorStore):
                 USING gin(to_tsvector('english', page_content))
                 """
             )
+        # 向量索引在首次批量写入后由 ensure_vector_index 创建，空表上建索引没有意义
+
+    @property
+    def _vector_index_name(self) -> str:
+        return vector_index_name(self._collection_name)
+
+    def _vector_index_state(self, cached: bool = True) -> Optional[bool]:
+        """None when there is no vector index, otherwise whether it is valid"""
+        if cached and self._collection_name in _indexed_tables:
+            return True
+        with self._engine.connect() as conn:
+            row = conn.execute(
+                text(
+                    "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                    "WHERE c.relname = :index"
+                ),
+                index=self._vector_index_name,
+            ).first()
+        if row is None:
+            return None
+        if row[0]:
+            _indexed_tables.add(self._collection_name)
+        return bool(row[0])
+
+    def has_vector_index(self) -> bool:
+        return self._vector_index_state() is True
+
+    def _vector_index_building(self) -> bool:
+        """Whether a CREATE INDEX on the table is in progress (pg_stat_progress_create_index, Postgres 12+)"""
+        try:
+            with self._engine.connect() as conn:
+                row = conn.execute(
+                    text(
+                        "SELECT 1 FROM pg_stat_progress_create_index "
+                        "WHERE relid = CAST(:table AS regclass) LIMIT 1"
+                    ),
+                    table=self._collection_name,
+                ).first()
+        except Exception as e:
+            # 无法判断时当作正在创建，不删除别的进程可能正在创建的索引
+            logger.warning(f"Failed to check index builds of {self._collection_name}: {e}")
+            return True
+        return row is not None
+
+    def ensure_vector_index(self) -> None:
+        """Called by the import worker after bulk loads, builds the vector index once the table has index_min_rows rows"""
+        if self._client_config.index_type == "none":
+            return
+        state = self._vector_index_state()
+        if state is True:
+            return
+        rows = None
+        if state is None:
+            with self._engine.connect() as conn:
+                rows = conn.execute(text(f"SELECT COUNT(*) FROM {self._collection_name}")).scalar()
+            if rows < self._client_config.index_min_rows:
+                return
+        try:
+            self.build_vector_index(rows=rows)
+        except Exception as e:
+            # 索引只影响检索速度，创建失败不影响写入
+            logger.warning(f"Failed to build vector index of {self._collection_name}: {e}")
+
+    def build_vector_index(self, rows: Optional[int] = None, **kwargs) -> dict:
+        """
+        CREATE INDEX CONCURRENTLY the configured HNSW / IVFFlat index, reads and writes
+        are not blocked while it builds, which can take minutes on large tables, so it
+        only runs on the worker. An invalid index left by a failed or interrupted
+        concurrent build is dropped and rebuilt, unless a build is still in progress.
+        """
+        config = self._client_config
+        if config.index_type == "none":
+            return {"index": None, "created": False}
+        state = self._vector_index_state()
+        if state is True:
+            return {"index": self._vector_index_name, "created": False}
+        if state is False and self._vector_index_building():
+            return {"index": self._vector_index_name, "created": False, "building": True}
+
+        if config.index_type == "hnsw":
+            options = f"m = {config.hnsw_m}, ef_construction = {config.hnsw_ef_construction}"
+        else:
+            lists = config.ivfflat_lists
+            if not lists:
+                if rows is None:
+                    with self._engine.connect() as conn:
+                        rows = conn.execute(
+                            text(f"SELECT COUNT(*) FROM {self._collection_name}")
+                        ).scalar()
+                lists = int(rows**0.5) if rows > 1_000_000 else max(1, rows // 1000)
+            options = f"lists = {lists}"
+
+        with self._engine.connect() as connection:
+            # CONCURRENTLY 不能在事务里执行；execution_options 返回的分支连接随 connection 一起关闭
+            conn = connection.execution_options(isolation_level="AUTOCOMMIT")
+            if state is False:
+                conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {self._vector_index_name}")
+            if config.maintenance_work_mem:
+                conn.execute(
+                    text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                    value=config.maintenance_work_mem,
+                )
+            try:
+                conn.execute(
+                    f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {self._vector_index_name}
+                    ON {self._collection_name}
+                    USING {config.index_type} (embeddings {self._index_opclass})
+                    WITH ({options})
+                    """
+                )
+            finally:
+                if config.maintenance_work_mem:
+                    conn.execute("RESET maintenance_work_mem")
+        # 中断的 CONCURRENTLY 创建会留下 indisvalid = false 的索引，确认有效后才缓存
+        if self._vector_index_state(cached=False) is not True:
+            raise Exception(f"Vector index {self._vector_index_name} is invalid after the build")
+        logger.info(f"Built {config.index_type} index {self._vector_index_name} ({options})")
+        return {"index": self._vector_index_name, "created": True}
 
     def add_texts(
         self,
         texts: list[Document],
-        embeddings: list[list[float]],
+        embeddings: np.ndarray,
+        **kwargs,
     ):
-        db_documents = [
-            self._table(
-                id=generate_md5(doc.page_content),
-                page_content=doc.page_content,
-                meta_data=doc.metadata,
-                embeddings=embeddings[index],
+        """
+        Upsert with binary COPY into a temporary staging table, merged into the knowledge
+        base table by one INSERT ... ON CONFLICT per batch. Every batch of `batch_size`
+        rows commits on its own.
+        """
+        if not texts:
+            return
+        staging = f"staging_{self._collection_name}"
+        dimension = len(embeddings[0])
+        conn = self._engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging} (
+                    id varchar(64),
+                    meta_data jsonb,
+                    page_content text,
+                    embeddings vector({dimension})
+                ) ON COMMIT DELETE ROWS
+                """
             )
-            for index, doc in enumerate(texts)
-        ]
-        chunks = chunk_list(db_documents, self._client_config.batch_size)
-        for chunk in chunks:
-            data_ids = [d.id for d in chunk]
-            existing_ids = {
-                id_[0]
-                for id_ in self._session.query(self._table.id).filter(
-                    self._table.id.in_(data_ids)
+            for start in range(0, len(texts), self._client_config.batch_size):
+                end = start + self._client_config.batch_size
+                cursor.copy_expert(
+                    f"COPY {staging} (id, meta_data, page_content, embeddings) FROM STDIN WITH (FORMAT binary)",
+                    io.BytesIO(encode_copy_rows(texts[start:end], embeddings[start:end])),
                 )
-            }
-            updates = [d for d in chunk if d.id in existing_ids]
-            creates = [d for d in chunk if d.id not in existing_ids]
-
-            for update in updates:
-                obj = self._session.query(self._table).get(update.id)
-                obj.page_content = update.page_content
-                obj.meta_data = update.meta_data
-                obj.embeddings = update.embeddings
-
-            self._session.bulk_save_objects(creates)
-
-        try:
-            self._session.commit()
-        except Exception as e:
-            self._session.rollback()
-            raise e
+                # 同一批中内容相同的分段 id 相同，ON CONFLICT 不能在一条语句里更新同一行两次
+                cursor.execute(
+                    f"""
+                    INSERT INTO {self._collection_name} (id, meta_data, page_content, embeddings)
+                    SELECT DISTINCT ON (id) id, meta_data, page_content, embeddings FROM {staging}
+                    ON CONFLICT (id) DO UPDATE SET
+                        meta_data = EXCLUDED.meta_data,
+                        page_content = EXCLUDED.page_content,
+                        embeddings = EXCLUDED.embeddings,
+                        updated_at = CURRENT_TIMESTAMP(0)
+                    """
+                )
+                conn.commit()
+            # 临时表跟随连接存在，连接归还连接池前删除
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
 
     def delete_by_ids(self, ids: list[str]) -> None:
         self._session.query(self._table).filter(self._table.id.in_(ids)).delete(
@@ -134,8 +370,12 @@ class PGVectorStore(BaseVectorStore):
         self._session.commit()
 
     def delete_by_metadata_field(self, key: str, value: str) -> None:
+        clauses, params = self._metadata_filter_clauses({key: value})
+        if not clauses:
+            # 空条件不能变成全表删除
+            return
         q = self._session.query(self._table)
-        q = q.filter(text(f"meta_data->>'{key}' = :value")).params(value=value)
+        q = q.filter(text(" AND ".join(clauses)).bindparams(**params))
         q.delete(synchronize_session=False)
         self._session.commit()
 
@@ -145,7 +385,7 @@ class PGVectorStore(BaseVectorStore):
         size = kwargs.get("size", 10)
         sort_by_created_at = kwargs.get("sort_by_created_at", False)
 
-        q = self._session.query(self._table)
+        q = self._session.query(*self._projected_columns(**kwargs))
         if query:
             q = q.filter(
                 text(
@@ -153,56 +393,192 @@ class PGVectorStore(BaseVectorStore):
                 )
             ).params(query=query)
         # 如果提供了元数据过滤条件
-        if metadata_filter:
-            for key, value in metadata_filter.items():
-                q = q.filter(text(f"meta_data->>'{key}' = :value")).params(value=value)
+        clauses, params = self._metadata_filter_clauses(metadata_filter)
+        if clauses:
+            q = q.filter(text(" AND ".join(clauses)).bindparams(**params))
         if sort_by_created_at:
             q = q.order_by(self._table.created_at.desc())
         q = q.offset(from_).limit(size)
 
-        results = q.all()
-        return [
-            Document(
-                pk=result.id,
-                page_content=result.page_content,
-                metadata=result.meta_data,
+        try:
+            results = q.all()
+        finally:
+            # 只读查询结束后归还连接，检索线程池中的线程不会长期占用连接
+            self._session.close()
+        return [self._document_from_row(result, **kwargs) for result in results]
+
+    def search_by_full_text_page(self, query: str, **kwargs) -> SearchPage:
+        """Keyset pagination on (created_at, id), deep pages cost the same as the first one"""
+        metadata_filter = kwargs.get("metadata_filter", None)
+        size = kwargs.get("size", 10)
+        state = decode_cursor(kwargs.get("cursor", None))
+
+        conditions = []
+        params = {}
+        if query:
+            conditions.append(
+                "to_tsvector('english', page_content) @@ plainto_tsquery('english', :query)"
             )
-            for result in results
-        ]
+            params["query"] = query
+        clauses, filter_params = self._metadata_filter_clauses(metadata_filter)
+        conditions.extend(clauses)
+        params.update(filter_params)
 
-    def search_by_vector(self, query_vector: list[float], **kwargs) -> list[Document]:
+        try:
+            total = None
+            if kwargs.get("track_total_hits", True):
+                total = self._session.execute(
+                    text(
+                        f"SELECT COUNT(*) FROM {self._collection_name}"
+                        + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+                    ),
+                    params,
+                ).scalar()
+
+            if state:
+                conditions.append("(created_at, id) < (:cursor_created_at, :cursor_id)")
+                params["cursor_created_at"] = state["created_at"]
+                params["cursor_id"] = state["id"]
+            columns = [column.name for column in self._projected_columns(**kwargs)]
+            params["size"] = size
+            rows = self._session.execute(
+                text(
+                    f"SELECT {', '.join(columns)}, created_at FROM {self._collection_name}"
+                    + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+                    + " ORDER BY created_at DESC, id DESC LIMIT :size"
+                ),
+                params,
+            ).all()
+        finally:
+            self._session.close()
+
+        cursor = None
+        if len(rows) == size:
+            cursor = encode_cursor(
+                {"created_at": rows[-1].created_at.isoformat(), "id": rows[-1].id}
+            )
+        return SearchPage(
+            documents=[self._document_from_row(row, **kwargs) for row in rows],
+            cursor=cursor,
+            total=total,
+        )
+
+    def _projected_columns(self, **kwargs) -> list:
+        # 默认不读取 embeddings 列，每条结果少传输一个完整向量
+        columns = [self._table.id, self._table.page_content, self._table.meta_data]
+        if kwargs.get("include_vectors", False):
+            columns.append(self._table.embeddings)
+        return columns
+
+    def _document_from_row(self, row, **kwargs) -> Document:
+        metadata = self._project_metadata(row.meta_data, kwargs.get("fields", None))
+        distance = getattr(row, "distance", None)
+        if distance is not None:
+            # 与其他向量库一致，score 越大越相似
+            metadata = {**metadata, "score": self._score(distance)}
+        vector = getattr(row, "embeddings", None)
+        if isinstance(vector, str):
+            # 原生 SQL 查询没有 Vector 类型转换，返回的是 '[1,2,3]' 文本
+            vector = json.loads(vector)
+        return Document(
+            pk=row.id,
+            page_content=row.page_content,
+            metadata=metadata,
+            vector=np.asarray(vector).tolist() if vector is not None else None,
+        )
+
+    @staticmethod
+    def _metadata_filter_clauses(metadata_filter: dict) -> tuple[list[str], dict]:
+        """metadata_filter compiled to a parameterized JSONB predicate, keys are bound too"""
+        node = parse_filter(metadata_filter)
+        if node is None:
+            return [], {}
+        clause, params = to_sql(node, column="meta_data")
+        return [clause], params
+
+    def _score(self, distance: float) -> float:
+        if self._client_config.distance == "cosine":
+            return 1 - distance
+        if self._client_config.distance == "ip":
+            # <#> 返回的是负的内积
+            return -distance
+        # 与 Elasticsearch l2_norm 相似度的 _score 一致：1 / (1 + l2^2)
+        return 1 / (1 + distance**2)
+
+    def _apply_search_params(self, **kwargs):
+        """
+        Set the ANN knobs for the current transaction, they reset when the session closes.
+        `exact` disables index scans so the vector index (if any) is bypassed.
+        HNSW returns at most ef_search rows, so ef_search is never lower than top_k.
+        """
+        search_params = normalize_search_params(kwargs.get("search_params"))
+        config = self._client_config
+        # SET 不支持绑定参数，这里的值都已经被转换为 int
+        if search_params.get("mode") == "exact":
+            self._session.execute(text("SET LOCAL enable_indexscan = off"))
+            return
+        if config.index_type == "hnsw":
+            ef_search = max(search_params.get("ef") or config.hnsw_ef_search, kwargs.get("top_k", 3))
+            self._session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        elif config.index_type == "ivfflat":
+            probes = search_params.get("nprobe") or config.ivfflat_probes
+            self._session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+    def search_by_vector(self, query_vector: np.ndarray, **kwargs) -> list[Document]:
         top_k = kwargs.get("top_k", 3)
         metadata_filter = kwargs.get("metadata_filter", None)
 
-        query = select(self._table)
-        if metadata_filter:
-            filters = []
-            for key, value in metadata_filter.items():
-                if not value:
-                    continue
-                if isinstance(value, list):
-                    filters.append(text(f"meta_data->>'{key}' = ANY(:{key})").params({key: value}))
-                elif isinstance(value, str):
-                    filters.append(text(f"meta_data->>'{key}' = :{key}").params({key: value}))
-                elif isinstance(value, int):
-                    filters.append(text(f"meta_data->>'{key}' = :{key}").params({key: str(value)}))
-    
-            if filters:
-                query = query.filter(and_(*filters))
-    
-        results = self._session.scalars(
-            query
-            .order_by(self._table.embeddings.l2_distance(query_vector))
-            .limit(top_k)
-        )
-        return [
-            Document(
-                pk=result.id,
-                page_content=result.page_content,
-                metadata=result.meta_data,
-            )
-            for result in results
-        ]
+        distance = getattr(self._table.embeddings, self._distance_method)(query_vector)
+        query = select(*self._projected_columns(**kwargs), distance.label("distance"))
+        clauses, params = self._metadata_filter_clauses(metadata_filter)
+        if clauses:
+            query = query.filter(text(" AND ".join(clauses)).bindparams(**params))
+
+        try:
+            self._apply_search_params(**kwargs)
+            results = self._session.execute(
+                query.order_by(distance).limit(top_k)
+            ).all()
+        finally:
+            self._session.close()
+        return [self._document_from_row(result, **kwargs) for result in results]
+
+    def search_by_vectors(self, query_vectors: np.ndarray, **kwargs) -> list[list[Document]]:
+        """Search every query vector in one statement, LATERAL runs the top k subquery per VALUES row"""
+        if len(query_vectors) == 0:
+            return []
+        top_k = kwargs.get("top_k", 3)
+        clauses, params = self._metadata_filter_clauses(kwargs.get("metadata_filter", None))
+
+        values = []
+        for index, query_vector in enumerate(query_vectors):
+            values.append(f"({index}, CAST(:query_{index} AS vector))")
+            params[f"query_{index}"] = "[" + ",".join(map(str, np.asarray(query_vector).tolist())) + "]"
+        params["top_k"] = top_k
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"""
+            SELECT q.idx, t.*
+            FROM (VALUES {", ".join(values)}) AS q(idx, embedding)
+            CROSS JOIN LATERAL (
+                SELECT {", ".join(column.name for column in self._projected_columns(**kwargs))},
+                    embeddings {self._distance_operator} q.embedding AS distance
+                FROM {self._collection_name}
+                {where}
+                ORDER BY embeddings {self._distance_operator} q.embedding
+                LIMIT :top_k
+            ) t
+            ORDER BY q.idx, t.distance
+        """
+        try:
+            self._apply_search_params(**kwargs)
+            rows = self._session.execute(text(sql), params).all()
+        finally:
+            self._session.close()
+
+        results = [[] for _ in range(len(query_vectors))]
+        for row in rows:
+            results[row.idx].append(self._document_from_row(row, **kwargs))
+        return results
 
     def text_exists(self, id: str) -> bool:
         return super().text_exists(id)
@@ -216,8 +592,9 @@ class PGVectorStore(BaseVectorStore):
     def delete(self) -> None:
         with self._engine.connect() as conn:
             conn.execute(f"DROP TABLE {self._collection_name}")
+        _indexed_tables.discard(self._collection_name)
 
     def get_metadata_key_unique_values(self, key: str) -> list[str]:
-        sql = f"""SELECT DISTINCT meta_data->>'{key}' AS filename FROM "public"."{self._collection_name}";"""
-        result = self._engine.execute(sql)
+        sql = f"""SELECT DISTINCT meta_data->>CAST(:key AS text) AS filename FROM "public"."{self._collection_name}";"""
+        result = self._engine.execute(text(sql), key=key)
         return [row[0] for row in result]
\ No newline at end of file
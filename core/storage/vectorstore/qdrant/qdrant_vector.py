@@ -1,9 +1,9 @@
 import os
 import uuid
-from collections.abc import Generator, Iterable, Sequence
-from itertools import islice
+from collections.abc import Iterable
 from typing import TYPE_CHECKING, Any, Optional, Union, cast
 
+import numpy as np
 import qdrant_client
 from pydantic import BaseModel
 from qdrant_client.http import models as rest
@@ -19,6 +19,14 @@ from qdrant_client.local.qdrant_local import QdrantLocal
 
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
+from core.storage.vectorstore.client_registry import get_client_registry
+from core.storage.vectorstore.filters import parse_filter, to_qdrant_filter
+from core.storage.vectorstore.vector_store_base import (
+    SearchPage,
+    decode_cursor,
+    encode_cursor,
+    normalize_search_params,
+)
 from core.rag.models.document import Document
 from extensions.ext_redis import redis_client
 
@@ -36,6 +44,7 @@ class QdrantConfig(BaseModel):
     api_key: Optional[str]
     timeout: float = 20
     root_path: Optional[str]
+    pool_size: int = 10
 
     def to_qdrant_params(self):
         if self.endpoint and self.endpoint.startswith('path:'):
@@ -47,10 +56,14 @@ class QdrantConfig(BaseModel):
                 'path': path
             }
         else:
+            import httpx
             return {
                 'url': self.endpoint,
                 'api_key': self.api_key,
-                'timeout': self.timeout
+                'timeout': self.timeout,
+                # keep-alive connections of the REST client
+                'limits': httpx.Limits(max_connections=self.pool_size,
+                                       max_keepalive_connections=self.pool_size),
             }
 
 
@@ -59,7 +72,12 @@ class QdrantVector(BaseVector):
     def __init__(self, collection_name: str, group_id: str, config: QdrantConfig, distance_func: str = 'Cosine'):
         super().__init__(collection_name)
         self._client_config = config
-        self._client = qdrant_client.QdrantClient(**self._client_config.to_qdrant_params())
+        self._client = get_client_registry().get(
+            'qdrant',
+            config,
+            lambda: qdrant_client.QdrantClient(**self._client_config.to_qdrant_params()),
+            health_check=lambda client: client.get_collections(),
+        )
         self._distance_func = distance_func.upper()
         self._group_id = group_id
 
@@ -126,65 +144,29 @@ class QdrantVector(BaseVector):
                                                   field_schema=text_index_params)
             redis_client.set(collection_exist_cache_key, 1, ex=3600)
 
-    def add_texts(self, documents: list[Document], embeddings: list[list[float]], **kwargs):
+    def add_texts(self, documents: list[Document], embeddings: np.ndarray, **kwargs):
         uuids = self._get_uuids(documents)
         texts = [d.page_content for d in documents]
         metadatas = [d.metadata for d in documents]
-
-        added_ids = []
-        for batch_ids, points in self._generate_rest_batches(
-                texts, embeddings, metadatas, uuids, 64, self._group_id
-        ):
-            self._client.upsert(
-                collection_name=self._collection_name, points=points
-            )
-            added_ids.extend(batch_ids)
-
-        return added_ids
-
-    def _generate_rest_batches(
-            self,
-            texts: Iterable[str],
-            embeddings: list[list[float]],
-            metadatas: Optional[list[dict]] = None,
-            ids: Optional[Sequence[str]] = None,
-            batch_size: int = 64,
-            group_id: Optional[str] = None,
-    ) -> Generator[tuple[list[str], list[rest.PointStruct]], None, None]:
-        from qdrant_client.http import models as rest
-        texts_iterator = iter(texts)
-        embeddings_iterator = iter(embeddings)
-        metadatas_iterator = iter(metadatas or [])
-        ids_iterator = iter(ids or [uuid.uuid4().hex for _ in iter(texts)])
-        while batch_texts := list(islice(texts_iterator, batch_size)):
-            # Take the corresponding metadata and id for each text in a batch
-            batch_metadatas = list(islice(metadatas_iterator, batch_size)) or None
-            batch_ids = list(islice(ids_iterator, batch_size))
-
-            # Generate the embeddings for all the texts in a batch
-            batch_embeddings = list(islice(embeddings_iterator, batch_size))
-
-            points = [
-                rest.PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload=payload,
-                )
-                for point_id, vector, payload in zip(
-                    batch_ids,
-                    batch_embeddings,
-                    self._build_payloads(
-                        batch_texts,
-                        batch_metadatas,
-                        Field.CONTENT_KEY.value,
-                        Field.METADATA_KEY.value,
-                        group_id,
-                        Field.GROUP_KEY.value,
-                    ),
-                )
-            ]
-
-            yield batch_ids, points
+        payloads = self._build_payloads(
+            texts,
+            metadatas,
+            Field.CONTENT_KEY.value,
+            Field.METADATA_KEY.value,
+            self._group_id,
+            Field.GROUP_KEY.value,
+        )
+        # upload_collection accepts the float32 ndarray as is, no per point float lists
+        self._client.upload_collection(
+            collection_name=self._collection_name,
+            vectors=embeddings,
+            payload=payloads,
+            ids=uuids,
+            batch_size=64,
+            # 与之前的 upsert 一致，写入完成后才返回
+            wait=True,
+        )
+        return uuids
 
     @classmethod
     def _build_payloads(
@@ -296,25 +278,42 @@ class QdrantVector(BaseVector):
 
         return len(response) > 0
 
-    def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
+    def _group_filter(self, metadata_filter: Optional[dict] = None):
         from qdrant_client.http import models
-        filter = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="group_id",
-                    match=models.MatchValue(value=self._group_id),
-                ),
-            ],
-        )
-        results = self._client.search(
-            collection_name=self._collection_name,
-            query_vector=query_vector,
-            query_filter=filter,
-            limit=kwargs.get("top_k", 4),
-            with_payload=True,
-            with_vectors=True,
-            score_threshold=kwargs.get("score_threshold", .0)
+        must = [
+            models.FieldCondition(
+                key="group_id",
+                match=models.MatchValue(value=self._group_id),
+            ),
+        ]
+        node = parse_filter(metadata_filter)
+        if node is not None:
+            must.append(to_qdrant_filter(node, Field.METADATA_KEY.value))
+        return models.Filter(must=must)
+
+    @staticmethod
+    def _payload_selector(**kwargs: Any):
+        """Only fetch content and metadata (or the requested metadata fields) of each point"""
+        from qdrant_client.http import models
+        fields = kwargs.get("fields", None)
+        if fields is None:
+            include = [Field.CONTENT_KEY.value, Field.METADATA_KEY.value]
+        else:
+            include = [Field.CONTENT_KEY.value] + [f"{Field.METADATA_KEY.value}.{field}" for field in fields]
+        return models.PayloadSelectorInclude(include=include)
+
+    @staticmethod
+    def _search_params(**kwargs: Any):
+        from qdrant_client.http import models
+        search_params = normalize_search_params(kwargs.get("search_params"))
+        if not search_params:
+            return None
+        return models.SearchParams(
+            hnsw_ef=search_params.get("ef"),
+            exact=search_params.get("mode") == "exact",
         )
+
+    def _documents_from_scored_points(self, results, **kwargs: Any) -> list[Document]:
         docs = []
         for result in results:
             metadata = result.payload.get(Field.METADATA_KEY.value) or {}
@@ -325,10 +324,47 @@ class QdrantVector(BaseVector):
                 doc = Document(
                     page_content=result.payload.get(Field.CONTENT_KEY.value),
                     metadata=metadata,
+                    vector=result.vector,
                 )
                 docs.append(doc)
         return docs
 
+    def search_by_vector(self, query_vector: np.ndarray, **kwargs: Any) -> list[Document]:
+        results = self._client.search(
+            collection_name=self._collection_name,
+            query_vector=query_vector,
+            query_filter=self._group_filter(kwargs.get("metadata_filter", None)),
+            search_params=self._search_params(**kwargs),
+            limit=kwargs.get("top_k", 4),
+            with_payload=self._payload_selector(**kwargs),
+            with_vectors=kwargs.get("include_vectors", False),
+            score_threshold=kwargs.get("score_threshold", .0)
+        )
+        return self._documents_from_scored_points(results, **kwargs)
+
+    def search_by_vectors(self, query_vectors: np.ndarray, **kwargs: Any) -> list[list[Document]]:
+        if len(query_vectors) == 0:
+            return []
+        from qdrant_client.http import models
+        query_filter = self._group_filter(kwargs.get("metadata_filter", None))
+        requests = [
+            models.SearchRequest(
+                vector=query_vector.tolist(),
+                filter=query_filter,
+                params=self._search_params(**kwargs),
+                limit=kwargs.get("top_k", 4),
+                with_payload=self._payload_selector(**kwargs),
+                with_vector=kwargs.get("include_vectors", False),
+                score_threshold=kwargs.get("score_threshold", .0),
+            )
+            for query_vector in query_vectors
+        ]
+        batch_results = self._client.search_batch(
+            collection_name=self._collection_name,
+            requests=requests,
+        )
+        return [self._documents_from_scored_points(results, **kwargs) for results in batch_results]
+
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
         """Return docs most similar by bm25.
         Returns:
@@ -337,23 +373,19 @@ class QdrantVector(BaseVector):
         from qdrant_client.http import models
         scroll_filter = models.Filter(
             must=[
-                models.FieldCondition(
-                    key="group_id",
-                    match=models.MatchValue(value=self._group_id),
-                ),
+                self._group_filter(kwargs.get("metadata_filter", None)),
                 models.FieldCondition(
                     key="page_content",
                     match=models.MatchText(text=query),
-                )
+                ),
             ]
         )
         response = self._client.scroll(
             collection_name=self._collection_name,
             scroll_filter=scroll_filter,
             limit=kwargs.get('top_k', 2),
-            with_payload=True,
-            with_vectors=True
-
+            with_payload=self._payload_selector(**kwargs),
+            with_vectors=kwargs.get("include_vectors", False),
         )
         results = response[0]
         documents = []
@@ -365,6 +397,43 @@ class QdrantVector(BaseVector):
 
         return documents
 
+    def search_by_full_text_page(self, query: str, **kwargs: Any) -> SearchPage:
+        """Page through the full text matches with the scroll offset of the previous page"""
+        from qdrant_client.http import models
+        state = decode_cursor(kwargs.get("cursor", None)) or {}
+        scroll_filter = models.Filter(
+            must=[
+                self._group_filter(kwargs.get("metadata_filter", None)),
+                models.FieldCondition(
+                    key="page_content",
+                    match=models.MatchText(text=query),
+                ),
+            ]
+        )
+        points, next_offset = self._client.scroll(
+            collection_name=self._collection_name,
+            scroll_filter=scroll_filter,
+            limit=kwargs.get("size", 10),
+            offset=state.get("offset"),
+            with_payload=self._payload_selector(**kwargs),
+            with_vectors=kwargs.get("include_vectors", False),
+        )
+        total = None
+        if kwargs.get("track_total_hits", True):
+            total = self._client.count(
+                collection_name=self._collection_name,
+                count_filter=scroll_filter,
+                exact=True,
+            ).count
+        return SearchPage(
+            documents=[
+                self._document_from_scored_point(point, Field.CONTENT_KEY.value, Field.METADATA_KEY.value)
+                for point in points
+            ],
+            cursor=encode_cursor({"offset": next_offset}) if next_offset is not None else None,
+            total=total,
+        )
+
     def _reload_if_needed(self):
         if isinstance(self._client, QdrantLocal):
             self._client = cast(QdrantLocal, self._client)
@@ -380,4 +449,5 @@ class QdrantVector(BaseVector):
         return Document(
             page_content=scored_point.payload.get(content_payload_key),
             metadata=scored_point.payload.get(metadata_payload_key) or {},
+            vector=scored_point.vector,
         )
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from loguru import logger
+
+from core.config import vector_config
+from core.models.document import Document
+from core.utils import generate_md5
+
+
+class SearchResultCache:
+    """
+    Cache of search results keyed by (knowledge base, generation, normalized request).
+
+    Every write to a knowledge base bumps its generation counter in redis, so entries
+    cached before the write are never read again and expire by TTL. The generation is
+    bumped after the write returns, so writes must be searchable by then (Elasticsearch
+    writes wait for a refresh), or a search could cache pre-write results under the new
+    generation. Entries live in an in-process LRU bounded by `max_entries`, and
+    optionally in redis to share them between processes.
+    """
+
+    def __init__(self, config: dict):
+        self._ttl = int(config.get("ttl", 300))
+        self._max_entries = int(config.get("max_entries", 10000))
+        redis_config = config.get("redis", {})
+        self._redis_enabled = redis_config.get("enabled", False)
+        self._prefix = config.get("prefix", "search-cache")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+
+    def _get_redis(self):
+        from core.middleware.redis_client import redis_client
+
+        return redis_client
+
+    def _generation_key(self, knowledge_base_id: str) -> str:
+        return f"{self._prefix}:generation:{knowledge_base_id}"
+
+    def _incr(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_generation(self, knowledge_base_id: str) -> int:
+        return int(self._get_redis().get(self._generation_key(knowledge_base_id)) or 0)
+
+    def invalidate(self, knowledge_base_id: str):
+        try:
+            self._get_redis().incr(self._generation_key(knowledge_base_id))
+            self._incr("invalidations")
+        except Exception as e:
+            logger.warning(f"Failed to bump search cache generation of {knowledge_base_id}: {e}")
+
+    @staticmethod
+    def make_key(knowledge_base_id: str, generation: int, kind: str, params: dict) -> str:
+        normalized = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{knowledge_base_id}:{generation}:{kind}:{generate_md5(normalized)}"
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    return payload
+                del self._entries[key]
+        if self._redis_enabled:
+            payload = self._get_redis().get(f"{self._prefix}:{key}")
+            if payload is not None:
+                payload = payload.decode("utf-8") if isinstance(payload, bytes) else payload
+                self._put_local(key, payload)
+                return payload
+        return None
+
+    def _put_local(self, key: str, payload: str):
+        with self._lock:
+            self._entries[key] = (payload, time.time() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _set(self, key: str, payload: str):
+        self._put_local(key, payload)
+        if self._redis_enabled:
+            self._get_redis().set(f"{self._prefix}:{key}", payload, ex=self._ttl)
+
+    def get_or_search(
+        self,
+        knowledge_base_id: str,
+        kind: str,
+        params: dict,
+        search: Callable[[], list[Document]],
+    ) -> list[Document]:
+        try:
+            key = self.make_key(
+                knowledge_base_id, self.get_generation(knowledge_base_id), kind, params
+            )
+            payload = self._get(key)
+        except Exception as e:
+            # redis 不可用时直接查询，不影响检索
+            logger.warning(f"Failed to read search cache: {e}")
+            self._incr("errors")
+            return search()
+
+        if payload is not None:
+            self._incr("hits")
+            # 每次返回新的对象，调用方修改 metadata 不会影响缓存
+            return [Document(**item) for item in json.loads(payload)]
+
+        self._incr("misses")
+        documents = search()
+        try:
+            self._set(
+                key,
+                json.dumps([document.serialize() for document in documents], default=str),
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write search cache: {e}")
+            self._incr("errors")
+        return documents
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hitRate"] = stats["hits"] / total if total else 0.0
+        stats["maxEntries"] = self._max_entries
+        stats["ttl"] = self._ttl
+        return stats
+
+
+_search_result_cache = None
+_search_result_cache_lock = threading.Lock()
+
+
+def get_search_result_cache() -> Optional[SearchResultCache]:
+    global _search_result_cache
+    cache_config = vector_config.get("search_cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+    if _search_result_cache is None:
+        with _search_result_cache_lock:
+            if _search_result_cache is None:
+                _search_result_cache = SearchResultCache(cache_config)
+    return _search_result_cache
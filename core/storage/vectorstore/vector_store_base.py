@@ -1,10 +1,64 @@
 from __future__ import annotations
 
+import base64
+import json
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional
+import numpy as np
+from pydantic import BaseModel
 from core.models.document import Document
 
 
+class SearchPage(BaseModel):
+    """One page of a cursor paginated search, `cursor` is None on the last page."""
+
+    documents: list[Document]
+    cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+def encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, default=str).encode("utf-8")).decode(
+        "ascii"
+    )
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+SEARCH_MODES = ("exact", "approximate")
+SEARCH_PARAM_KEYS = ("mode", "ef", "num_candidates", "nprobe")
+
+
+def normalize_search_params(search_params: Optional[dict]) -> dict:
+    """
+    Validate the backend independent `search_params` of a vector search:
+    - mode: exact | approximate, None lets the backend decide.
+    - ef: HNSW candidate list size (Milvus / Qdrant / pgvector hnsw.ef_search).
+    - num_candidates: Elasticsearch knn candidates per shard.
+    - nprobe: IVF lists to probe (Milvus IVF / pgvector ivfflat.probes).
+    """
+    search_params = dict(search_params or {})
+    unknown = set(search_params) - set(SEARCH_PARAM_KEYS)
+    if unknown:
+        raise ValueError(f"Unsupported search_params: {', '.join(sorted(unknown))}")
+    mode = search_params.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        raise ValueError(f"Unsupported search mode: {mode}, expected one of {SEARCH_MODES}")
+    for key in ("ef", "num_candidates", "nprobe"):
+        if search_params.get(key) is not None:
+            search_params[key] = int(search_params[key])
+            if search_params[key] <= 0:
+                raise ValueError(f"search_params.{key} must be positive")
+    return search_params
+
+
 class BaseVectorStore(ABC):
 
     def __init__(self, collection_name: str):
@@ -18,7 +72,7 @@ class BaseVectorStore(ABC):
     def add_texts(
         self,
         texts: list[Document],
-        embeddings: list[list[float]],
+        embeddings: np.ndarray,
         **kwargs,
     ):
         raise NotImplementedError
@@ -27,6 +81,10 @@ class BaseVectorStore(ABC):
     def text_exists(self, id: str) -> bool:
         raise NotImplementedError
 
+    def texts_exist(self, ids: list[str]) -> set[str]:
+        """Doc ids of `ids` that are already stored, backends override this with a batched lookup"""
+        return {id for id in ids if self.text_exists(id)}
+
     @abstractmethod
     def delete_by_ids(self, ids: list[str]) -> None:
         raise NotImplementedError
@@ -37,14 +95,56 @@ class BaseVectorStore(ABC):
 
     @abstractmethod
     def search_by_vector(
-        self, query_vector: list[float], **kwargs: Any
+        self, query_vector: np.ndarray, **kwargs: Any
     ) -> list[Document]:
+        """
+        Projection kwargs shared by every search method:
+        - fields: metadata keys to return, None returns the whole metadata.
+        - include_vectors: also return the stored embedding as `Document.vector`, defaults to False.
+
+        Vector searches also accept `search_params`, see `normalize_search_params`.
+
+        Every returned document has `metadata["score"]`, a similarity where higher is
+        more similar, so hits of different knowledge bases can be merged by score.
+        L2 distances are mapped to 1 / (1 + l2^2), the Elasticsearch l2_norm score.
+        """
         raise NotImplementedError
 
     @abstractmethod
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
         raise NotImplementedError
+
+    @staticmethod
+    def _project_metadata(metadata: Optional[dict], fields: Optional[list[str]]) -> dict:
+        metadata = metadata or {}
+        if fields is None:
+            return metadata
+        return {key: metadata[key] for key in fields if key in metadata}
     
+    def search_by_vectors(
+        self, query_vectors: np.ndarray, **kwargs: Any
+    ) -> list[list[Document]]:
+        """Search several query vectors, backends with a multi-search API send them in one round trip"""
+        return [self.search_by_vector(query_vector, **kwargs) for query_vector in query_vectors]
+
+    def search_by_full_texts(self, queries: list[str], **kwargs: Any) -> list[list[Document]]:
+        """Full text search several queries, backends with a multi-search API send them in one round trip"""
+        return [self.search_by_full_text(query, **kwargs) for query in queries]
+
+    def search_by_full_text_page(self, query: str, **kwargs: Any) -> SearchPage:
+        """
+        Cursor paginated full text search, pass the `cursor` of the previous page to get the next one.
+        Backends override this with native deep pagination, the default falls back to offsets.
+        `track_total_hits=False` skips counting the total number of hits.
+        """
+        size = kwargs.pop("size", 10)
+        state = decode_cursor(kwargs.pop("cursor", None)) or {}
+        kwargs.pop("from_", None)
+        from_ = state.get("from", 0)
+        documents = self.search_by_full_text(query, from_=from_, size=size, **kwargs)
+        cursor = encode_cursor({"from": from_ + size}) if len(documents) == size else None
+        return SearchPage(documents=documents, cursor=cursor)
+
     @abstractmethod
     def update_by_id(self, id: str, document: Document) -> None:
         raise NotImplementedError
@@ -52,14 +152,16 @@ class BaseVectorStore(ABC):
     def delete(self) -> None:
         raise NotImplementedError
 
-    def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
-        for text in texts:
-            doc_id = text.metadata["doc_id"]
-            exists_duplicate_node = self.text_exists(doc_id)
-            if exists_duplicate_node:
-                texts.remove(text)
+    def ensure_vector_index(self) -> None:
+        """Called after bulk loads, backends that index vectors on write need nothing here"""
 
-        return texts
+    def build_vector_index(self, **kwargs) -> dict:
+        """Build the ANN index of an existing collection, returns the index name and whether it was created"""
+        return {"index": None, "created": False}
+
+    def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
+        existing = self.texts_exist([text.metadata["doc_id"] for text in texts])
+        return [text for text in texts if text.metadata["doc_id"] not in existing]
 
     def _get_uuids(self, texts: list[Document]) -> list[str]:
         return [text.metadata["doc_id"] for text in texts]
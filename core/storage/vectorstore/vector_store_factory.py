@@ -1,16 +1,28 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from flask import current_app
 from core.models.document import Document
 from core.models.knowledge_base import KnowledgeBaseEntity
 from core.storage.vectorstore.vector_store_base import BaseVectorStore
+from core.storage.vectorstore.search_cache import get_search_result_cache
 from core.config import vector_config
-from core.utils.embedding import generate_embedding_of_model
+from core.utils import chunk_list
+from core.utils.embedding import (
+    generate_embedding_of_model,
+    generate_query_embedding,
+)
 
 vector_type = vector_config.get("type")
+embedding_batch_size = vector_config.get("embedding_batch_size", 256)
 
 
 class VectorStoreFactory:
+    """
+    Cheap per-request view of a knowledge base, backend clients and their connection
+    pools are shared by the whole process through the client registry.
+    """
+
     def __init__(self, knowledgebase: KnowledgeBaseEntity, attributes: list = None):
         if attributes is None:
             attributes = ["doc_id", "knowledgebase_id", "document_id", "doc_hash"]
@@ -63,6 +75,7 @@ class VectorStoreFactory:
                     api_key,
                     root_path=current_app.root_path,
                     timeout=timeout,
+                    pool_size=qdrant_config.get("pool_size", 10),
                 ),
             )
         elif vector_type == "milvus":
@@ -87,6 +100,8 @@ class VectorStoreFactory:
                     user=user,
                     password=password,
                     secure=secure,
+                    replica_number=milvus_config.get("replica_number", 1),
+                    collection_state_ttl=milvus_config.get("collection_state_ttl", 60),
                 ),
             )
         elif vector_type == "elasticsearch":
@@ -107,6 +122,10 @@ class VectorStoreFactory:
                     url=url,
                     username=username,
                     password=password,
+                    knn_num_candidates=es_config.get("knn_num_candidates", 100),
+                    exact_search_max_docs=es_config.get("exact_search_max_docs", 10000),
+                    filter_count_ttl=es_config.get("filter_count_ttl", 60),
+                    pool_size=es_config.get("pool_size", 10),
                 ),
             )
         elif vector_type == "pgvector":
@@ -117,9 +136,10 @@ class VectorStoreFactory:
 
             pgvector_config = vector_config.get("pgvector")
             url = pgvector_config.get("url")
-            batch_size = pgvector_config.get("batch_size", 100)
+            batch_size = pgvector_config.get("batch_size", 1000)
             pool_size = pgvector_config.get("pool_size", 5)
             max_overflow = pgvector_config.get("max_overflow", 10)
+            pool_recycle = pgvector_config.get("pool_recycle", 3600)
             dataset_id = self._knowledgebase.id
             dimension = self._knowledgebase.dimension
             collection_name = KnowledgeBaseEntity.gen_collection_name_by_id(dataset_id)
@@ -131,6 +151,16 @@ class VectorStoreFactory:
                     batch_size=batch_size,
                     pool_size=pool_size,
                     max_overflow=max_overflow,
+                    pool_recycle=pool_recycle,
+                    distance=pgvector_config.get("distance", "l2"),
+                    index_type=pgvector_config.get("index_type", "hnsw"),
+                    hnsw_m=pgvector_config.get("hnsw_m", 16),
+                    hnsw_ef_construction=pgvector_config.get("hnsw_ef_construction", 64),
+                    hnsw_ef_search=pgvector_config.get("hnsw_ef_search", 40),
+                    ivfflat_lists=pgvector_config.get("ivfflat_lists", 0),
+                    ivfflat_probes=pgvector_config.get("ivfflat_probes", 1),
+                    index_min_rows=pgvector_config.get("index_min_rows", 1000),
+                    maintenance_work_mem=pgvector_config.get("maintenance_work_mem"),
                 ),
             )
         else:
@@ -139,49 +169,118 @@ class VectorStoreFactory:
     def add_texts(self, documents: list[Document], **kwargs):
         if kwargs.get("duplicate_check", False):
             documents = self._filter_duplicate_texts(documents)
-        embeddings = generate_embedding_of_model(
-            self._knowledgebase.embedding_model,
-            [document.page_content for document in documents],
-        )
-        self._vector_processor.add_texts(
-            texts=documents, embeddings=embeddings, **kwargs
-        )
+        # 分批 encode 并写入，encode 第 N+1 批的同时写入第 N 批，
+        # 内存中最多只有两批向量，不随文档大小增长
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = None
+                for batch in chunk_list(documents, embedding_batch_size):
+                    embeddings = generate_embedding_of_model(
+                        self._knowledgebase.embedding_model,
+                        [document.page_content for document in batch],
+                    )
+                    if pending is not None:
+                        pending.result()
+                    pending = executor.submit(
+                        self._vector_processor.add_texts,
+                        texts=batch,
+                        embeddings=embeddings,
+                        **kwargs,
+                    )
+                if pending is not None:
+                    pending.result()
+        finally:
+            # 中途失败时前面的批次可能已经写入，同样需要失效缓存
+            self.invalidate_search_cache()
+
+    def ensure_vector_index(self) -> None:
+        """
+        Build the deferred vector index (pgvector) once the collection is large enough.
+        Only called from the import worker, the build can take minutes.
+        """
+        ensure_vector_index = getattr(self._vector_processor, "ensure_vector_index", None)
+        if ensure_vector_index is not None:
+            ensure_vector_index()
 
     def text_exists(self, id: str) -> bool:
         return self._vector_processor.text_exists(id)
 
     def delete_by_ids(self, ids: list[str]) -> None:
-        self._vector_processor.delete_by_ids(ids)
+        try:
+            self._vector_processor.delete_by_ids(ids)
+        finally:
+            self.invalidate_search_cache()
 
     def update_by_id(self, id: str, document: Document) -> None:
-        self._vector_processor.update_by_id(id, document)
+        try:
+            self._vector_processor.update_by_id(id, document)
+        finally:
+            self.invalidate_search_cache()
 
     def delete_by_metadata_field(self, key: str, value: str) -> None:
-        self._vector_processor.delete_by_metadata_field(key, value)
+        try:
+            self._vector_processor.delete_by_metadata_field(key, value)
+        finally:
+            self.invalidate_search_cache()
 
-    def search_by_vector(self, query: str, **kwargs: Any) -> list[Document]:
-        query_vector = generate_embedding_of_model(
-            self._knowledgebase.embedding_model, [query]
-        )[0]
+    def invalidate_search_cache(self) -> None:
+        cache = get_search_result_cache()
+        if cache is not None:
+            cache.invalidate(self._knowledgebase.id)
+
+    def cached_search(self, kind: str, params: dict, search) -> list[Document]:
+        """Return cached results of an identical request, or run `search` and cache them"""
+        cache = get_search_result_cache()
+        if cache is None:
+            return search()
+        return cache.get_or_search(self._knowledgebase.id, kind, params, search)
+
+    def embed_query(self, query: str):
+        return generate_query_embedding(self._knowledgebase.embedding_model, query)
+
+    def search_by_query_vector(self, query_vector, **kwargs: Any) -> list[Document]:
         return self._vector_processor.search_by_vector(query_vector, **kwargs)
 
+    def search_by_vector(self, query: str, **kwargs: Any) -> list[Document]:
+        return self.cached_search(
+            "vector",
+            {"query": query, **kwargs},
+            lambda: self.search_by_query_vector(self.embed_query(query), **kwargs),
+        )
+
     def search_by_full_text(self, query: str, **kwargs: Any) -> list[Document]:
-        return self._vector_processor.search_by_full_text(query, **kwargs)
+        return self.cached_search(
+            "fulltext",
+            {"query": query, **kwargs},
+            lambda: self._vector_processor.search_by_full_text(query, **kwargs),
+        )
+
+    def search_by_full_text_page(self, query: str, **kwargs: Any):
+        return self._vector_processor.search_by_full_text_page(query, **kwargs)
+
+    def embed_queries(self, queries: list[str]):
+        # 一次 batch encode 所有 query
+        return generate_embedding_of_model(self._knowledgebase.embedding_model, queries)
+
+    def search_by_query_vectors(self, query_vectors, **kwargs: Any) -> list[list[Document]]:
+        return self._vector_processor.search_by_vectors(query_vectors, **kwargs)
+
+    def search_by_full_texts(self, queries: list[str], **kwargs: Any) -> list[list[Document]]:
+        return self._vector_processor.search_by_full_texts(queries, **kwargs)
 
     def delete(self) -> None:
-        self._vector_processor.delete()
+        try:
+            self._vector_processor.delete()
+        finally:
+            self.invalidate_search_cache()
 
     def create_collection(self, **kwargs):
         return self._vector_processor.create_collection(**kwargs)
 
     def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
-        for text in texts:
-            doc_id = text.metadata["doc_id"]
-            exists_duplicate_node = self.text_exists(doc_id)
-            if exists_duplicate_node:
-                texts.remove(text)
-
-        return texts
+        doc_ids = [text.metadata["doc_id"] for text in texts]
+        existing = self._vector_processor.texts_exist(doc_ids)
+        return [text for text in texts if text.metadata["doc_id"] not in existing]
 
     def __getattr__(self, name):
         if self._vector_processor is not None:
@@ -7,7 +7,9 @@ from pydantic import BaseModel, root_validator
 
 from core.rag.datasource.vdb.field import Field
 from core.rag.datasource.vdb.vector_base import BaseVector
+from core.storage.vectorstore.client_registry import get_client_registry
 from core.rag.models.document import Document
+from core.storage.vectorstore.filters import parse_filter, to_weaviate_where
 from extensions.ext_redis import redis_client
 from models.dataset import Dataset
 
@@ -32,6 +34,15 @@ class WeaviateVector(BaseVector):
         self._attributes = attributes
 
     def _init_client(self, config: WeaviateConfig) -> weaviate.Client:
+        return get_client_registry().get(
+            'weaviate',
+            config,
+            lambda: self._create_client(config),
+            health_check=lambda client: client.is_ready(),
+        )
+
+    @staticmethod
+    def _create_client(config: WeaviateConfig) -> weaviate.Client:
         auth_config = weaviate.auth.AuthApiKey(api_key=config.api_key)
 
         weaviate.connect.connection.has_grpc = False
@@ -169,6 +180,17 @@ class WeaviateVector(BaseVector):
                 uuid=uuid,
             )
 
+    @staticmethod
+    def _where_filter(**kwargs: Any) -> Optional[dict]:
+        """metadata_filter compiled to a where filter, a raw `where_filter` is still accepted"""
+        node = parse_filter(kwargs.get("metadata_filter"))
+        if node is None:
+            return kwargs.get("where_filter")
+        where_filter = to_weaviate_where(node)
+        if kwargs.get("where_filter"):
+            return {"operator": "And", "operands": [where_filter, kwargs.get("where_filter")]}
+        return where_filter
+
     def search_by_vector(self, query_vector: list[float], **kwargs: Any) -> list[Document]:
         """Look up similar documents by embedding vector in Weaviate."""
         collection_name = self._collection_name
@@ -177,22 +199,36 @@ class WeaviateVector(BaseVector):
         query_obj = self._client.query.get(collection_name, properties)
 
         vector = {"vector": query_vector}
-        if kwargs.get("where_filter"):
-            query_obj = query_obj.with_where(kwargs.get("where_filter"))
+        where_filter = self._where_filter(**kwargs)
+        if where_filter:
+            query_obj = query_obj.with_where(where_filter)
+        # only fetch the stored vectors when they are asked for
+        additional = ["distance"]
+        if kwargs.get("include_vectors", False):
+            additional.append("vector")
         result = (
             query_obj.with_near_vector(vector)
             .with_limit(kwargs.get("top_k", 4))
-            .with_additional(["vector", "distance"])
+            .with_additional(additional)
             .do()
         )
         if "errors" in result:
             raise ValueError(f"Error during query: {result['errors']}")
 
+        fields = kwargs.get("fields", None)
         docs_and_scores = []
         for res in result["data"]["Get"][collection_name]:
             text = res.pop(Field.TEXT_KEY.value)
-            score = 1 - res["_additional"]["distance"]
-            docs_and_scores.append((Document(page_content=text, metadata=res), score))
+            additional = res.pop("_additional")
+            score = 1 - additional["distance"]
+            docs_and_scores.append((
+                Document(
+                    page_content=text,
+                    metadata=res if fields is None else {key: res[key] for key in fields if key in res},
+                    vector=additional.get("vector"),
+                ),
+                score,
+            ))
 
         docs = []
         for doc, score in docs_and_scores:
@@ -221,8 +257,9 @@ class WeaviateVector(BaseVector):
         if kwargs.get("search_distance"):
             content["certainty"] = kwargs.get("search_distance")
         query_obj = self._client.query.get(collection_name, properties)
-        if kwargs.get("where_filter"):
-            query_obj = query_obj.with_where(kwargs.get("where_filter"))
+        where_filter = self._where_filter(**kwargs)
+        if where_filter:
+            query_obj = query_obj.with_where(where_filter)
         if kwargs.get("additional"):
             query_obj = query_obj.with_additional(kwargs.get("additional"))
         properties = ['text']
@@ -3,9 +3,21 @@ from loguru import logger
 import torch
 import os
 from core.config import MODELS_FOLDER, embeddings_config
-import requests
-
-MODEL_MAP = {}
+import numpy as np
+from core.utils.embedding.cache import get_embedding_cache
+from core.utils.embedding.scheduler import get_embedding_scheduler
+from core.utils.embedding.client import get_embedding_server_client
+from core.utils.embedding.registry import ModelRegistry
+from core.utils.embedding.bucketing import encode_by_length_buckets
+from core.utils.embedding.api_client import (
+    generate_embedding_of_api_model,
+    get_value_by_path,
+    replace_vars,
+)
+
+model_registry = ModelRegistry(
+    int(embeddings_config.get("memoryBudgetMB", 0)) * 1024 * 1024
+)
 
 
 def remove_model_name_prefix(model_name):
@@ -22,111 +34,50 @@ SUPPORTED_EMBEDDING_MODELS = [
         or os.path.join(MODELS_FOLDER, remove_model_name_prefix(item["name"])),
         "type": item.get("type", "local"),
         "apiConfig": item.get("apiConfig"),
+        "backend": item.get("backend", "torch"),
+        "onnx": item.get("onnx", {}),
+        "maxLength": item.get("maxLength"),
     }
     for item in embeddings_config.get("models", [])
 ]
 
 
-def load_model(model_name):
-    global MODEL_MAP
-    if MODEL_MAP.get(model_name):
-        return MODEL_MAP.get(model_name)
+def _load_model(model_name):
+    model_config = get_model_config(model_name)
+    if model_config["backend"] == "onnx":
+        from core.utils.embedding.onnx_backend import OnnxEmbeddingModel
+
+        return OnnxEmbeddingModel(model_config)
+
     model_path = get_model_path_by_embedding_model(model_name)
-    model = FlagModel(
+    return FlagModel(
         # 如果本地有下载 model 使用本地的，否则在线下载
         model_path if os.path.exists(model_path) else model_name,
         use_fp16=True,
     )  # Setting use_fp16 to True speeds up computation with a slight performance degradation
-    MODEL_MAP[model_name] = model
-    return model
-
-
-def replace_vars(template, values):
-    """
-    Recursively replace placeholders in the template with values from the values dictionary.
-    This version handles nested structures including dictionaries and lists.
-
-    :param template: dict, a dictionary potentially containing nested dictionaries and lists with placeholders.
-    :param values: dict, a dictionary containing values to replace the placeholders.
-    :return: dict, a dictionary with the placeholders replaced by actual values, respecting nested structures.
-    """
-    if isinstance(template, dict):
-        result = {}
-        for key, value in template.items():
-            result[key] = replace_vars(
-                value, values
-            )  # Recurse into nested dictionaries or lists
-    elif isinstance(template, list):
-        result = [
-            replace_vars(item, values) for item in template
-        ]  # Recurse into each item if it's a list
-    elif (
-        isinstance(template, str)
-        and template.startswith("{")
-        and template.endswith("}")
-    ):
-        var_name = template.strip("{}")
-        if var_name in values:
-            return values[var_name]
-        else:
-            raise ValueError(
-                f"No value provided for variable '{var_name}' in template."
-            )
-    else:
-        return template  # Return the value directly if it's not a placeholder or a complex type
-
-    return result
-
-
-def get_value_by_path(obj, path):
-    if not path:
-        return obj
-    keys = path.split(">")  # 将路径字符串按 '>' 分割成键的列表
-    current_value = obj
-    for key in keys:
-        if isinstance(current_value, dict) and key in current_value:
-            current_value = current_value[key]
-        else:
-            return None  # 如果路径不可达，则返回 None
-    return current_value
-
-
-def generate_embedding_of_api_model(model_config, documents):
-    api_config = model_config.get("apiConfig")
-    if not api_config:
-        raise Exception(f"缺少 apiConfig 配置：{model_config['name']}")
-    api_url = api_config.get("url")
-    method = api_config.get("method", "POST")
-    if method != "POST":
-        raise Exception(f"不支持的请求方法：{method}")
-
-    response_resolver = api_config.get("responseResolver", {})
-    type = response_resolver.get("type", "json")
-    if type != "json":
-        raise Exception(f"不支持的响应解析类型：{type}")
-    path = response_resolver.get("path")
-    headers = api_config.get("headers", {})
-    body = api_config.get("body")
-    if body:
-        body = replace_vars(body, {"documents": documents})
-    logger.info(
-        f"请求 API 模型：{api_url}, method: {method}, body: {body}, headers: {headers}"
-    )
-    r = requests.request(method, api_url, headers=headers, json=body)
-    r.raise_for_status()
-    json = r.json()
-    result = get_value_by_path(json, path)
-    if result is None:
-        raise Exception(f"无法获取响应结果：{json}")
-
-    # check if the result is a list of lists
-    if isinstance(result, list) and all(isinstance(i, list) for i in result):
-        return result
-    else:
-        raise Exception(f"响应结果不是合法的 embeddings result：{result}")
 
 
-def generate_embedding_of_model(model_name, documents):
+def load_model(model_name):
+    return model_registry.get(model_name, lambda: _load_model(model_name))
+
+
+def preload_models():
+    """Load and warm up the models listed in embeddings.preload"""
+    preload = embeddings_config.get("preload", [])
+    if not preload:
+        return
+    if get_embedding_server_client() is not None:
+        logger.info("Embedding server is enabled, skip preloading models in this process")
+        return
+    for model_name in preload:
+        if get_model_config(model_name)["type"] != "local":
+            continue
+        logger.info(f"Preloading embedding model: {model_name}")
+        # 用一次 encode 预热，避免第一个请求承担初始化开销
+        load_model(model_name).encode(["warmup"])
+
+
+def get_model_config(model_name):
     # get model config from SUPPORTED_EMBEDDING_MODELS
     model_config = next(
         (item for item in SUPPORTED_EMBEDDING_MODELS if item["name"] == model_name),
@@ -134,18 +85,79 @@ def generate_embedding_of_model(model_name, documents):
     )
     if not model_config:
         raise Exception(f"不支持的 embedding 模型：{model_name}")
+    return model_config
+
+
+def encode_documents_locally(model_name, documents):
+    model = load_model(model_name)
+    bucketing_config = embeddings_config.get("bucketing", {})
+    if bucketing_config.get("enabled", True) and documents:
+        # 未配置 maxLength 时使用模型自身的最大长度
+        max_length = get_model_config(model_name)["maxLength"] or bucketing_config.get("maxLength")
+        embeddings = encode_by_length_buckets(
+            model, documents, bucketing_config, max_length=max_length
+        )
+    else:
+        embeddings = model.encode(documents)
+    torch.cuda.empty_cache()
+    return embeddings
+
 
+def _encode_documents(model_config, documents):
     if model_config["type"] == "local":
-        model = load_model(model_name)
-        embeddings = model.encode(documents)
-        torch.cuda.empty_cache()
-        return embeddings
+        # 开启 embedding server 时，所有进程共享 server 中的模型
+        client = get_embedding_server_client()
+        if client is not None:
+            return client.encode(model_config["name"], documents)
+        return encode_documents_locally(model_config["name"], documents)
     elif model_config["type"] == "api":
         return generate_embedding_of_api_model(model_config, documents)
     else:
         raise Exception(f"不支持的 embedding 模型类型：{model_config['type']}")
 
 
+def _encode_documents_as_float32(model_config, documents):
+    # 向量统一为连续的 float32 ndarray，各个向量库按自己最省的方式转换
+    return np.ascontiguousarray(
+        _encode_documents(model_config, documents), dtype=np.float32
+    )
+
+
+def generate_embedding_of_model(model_name, documents):
+    model_config = get_model_config(model_name)
+    if not documents:
+        return np.empty((0, model_config["dimension"]), dtype=np.float32)
+
+    cache = get_embedding_cache()
+    if cache is None:
+        return _encode_documents_as_float32(model_config, documents)
+
+    # 只对缓存未命中的文本进行 encode，相同文本只 encode 一次
+    vectors = cache.get_many(model_config, documents)
+    missing_documents = list(
+        dict.fromkeys(
+            document for document, vector in zip(documents, vectors) if vector is None
+        )
+    )
+    if missing_documents:
+        missing_vectors = _encode_documents_as_float32(model_config, missing_documents)
+        cache.set_many(model_config, missing_documents, missing_vectors)
+        encoded = dict(zip(missing_documents, missing_vectors))
+        vectors = [
+            vector if vector is not None else encoded[document]
+            for document, vector in zip(documents, vectors)
+        ]
+    return np.vstack(vectors)
+
+
+def generate_query_embedding(model_name, query):
+    # 并发的单条查询会被合并成一个 batch 进行 encode
+    scheduler = get_embedding_scheduler(model_name, generate_embedding_of_model)
+    if scheduler is None:
+        return generate_embedding_of_model(model_name, [query])[0]
+    return scheduler.submit([query]).result()[0]
+
+
 def get_dimension_by_embedding_model(embedding_model):
     for item in SUPPORTED_EMBEDDING_MODELS:
         if item["name"] == embedding_model:
@@ -0,0 +1,210 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+
+def replace_vars(template, values):
+    """
+    Recursively replace placeholders in the template with values from the values dictionary.
+    This version handles nested structures including dictionaries and lists.
+
+    :param template: dict, a dictionary potentially containing nested dictionaries and lists with placeholders.
+    :param values: dict, a dictionary containing values to replace the placeholders.
+    :return: dict, a dictionary with the placeholders replaced by actual values, respecting nested structures.
+    """
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            result[key] = replace_vars(
+                value, values
+            )  # Recurse into nested dictionaries or lists
+    elif isinstance(template, list):
+        result = [
+            replace_vars(item, values) for item in template
+        ]  # Recurse into each item if it's a list
+    elif (
+        isinstance(template, str)
+        and template.startswith("{")
+        and template.endswith("}")
+    ):
+        var_name = template.strip("{}")
+        if var_name in values:
+            return values[var_name]
+        else:
+            raise ValueError(
+                f"No value provided for variable '{var_name}' in template."
+            )
+    else:
+        return template  # Return the value directly if it's not a placeholder or a complex type
+
+    return result
+
+
+def get_value_by_path(obj, path):
+    if not path:
+        return obj
+    keys = path.split(">")  # 将路径字符串按 '>' 分割成键的列表
+    current_value = obj
+    for key in keys:
+        if isinstance(current_value, dict) and key in current_value:
+            current_value = current_value[key]
+        else:
+            return None  # 如果路径不可达，则返回 None
+    return current_value
+
+
+def estimate_tokens(text):
+    # 粗略估计 token 数：英文约 3~4 字节一个 token，中文约一个字一个 token
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+class ApiEmbeddingClient:
+    """
+    Client of an API type embedding model: splits documents into batches limited by
+    `maxBatchSize` texts and `maxBatchTokens` estimated tokens, sends up to
+    `maxConcurrency` batches at once over a pooled session, and retries 429/5xx
+    responses with exponential backoff (or the Retry-After of the response), each
+    wait capped at `maxBackoff` seconds.
+    """
+
+    def __init__(self, model_config):
+        api_config = model_config.get("apiConfig")
+        if not api_config:
+            raise Exception(f"缺少 apiConfig 配置：{model_config['name']}")
+        self._api_url = api_config.get("url")
+        method = api_config.get("method", "POST")
+        if method != "POST":
+            raise Exception(f"不支持的请求方法：{method}")
+
+        response_resolver = api_config.get("responseResolver", {})
+        type = response_resolver.get("type", "json")
+        if type != "json":
+            raise Exception(f"不支持的响应解析类型：{type}")
+        self._path = response_resolver.get("path")
+        self._headers = api_config.get("headers", {})
+        self._body = api_config.get("body")
+
+        self._max_batch_size = api_config.get("maxBatchSize", 64)
+        self._max_batch_tokens = api_config.get("maxBatchTokens")
+        self._max_concurrency = api_config.get("maxConcurrency", 4)
+        self._max_retries = api_config.get("maxRetries", 5)
+        self._max_backoff = api_config.get("maxBackoff", 30)
+        self._timeout = api_config.get("timeout", 60)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self._max_concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_concurrency,
+            thread_name_prefix=f"embedding-api-{model_config['name']}",
+        )
+
+    def _split_batches(self, documents):
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for document in documents:
+            tokens = estimate_tokens(document) if self._max_batch_tokens else 0
+            if batch and (
+                len(batch) >= self._max_batch_size
+                or (
+                    self._max_batch_tokens
+                    and batch_tokens + tokens > self._max_batch_tokens
+                )
+            ):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(document)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _get_retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            # 服务端给出的等待时间也不超过 maxBackoff，避免长时间阻塞请求线程
+            return min(float(retry_after), self._max_backoff)
+        return min(0.5 * 2**attempt, self._max_backoff) + random.uniform(0, 0.5)
+
+    def _request_batch(self, documents):
+        body = replace_vars(self._body, {"documents": documents}) if self._body else None
+        for attempt in range(self._max_retries + 1):
+            try:
+                r = self._session.post(
+                    self._api_url, headers=self._headers, json=body, timeout=self._timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self._max_retries:
+                    raise e
+                delay = self._get_retry_delay(attempt)
+                logger.warning(f"请求 API 模型失败：{e}，{delay:.1f}s 后重试")
+                time.sleep(delay)
+                continue
+
+            if r.status_code == 429 or r.status_code >= 500:
+                if attempt >= self._max_retries:
+                    r.raise_for_status()
+                delay = self._get_retry_delay(attempt, r)
+                logger.warning(
+                    f"请求 API 模型失败：status {r.status_code}，{delay:.1f}s 后重试"
+                )
+                time.sleep(delay)
+                continue
+
+            r.raise_for_status()
+            json = r.json()
+            result = get_value_by_path(json, self._path)
+            if result is None:
+                raise Exception(f"无法获取响应结果：{json}")
+
+            # check if the result is a list of lists
+            if (
+                isinstance(result, list)
+                and all(isinstance(i, list) for i in result)
+                and len(result) == len(documents)
+            ):
+                return result
+            else:
+                raise Exception(f"响应结果不是合法的 embeddings result：{result}")
+
+    def embed(self, documents):
+        batches = self._split_batches(documents)
+        logger.info(
+            f"请求 API 模型：{self._api_url}, documents: {len(documents)}, batches: {len(batches)}"
+        )
+        if len(batches) <= 1:
+            return self._request_batch(batches[0]) if batches else []
+        futures = [self._executor.submit(self._request_batch, batch) for batch in batches]
+        # 按原始顺序拼接结果
+        result = []
+        for future in futures:
+            result.extend(future.result())
+        return result
+
+
+_api_clients = {}
+_api_clients_lock = threading.Lock()
+
+
+def get_api_embedding_client(model_config):
+    model_name = model_config["name"]
+    client = _api_clients.get(model_name)
+    if client is None:
+        with _api_clients_lock:
+            client = _api_clients.get(model_name)
+            if client is None:
+                client = ApiEmbeddingClient(model_config)
+                _api_clients[model_name] = client
+    return client
+
+
+def generate_embedding_of_api_model(model_config, documents):
+    return get_api_embedding_client(model_config).embed(documents)
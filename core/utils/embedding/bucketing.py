@@ -0,0 +1,81 @@
+import numpy as np
+from loguru import logger
+
+
+def plan_length_buckets(lengths, token_budget, max_batch_size):
+    """
+    Group text indexes sorted by token length into batches whose padded size
+    (batch size * longest member) stays within `token_budget`.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for index in order:
+        # 按长度升序，当前文本就是加入后 batch 中最长的
+        padded = (len(batch) + 1) * max(lengths[index], 1)
+        if batch and (len(batch) >= max_batch_size or padded > token_budget):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# tokenizer 没有设置最大长度时 model_max_length 是一个很大的占位值
+UNSET_MODEL_MAX_LENGTH = 1_000_000
+
+
+def get_model_max_length(model, default=512):
+    """Max sequence length of a loaded model, from the model itself or its tokenizer"""
+    max_seq_length = getattr(model, "max_seq_length", None)
+    if max_seq_length:
+        return int(max_seq_length)
+    model_max_length = getattr(model.tokenizer, "model_max_length", None)
+    if model_max_length and model_max_length < UNSET_MODEL_MAX_LENGTH:
+        return int(model_max_length)
+    return default
+
+
+def encode_by_length_buckets(model, documents, bucketing_config, max_length=None):
+    """
+    `max_length` overrides the max sequence length of the model, by default it is
+    read from the loaded model / tokenizer.
+    """
+    token_budget = bucketing_config.get("tokenBudget", 16384)
+    max_batch_size = bucketing_config.get("maxBatchSize", 256)
+    max_length = max_length or get_model_max_length(model)
+
+    tokenizer = model.tokenizer
+    lengths = [
+        len(input_ids)
+        for input_ids in tokenizer(documents, add_special_tokens=True, truncation=False)[
+            "input_ids"
+        ]
+    ]
+
+    overlength = [i for i, length in enumerate(lengths) if length > max_length]
+    if overlength:
+        message = (
+            f"{len(overlength)} 条文本超过模型最大长度 {max_length} tokens 将被截断，"
+            f"最长 {max(lengths[i] for i in overlength)} tokens，位置：{overlength[:10]}"
+        )
+        if bucketing_config.get("overlength", "warn") == "error":
+            raise Exception(message)
+        logger.warning(message)
+
+    lengths = [min(length, max_length) for length in lengths]
+    result = None
+    for batch in plan_length_buckets(lengths, token_budget, max_batch_size):
+        vectors = np.asarray(
+            model.encode(
+                [documents[i] for i in batch],
+                batch_size=len(batch),
+                max_length=max_length,
+            )
+        )
+        if result is None:
+            result = np.empty((len(documents), vectors.shape[-1]), dtype=vectors.dtype)
+        # 还原为原始顺序
+        result[batch] = vectors
+    return result
@@ -0,0 +1,310 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from core.config import ROOT_DIR, embeddings_config
+from core.utils import chunk_list, ensure_directory_exists, generate_md5
+
+# sqlite 默认单条语句最多 999 个参数
+SQLITE_MAX_VARIABLES = 900
+# 读取时只在内存中记录访问时间，攒够这么多或超过间隔后再写回
+ACCESS_FLUSH_SIZE = 1000
+ACCESS_FLUSH_INTERVAL = 60
+
+
+def model_fingerprint(model_config: dict) -> str:
+    """
+    Fingerprint of the settings that change the vectors of a model name: backend,
+    quantization, model files and truncation. Cached vectors of another variant of
+    the same model are never returned.
+    """
+    variant = {
+        "type": model_config.get("type"),
+        "backend": model_config.get("backend"),
+        "modelPath": model_config.get("model_path"),
+        "maxLength": model_config.get("maxLength")
+        or embeddings_config.get("bucketing", {}).get("maxLength"),
+    }
+    if model_config.get("backend") == "onnx":
+        onnx_config = model_config.get("onnx") or {}
+        variant["onnx"] = {
+            key: onnx_config.get(key)
+            for key in ("path", "quantize", "maxLength", "pooling", "normalize")
+        }
+    if model_config.get("type") == "api":
+        variant["apiUrl"] = (model_config.get("apiConfig") or {}).get("url")
+    return generate_md5(json.dumps(variant, sort_keys=True))[:12]
+
+
+class EmbeddingCache:
+    """
+    Content addressed embedding cache, keyed by (embedding model, model fingerprint,
+    md5 of text).
+
+    Two tiers are supported:
+    - disk: a size bounded sqlite file shared by every process on the node, evicted by LRU.
+      Access times of reads are buffered in memory and written back with the next write
+      or every ACCESS_FLUSH_SIZE reads / ACCESS_FLUSH_INTERVAL seconds.
+    - redis: optional, shared by every node, evicted by TTL (and redis maxmemory policy).
+    """
+
+    def __init__(self, config: dict):
+        disk_config = config.get("disk", {})
+        redis_config = config.get("redis", {})
+
+        self._disk_enabled = disk_config.get("enabled", True)
+        self._disk_path = disk_config.get("path") or os.path.join(
+            ROOT_DIR, "cache", "embeddings.sqlite"
+        )
+        self._disk_max_bytes = int(disk_config.get("maxSizeMB", 1024)) * 1024 * 1024
+
+        self._redis_enabled = redis_config.get("enabled", False)
+        self._redis_ttl = int(redis_config.get("ttl", 7 * 24 * 3600))
+        self._redis_prefix = redis_config.get("prefix", "embedding-cache")
+
+        self._local = threading.local()
+        self._accessed = {}
+        self._accessed_lock = threading.Lock()
+        self._accessed_flushed_at = time.time()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "diskHits": 0,
+            "redisHits": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+        if self._disk_enabled:
+            ensure_directory_exists(os.path.dirname(self._disk_path))
+            conn = self._get_conn()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_accessed_at ON embeddings(accessed_at)"
+            )
+            conn.commit()
+
+    @staticmethod
+    def make_key(model_config: dict, text: str, fingerprint: Optional[str] = None) -> str:
+        fingerprint = fingerprint or model_fingerprint(model_config)
+        return f"{model_config['name']}:{fingerprint}:{generate_md5(text)}"
+
+    def _get_conn(self) -> sqlite3.Connection:
+        # sqlite 连接不能跨线程使用，每个线程单独创建
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._disk_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_redis(self):
+        from core.middleware.redis_client import redis_client
+
+        return redis_client
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self._redis_prefix}:{key}"
+
+    def _incr(self, **kwargs):
+        with self._stats_lock:
+            for name, value in kwargs.items():
+                self._stats[name] += value
+
+    def _disk_get(self, keys: list[str]) -> dict:
+        result = {}
+        conn = self._get_conn()
+        for chunk in chunk_list(keys, SQLITE_MAX_VARIABLES):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for key, blob in rows:
+                result[key] = np.frombuffer(blob, dtype=np.float32)
+        if result:
+            now = time.time()
+            with self._accessed_lock:
+                self._accessed.update((key, now) for key in result.keys())
+                flush = (
+                    len(self._accessed) >= ACCESS_FLUSH_SIZE
+                    or now - self._accessed_flushed_at >= ACCESS_FLUSH_INTERVAL
+                )
+            if flush:
+                self._flush_accessed(conn)
+                conn.commit()
+        return result
+
+    def _flush_accessed(self, conn: sqlite3.Connection):
+        """Write the buffered access times, the caller commits"""
+        with self._accessed_lock:
+            accessed = self._accessed
+            self._accessed = {}
+            self._accessed_flushed_at = time.time()
+        if accessed:
+            conn.executemany(
+                "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in accessed.items()],
+            )
+
+    def _disk_set(self, items: dict):
+        conn = self._get_conn()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, accessed_at) VALUES (?, ?, ?, ?)",
+            [
+                (key, blob, len(blob) + len(key), now)
+                for key, blob in items.items()
+            ],
+        )
+        # 访问时间和写入在同一个事务中提交
+        self._flush_accessed(conn)
+        conn.commit()
+        self._evict_if_needed(conn)
+
+    @staticmethod
+    def _disk_size(conn: sqlite3.Connection) -> int:
+        # 使用中的页面大小，O(1)，不需要扫描整张表
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _evict_if_needed(self, conn: sqlite3.Connection):
+        total = self._disk_size(conn)
+        if total <= self._disk_max_bytes:
+            return
+        # 淘汰到容量上限的 90%，避免每次写入都触发淘汰
+        to_free = total - int(self._disk_max_bytes * 0.9)
+        evicted_keys = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY accessed_at ASC"
+        ):
+            evicted_keys.append(key)
+            to_free -= size
+            if to_free <= 0:
+                break
+        for chunk in chunk_list(evicted_keys, SQLITE_MAX_VARIABLES):
+            placeholders = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM embeddings WHERE key IN ({placeholders})", chunk)
+        conn.commit()
+        self._incr(evictions=len(evicted_keys))
+        logger.info(f"Evicted {len(evicted_keys)} embeddings from disk cache")
+
+    def _redis_get(self, keys: list[str]) -> dict:
+        result = {}
+        values = self._get_redis().mget([self._redis_key(key) for key in keys])
+        for key, blob in zip(keys, values):
+            if blob is not None:
+                result[key] = np.frombuffer(blob, dtype=np.float32)
+        return result
+
+    def _redis_set(self, items: dict):
+        pipeline = self._get_redis().pipeline(transaction=False)
+        for key, blob in items.items():
+            pipeline.set(self._redis_key(key), blob, ex=self._redis_ttl)
+        pipeline.execute()
+
+    def get_many(self, model_config: dict, texts: list[str]) -> list[Optional[np.ndarray]]:
+        fingerprint = model_fingerprint(model_config)
+        keys = [self.make_key(model_config, text, fingerprint) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+
+        if self._disk_enabled:
+            try:
+                found.update(self._disk_get(unique_keys))
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to read embedding disk cache: {e}")
+            self._incr(diskHits=len(found))
+
+        if self._redis_enabled:
+            remaining = [key for key in unique_keys if key not in found]
+            if remaining:
+                try:
+                    redis_found = self._redis_get(remaining)
+                except Exception as e:
+                    logger.warning(f"Failed to read embedding redis cache: {e}")
+                    redis_found = {}
+                self._incr(redisHits=len(redis_found))
+                found.update(redis_found)
+                # 回填本地磁盘缓存
+                if redis_found and self._disk_enabled:
+                    try:
+                        self._disk_set(
+                            {key: vector.tobytes() for key, vector in redis_found.items()}
+                        )
+                    except sqlite3.Error as e:
+                        logger.warning(f"Failed to write embedding disk cache: {e}")
+
+        hits = sum(1 for key in keys if key in found)
+        self._incr(hits=hits, misses=len(keys) - hits)
+        return [found.get(key) for key in keys]
+
+    def set_many(self, model_config: dict, texts: list[str], vectors: np.ndarray):
+        fingerprint = model_fingerprint(model_config)
+        items = {
+            self.make_key(model_config, text, fingerprint): vector.tobytes()
+            for text, vector in zip(texts, vectors)
+        }
+        if not items:
+            return
+        if self._disk_enabled:
+            try:
+                self._disk_set(items)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write embedding disk cache: {e}")
+        if self._redis_enabled:
+            try:
+                self._redis_set(items)
+            except Exception as e:
+                logger.warning(f"Failed to write embedding redis cache: {e}")
+        self._incr(writes=len(items))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hitRate"] = stats["hits"] / total if total else 0.0
+        if self._disk_enabled:
+            try:
+                conn = self._get_conn()
+                stats["diskEntries"] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                stats["diskSizeBytes"] = self._disk_size(conn)
+                stats["diskMaxSizeBytes"] = self._disk_max_bytes
+            except sqlite3.Error:
+                pass
+        return stats
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _embedding_cache
+    cache_config = embeddings_config.get("cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(cache_config)
+    return _embedding_cache
@@ -0,0 +1,126 @@
+import base64
+import http.client
+import json
+import socket
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from core.config import embeddings_config
+
+server_config = embeddings_config.get("server", {})
+
+# 在 embedding server 进程内为 True，此时直接使用本地模型
+_is_server_process = False
+
+
+def mark_as_server_process():
+    global _is_server_process
+    _is_server_process = True
+
+
+def encode_vectors(vectors) -> dict:
+    array = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {
+        "dtype": "float32",
+        "shape": list(array.shape),
+        "data": base64.b64encode(array.tobytes()).decode("ascii"),
+    }
+
+
+def decode_vectors(payload: dict) -> np.ndarray:
+    array = np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32)
+    return array.reshape(payload["shape"])
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+class EmbeddingServerClient:
+    """Thin client of the node local embedding server, see core/utils/embedding/server.py"""
+
+    def __init__(self, config: dict):
+        self._socket_path = config.get("socket")
+        self._host = config.get("host", "127.0.0.1")
+        self._port = int(config.get("port", 8900))
+        self._timeout = float(config.get("timeout", 120))
+        self._max_retries = int(config.get("maxRetries", 5))
+        self._local = threading.local()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self._socket_path:
+            return UnixHTTPConnection(self._socket_path, timeout=self._timeout)
+        return http.client.HTTPConnection(
+            self._host, self._port, timeout=self._timeout
+        )
+
+    def _get_connection(self) -> http.client.HTTPConnection:
+        # 每个线程复用一个 keep-alive 连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._new_connection()
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _post(self, path: str, body: dict) -> dict:
+        payload = json.dumps(body)
+        for attempt in range(self._max_retries + 1):
+            conn = self._get_connection()
+            try:
+                conn.request(
+                    "POST",
+                    path,
+                    body=payload,
+                    headers={"Content-Type": "application/json"},
+                )
+                response = conn.getresponse()
+                data = json.loads(response.read())
+            except (ConnectionError, FileNotFoundError, http.client.HTTPException) as e:
+                # embedding server 可能还在启动中，或者 keep-alive 连接已被关闭
+                self._reset_connection()
+                if attempt >= self._max_retries:
+                    raise Exception(f"无法连接 embedding server：{e}")
+                delay = min(0.5 * 2**attempt, 10)
+                logger.warning(f"Embedding server not available ({e}), retry in {delay}s")
+                time.sleep(delay)
+                continue
+            if response.status != 200:
+                raise Exception(f"embedding server 请求失败：{data.get('message')}")
+            return data
+
+    def encode(self, model_name: str, texts: list[str]) -> np.ndarray:
+        data = self._post("/encode", {"model": model_name, "texts": texts})
+        return decode_vectors(data)
+
+    def rerank(self, model_name: str, pairs: list[list[str]]) -> list[float]:
+        data = self._post("/rerank", {"model": model_name, "pairs": pairs})
+        return data["scores"]
+
+
+_client = None
+
+
+def get_embedding_server_client() -> Optional[EmbeddingServerClient]:
+    global _client
+    if _is_server_process or not server_config.get("enabled", False):
+        return None
+    if _client is None:
+        _client = EmbeddingServerClient(server_config)
+    return _client
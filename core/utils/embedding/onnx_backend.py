@@ -0,0 +1,230 @@
+import gc
+import os
+import sys
+
+import numpy as np
+from loguru import logger
+
+from core.config import MODELS_FOLDER
+
+PARITY_CHECK_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "向量数据库用于存储和检索文本的 embedding。",
+    "Monkeys knowledge base supports full text search and vector search.",
+    "今天天气很好，适合出去散步。",
+]
+
+
+def get_onnx_model_dir(model_config):
+    onnx_config = model_config.get("onnx", {})
+    if onnx_config.get("path"):
+        return onnx_config["path"]
+    model_path = model_config["model_path"]
+    if os.path.exists(model_path):
+        return os.path.join(model_path, "onnx")
+    return os.path.join(MODELS_FOLDER, model_config["name"].split("/")[-1] + "-onnx")
+
+
+def export_onnx_model(
+    model_name_or_path, output_path, trust_remote_code=False, sequence_classification=False
+):
+    """
+    Export a transformers model to onnx. Embedding models output `last_hidden_state`,
+    cross-encoder rerankers (`sequence_classification=True`) output `logits`.
+    """
+    import torch
+    from transformers import (
+        AutoModel,
+        AutoModelForSequenceClassification,
+        AutoTokenizer,
+    )
+
+    logger.info(f"Exporting {model_name_or_path} to onnx: {output_path}")
+    tokenizer = AutoTokenizer.from_pretrained(
+        model_name_or_path, trust_remote_code=trust_remote_code
+    )
+    model_class = (
+        AutoModelForSequenceClassification if sequence_classification else AutoModel
+    )
+    model = model_class.from_pretrained(
+        model_name_or_path, trust_remote_code=trust_remote_code
+    )
+    model.eval()
+
+    if sequence_classification:
+        inputs = tokenizer(["hello"], ["world"], return_tensors="pt")
+        output_name = "logits"
+        output_axes = {0: "batch"}
+    else:
+        inputs = tokenizer(["hello world"], return_tensors="pt")
+        output_name = "last_hidden_state"
+        output_axes = {0: "batch", 1: "sequence"}
+    input_names = list(inputs.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = output_axes
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            # 以关键字参数传入，避免 token_type_ids / attention_mask 顺序错位
+            ({name: inputs[name] for name in input_names},),
+            output_path,
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(os.path.dirname(output_path))
+
+
+def quantize_onnx_model(input_path, output_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Quantizing {input_path} to int8: {output_path}")
+    quantize_dynamic(input_path, output_path, weight_type=QuantType.QInt8)
+
+
+def prepare_onnx_model_file(
+    model_name_or_path, model_dir, onnx_config, sequence_classification=False
+):
+    """Export the model on first use and optionally quantize it, returns the file to load"""
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        export_onnx_model(
+            model_name_or_path,
+            fp32_path,
+            onnx_config.get("trustRemoteCode", False),
+            sequence_classification=sequence_classification,
+        )
+    if onnx_config.get("quantize") != "int8":
+        return fp32_path
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    if not os.path.exists(int8_path):
+        quantize_onnx_model(fp32_path, int8_path)
+    return int8_path
+
+
+def create_cpu_session(model_file, intra_op_threads=None):
+    import onnxruntime as ort
+
+    session_options = ort.SessionOptions()
+    session_options.intra_op_num_threads = intra_op_threads or os.cpu_count() or 1
+    session_options.inter_op_num_threads = 1
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        model_file, session_options, providers=["CPUExecutionProvider"]
+    )
+
+
+class OnnxEmbeddingModel:
+    """
+    Run a local embedding model through ONNX Runtime on CPU, optionally dynamically
+    quantized to int8. Pooling and normalization match FlagModel (cls pooling, L2 normalized).
+    """
+
+    def __init__(self, model_config):
+        from transformers import AutoTokenizer
+
+        onnx_config = model_config.get("onnx", {})
+        model_name_or_path = (
+            model_config["model_path"]
+            if os.path.exists(model_config["model_path"])
+            else model_config["name"]
+        )
+        trust_remote_code = onnx_config.get("trustRemoteCode", False)
+        self._batch_size = onnx_config.get("batchSize", 64)
+        self._max_length = onnx_config.get("maxLength", 512)
+        self._pooling = onnx_config.get("pooling", "cls")
+        self._normalize = onnx_config.get("normalize", True)
+
+        model_dir = get_onnx_model_dir(model_config)
+        model_file = prepare_onnx_model_file(model_name_or_path, model_dir, onnx_config)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            model_dir, trust_remote_code=trust_remote_code
+        )
+        self._session = create_cpu_session(
+            model_file, onnx_config.get("intraOpThreads")
+        )
+        self._input_names = [item.name for item in self._session.get_inputs()]
+        self.size_bytes = os.path.getsize(model_file)
+        logger.info(f"Loaded onnx embedding model: {model_file}")
+
+    @property
+    def max_seq_length(self):
+        return self._max_length
+
+    def encode(self, sentences, batch_size=None, max_length=None):
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size, max_length)[0]
+        batch_size = batch_size or self._batch_size
+        max_length = max_length or self._max_length
+        all_embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start : start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="np",
+            )
+            feeds = {
+                name: inputs[name].astype(np.int64)
+                for name in self._input_names
+                if name in inputs
+            }
+            last_hidden_state = self._session.run(None, feeds)[0]
+            if self._pooling == "mean":
+                mask = inputs["attention_mask"][..., None].astype(np.float32)
+                embeddings = (last_hidden_state * mask).sum(axis=1) / mask.sum(axis=1)
+            else:
+                embeddings = last_hidden_state[:, 0]
+            if self._normalize:
+                embeddings = embeddings / np.linalg.norm(
+                    embeddings, axis=-1, keepdims=True
+                )
+            all_embeddings.append(embeddings.astype(np.float32))
+        if not all_embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(all_embeddings)
+
+
+def check_parity(model_config, texts=None, min_cosine=0.99):
+    """
+    Compare the vectors of the onnx backend with the PyTorch FlagModel output.
+    Returns the min / mean cosine similarity of each text. Run by tests/test_onnx_parity.py
+    or `python -m core.utils.embedding.onnx_backend <model name>`, not at startup.
+    """
+    from FlagEmbedding import FlagModel
+
+    texts = texts or PARITY_CHECK_TEXTS
+    model_name_or_path = (
+        model_config["model_path"]
+        if os.path.exists(model_config["model_path"])
+        else model_config["name"]
+    )
+    torch_model = FlagModel(model_name_or_path, use_fp16=False)
+    torch_vectors = np.asarray(torch_model.encode(texts), dtype=np.float32)
+    # 先释放 PyTorch 模型再加载 onnx，两个模型不同时占用内存
+    del torch_model
+    gc.collect()
+    onnx_vectors = OnnxEmbeddingModel(model_config).encode(texts)
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=-1) / (
+        np.linalg.norm(torch_vectors, axis=-1) * np.linalg.norm(onnx_vectors, axis=-1)
+    )
+    result = {
+        "model": model_config["name"],
+        "minCosine": float(cosines.min()),
+        "meanCosine": float(cosines.mean()),
+        "passed": bool(cosines.min() >= min_cosine),
+    }
+    logger.info(f"Onnx parity check: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    # python -m core.utils.embedding.onnx_backend <model name>
+    from core.utils.embedding import get_model_config
+
+    result = check_parity(get_model_config(sys.argv[1]))
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,90 @@
+import gc
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from loguru import logger
+
+
+def estimate_model_size(model) -> int:
+    # FlagModel / FlagReranker 都把 transformers 模型放在 .model 上
+    inner = getattr(model, "model", None)
+    if inner is not None and hasattr(inner, "parameters"):
+        return sum(p.numel() * p.element_size() for p in inner.parameters())
+    return getattr(model, "size_bytes", 0)
+
+
+class ModelRegistry:
+    """
+    Process wide registry of loaded models.
+
+    Each model is loaded at most once even if requested concurrently, and the least recently
+    used models are evicted when the total estimated size exceeds `memory_budget_bytes`
+    (0 means unlimited). The most recently loaded model is never evicted.
+    """
+
+    def __init__(self, memory_budget_bytes: int = 0):
+        self._memory_budget_bytes = memory_budget_bytes
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+
+    def get(self, name: str, loader: Callable):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            loading_lock = self._loading_locks.setdefault(name, threading.Lock())
+
+        with loading_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+
+            model = loader()
+            size = estimate_model_size(model)
+            logger.info(f"Loaded model {name}, estimated size: {size / 1024 / 1024:.1f}MB")
+
+            with self._lock:
+                self._models[name] = model
+                self._sizes[name] = size
+                self._evict_if_needed()
+            return model
+
+    def _evict_if_needed(self):
+        if not self._memory_budget_bytes:
+            return
+        evicted = False
+        while (
+            len(self._models) > 1
+            and sum(self._sizes.values()) > self._memory_budget_bytes
+        ):
+            name, _ = self._models.popitem(last=False)
+            self._sizes.pop(name, None)
+            evicted = True
+            logger.info(f"Evicted model {name} to stay within memory budget")
+        if evicted:
+            gc.collect()
+            try:
+                import torch
+
+                torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def loaded_models(self) -> list[str]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": [
+                    {"name": name, "sizeBytes": self._sizes.get(name, 0)}
+                    for name in self._models.keys()
+                ],
+                "totalSizeBytes": sum(self._sizes.values()),
+                "memoryBudgetBytes": self._memory_budget_bytes,
+            }
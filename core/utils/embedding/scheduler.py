@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from loguru import logger
+
+from core.config import embeddings_config
+
+
+class _EmbeddingRequest:
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.future = Future()
+
+
+class EmbeddingBatchScheduler:
+    """
+    Collect concurrent embedding requests of the same model for at most `max_wait_ms`
+    (or until `max_batch_size` texts are queued) and encode them in one model call.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        encode_fn: Callable,
+        max_wait_ms: float = 5,
+        max_batch_size: int = 32,
+    ):
+        self._model_name = model_name
+        self._encode_fn = encode_fn
+        self._max_wait = max_wait_ms / 1000
+        self._max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"embedding-scheduler-{model_name}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        request = _EmbeddingRequest(texts)
+        self._queue.put(request)
+        return request.future
+
+    def _collect_batch(self) -> list[_EmbeddingRequest]:
+        first = self._queue.get()
+        batch = [first]
+        count = len(first.texts)
+        deadline = time.monotonic() + self._max_wait
+        while count < self._max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            count += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self._encode_fn(self._model_name, texts)
+            except Exception as e:
+                logger.error(f"Failed to encode batch of {len(texts)} texts: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset : offset + len(request.texts)])
+                offset += len(request.texts)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_embedding_scheduler(
+    model_name: str, encode_fn: Callable
+) -> Optional[EmbeddingBatchScheduler]:
+    batching_config = embeddings_config.get("batching", {})
+    if not batching_config.get("enabled", False):
+        return None
+    scheduler = _schedulers.get(model_name)
+    if scheduler is None:
+        # 每个模型一个常驻线程，不能为任意的模型名创建
+        if not any(item["name"] == model_name for item in embeddings_config.get("models", [])):
+            raise Exception(f"不支持的 embedding 模型：{model_name}")
+        with _schedulers_lock:
+            scheduler = _schedulers.get(model_name)
+            if scheduler is None:
+                scheduler = EmbeddingBatchScheduler(
+                    model_name,
+                    encode_fn,
+                    max_wait_ms=batching_config.get("maxWaitMs", 5),
+                    max_batch_size=batching_config.get("maxBatchSize", 32),
+                )
+                _schedulers[model_name] = scheduler
+    return scheduler
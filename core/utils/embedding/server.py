@@ -0,0 +1,145 @@
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+from core.utils.embedding import (
+    encode_documents_locally,
+    get_model_config,
+    model_registry,
+    preload_models,
+)
+from core.utils.embedding.client import (
+    encode_vectors,
+    mark_as_server_process,
+    server_config,
+)
+from core.utils.embedding.scheduler import EmbeddingBatchScheduler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UnknownModelError(ValueError):
+    pass
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def _check_model(kind: str, model_name: str):
+    """Model names come from the request, only configured models get a scheduler thread"""
+    if kind == "encode":
+        try:
+            get_model_config(model_name)
+        except Exception as e:
+            raise UnknownModelError(str(e))
+    else:
+        from core.utils.reranker import DEFAULT_RERANKER_MODEL
+
+        if model_name != DEFAULT_RERANKER_MODEL:
+            raise UnknownModelError(f"不支持的 reranker 模型：{model_name}")
+
+
+def _get_scheduler(kind: str, model_name: str, encode_fn) -> EmbeddingBatchScheduler:
+    key = (kind, model_name)
+    scheduler = _schedulers.get(key)
+    if scheduler is None:
+        _check_model(kind, model_name)
+        with _schedulers_lock:
+            scheduler = _schedulers.get(key)
+            if scheduler is None:
+                scheduler = EmbeddingBatchScheduler(
+                    model_name,
+                    encode_fn,
+                    max_wait_ms=server_config.get("maxWaitMs", 5),
+                    max_batch_size=server_config.get("maxBatchSize", 64),
+                )
+                _schedulers[key] = scheduler
+    return scheduler
+
+
+def encode(model_name: str, texts: list[str]):
+    scheduler = _get_scheduler("encode", model_name, encode_documents_locally)
+    return scheduler.submit(texts).result()
+
+
+def rerank(model_name: str, pairs: list[list[str]]) -> list[float]:
+    from core.utils.reranker import compute_scores_of_pairs
+
+    scheduler = _get_scheduler("rerank", model_name, compute_scores_of_pairs)
+    return list(scheduler.submit(pairs).result())
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "models": model_registry.loaded_models()})
+        else:
+            self._send_json(404, {"message": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length))
+            if self.path == "/encode":
+                vectors = encode(data["model"], data["texts"])
+                result = encode_vectors(vectors)
+            elif self.path == "/rerank":
+                result = {"scores": rerank(data["model"], data["pairs"])}
+            else:
+                self._send_json(404, {"message": f"Not found: {self.path}"})
+                return
+        except UnknownModelError as e:
+            self._send_json(400, {"message": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Failed to handle {self.path}: {e}")
+            self._send_json(500, {"message": str(e)})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        # unix socket 下 client_address 为空，不能使用默认实现
+        logger.debug(format % args)
+
+
+def create_embedding_server():
+    socket_path = server_config.get("socket")
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, EmbeddingRequestHandler)
+        logger.info(f"Embedding server listening on unix:{socket_path}")
+    else:
+        host = server_config.get("host", "127.0.0.1")
+        port = int(server_config.get("port", 8900))
+        server = ThreadingHTTPServer((host, port), EmbeddingRequestHandler)
+        server.daemon_threads = True
+        logger.info(f"Embedding server listening on http://{host}:{port}")
+    return server
+
+
+def run_embedding_server():
+    mark_as_server_process()
+    preload_models()
+    server = create_embedding_server()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
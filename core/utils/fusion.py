@@ -0,0 +1,59 @@
+from core.models.document import Document
+from core.utils import generate_md5
+
+
+def document_key(document: Document) -> str:
+    # 部分向量库不返回 pk，使用内容的 md5 去重
+    return document.pk or generate_md5(document.page_content)
+
+
+def reciprocal_rank_fusion(
+    result_lists: list[list[Document]], weights: list[float] = None, k: int = 60
+) -> list[tuple[Document, float]]:
+    """
+    Fuse ranked lists with RRF: score = sum(weight / (k + rank)), duplicates merged by pk.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores = {}
+    documents = {}
+    for documents_of_list, weight in zip(result_lists, weights):
+        for rank, document in enumerate(documents_of_list):
+            key = document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank + 1)
+    return sorted(
+        ((documents[key], score) for key, score in scores.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+
+
+def weighted_score_fusion(
+    result_lists: list[list[Document]], weights: list[float] = None
+) -> list[tuple[Document, float]]:
+    """
+    Fuse lists by a weighted sum of min-max normalized scores. Uses metadata["score"] when
+    the backend returns one, otherwise a rank based score, duplicates merged by pk.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores = {}
+    documents = {}
+    for documents_of_list, weight in zip(result_lists, weights):
+        if not documents_of_list:
+            continue
+        raw_scores = [
+            (document.metadata or {}).get("score") for document in documents_of_list
+        ]
+        if any(score is None for score in raw_scores):
+            raw_scores = [1.0 / (rank + 1) for rank in range(len(documents_of_list))]
+        low, high = min(raw_scores), max(raw_scores)
+        for document, raw_score in zip(documents_of_list, raw_scores):
+            normalized = (raw_score - low) / (high - low) if high > low else 1.0
+            key = document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + weight * normalized
+    return sorted(
+        ((documents[key], score) for key, score in scores.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )
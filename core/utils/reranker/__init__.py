@@ -0,0 +1,90 @@
+import heapq
+import os
+from FlagEmbedding import FlagReranker
+from core.config import MODELS_FOLDER, reranker_config
+from core.utils.embedding import model_registry
+from core.utils.embedding.client import get_embedding_server_client
+from core.utils.reranker.cache import get_rerank_score_cache
+from core.utils.reranker.engine import RerankerEngine
+
+DEFAULT_RERANKER_MODEL = reranker_config.get("model", "BAAI/bge-reranker-large")
+
+
+def get_reranker_model_path(model_name):
+    if model_name == DEFAULT_RERANKER_MODEL and reranker_config.get("modelPath"):
+        return reranker_config["modelPath"]
+    model_path = os.path.join(MODELS_FOLDER, model_name.split("/")[-1])
+    # 如果本地有下载 model 使用本地的，否则在线下载
+    return model_path if os.path.exists(model_path) else model_name
+
+
+def get_reranker_onnx_dir(model_name):
+    onnx_config = reranker_config.get("onnx", {})
+    if onnx_config.get("path"):
+        return onnx_config["path"]
+    return os.path.join(MODELS_FOLDER, model_name.split("/")[-1] + "-onnx")
+
+
+def _create_reranker(model_name):
+    model_path = get_reranker_model_path(model_name)
+    if reranker_config.get("backend", "torch") == "onnx":
+        from core.utils.reranker.onnx_backend import OnnxReranker
+
+        onnx_config = reranker_config.get("onnx", {})
+        return OnnxReranker(model_path, get_reranker_onnx_dir(model_name), onnx_config)
+    return FlagReranker(model_path, use_fp16=True)
+
+
+def _load_reranker_engine(model_name):
+    bucketing_config = reranker_config.get("bucketing", {})
+    return RerankerEngine(
+        _create_reranker(model_name),
+        token_budget=bucketing_config.get("tokenBudget", 16384),
+        max_batch_size=bucketing_config.get("maxBatchSize", 64),
+        max_length=bucketing_config.get("maxLength", 512),
+    )
+
+
+def load_reranker(model_name=DEFAULT_RERANKER_MODEL) -> RerankerEngine:
+    # reranker 与 embedding 模型共享同一个内存预算，只加载一次
+    return model_registry.get(
+        f"reranker:{model_name}", lambda: _load_reranker_engine(model_name)
+    )
+
+
+def compute_scores_of_pairs(model_name, pairs):
+    return load_reranker(model_name).compute_scores(pairs)
+
+
+def _compute_scores(model_name, pairs):
+    client = get_embedding_server_client()
+    if client is not None:
+        return client.rerank(model_name, pairs)
+    return compute_scores_of_pairs(model_name, pairs)
+
+
+def compute_rerank_scores(query, passages, model_name=DEFAULT_RERANKER_MODEL):
+    pairs = [[query, passage] for passage in passages]
+    if not pairs:
+        return []
+
+    cache = get_rerank_score_cache()
+    if cache is None:
+        return _compute_scores(model_name, pairs)
+
+    keys = [cache.make_key(model_name, query, passage) for passage in passages]
+    scores = cache.get_many(keys)
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        missing_scores = _compute_scores(model_name, [pairs[i] for i in missing])
+        cache.set_many({keys[i]: score for i, score in zip(missing, missing_scores)})
+        for i, score in zip(missing, missing_scores):
+            scores[i] = score
+    return scores
+
+
+def top_k_indexes(scores, top_k=None):
+    """Indexes of the highest scores in descending order, partial sort when top_k is given"""
+    if top_k is None or top_k >= len(scores):
+        return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+    return heapq.nlargest(top_k, range(len(scores)), key=scores.__getitem__)
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+from core.config import reranker_config
+from core.utils import generate_md5
+
+
+class RerankScoreCache:
+    """
+    Cache of reranker scores keyed by (model, md5 of query, md5 of passage).
+    An in-process LRU bounded by `maxEntries`, and optionally redis with a TTL
+    so repeated workflow runs on other processes hit it too.
+    """
+
+    def __init__(self, config: dict):
+        self._max_entries = int(config.get("maxEntries", 100000))
+        redis_config = config.get("redis", {})
+        self._redis_enabled = redis_config.get("enabled", False)
+        self._redis_ttl = int(redis_config.get("ttl", 24 * 3600))
+        self._redis_prefix = redis_config.get("prefix", "rerank-cache")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, query: str, passage: str) -> str:
+        return f"{model_name}:{generate_md5(query)}:{generate_md5(passage)}"
+
+    def get_many(self, keys: list[str]) -> list[Optional[float]]:
+        result = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    result[key] = self._entries[key]
+
+        remaining = [key for key in dict.fromkeys(keys) if key not in result]
+        if self._redis_enabled and remaining:
+            try:
+                from core.middleware.redis_client import redis_client
+
+                values = redis_client.mget(
+                    [f"{self._redis_prefix}:{key}" for key in remaining]
+                )
+                redis_found = {
+                    key: float(value)
+                    for key, value in zip(remaining, values)
+                    if value is not None
+                }
+                result.update(redis_found)
+                self._put_local(redis_found)
+            except Exception as e:
+                logger.warning(f"Failed to read rerank score cache: {e}")
+
+        with self._lock:
+            hits = sum(1 for key in keys if key in result)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return [result.get(key) for key in keys]
+
+    def _put_local(self, items: dict):
+        with self._lock:
+            for key, score in items.items():
+                self._entries[key] = score
+                self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        self._put_local(items)
+        if self._redis_enabled:
+            try:
+                from core.middleware.redis_client import redis_client
+
+                pipeline = redis_client.pipeline(transaction=False)
+                for key, score in items.items():
+                    pipeline.set(f"{self._redis_prefix}:{key}", score, ex=self._redis_ttl)
+                pipeline.execute()
+            except Exception as e:
+                logger.warning(f"Failed to write rerank score cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": self._hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "maxEntries": self._max_entries,
+            }
+
+
+_score_cache = None
+_score_cache_lock = threading.Lock()
+
+
+def get_rerank_score_cache() -> Optional[RerankScoreCache]:
+    global _score_cache
+    cache_config = reranker_config.get("cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+    if _score_cache is None:
+        with _score_cache_lock:
+            if _score_cache is None:
+                _score_cache = RerankScoreCache(cache_config)
+    return _score_cache
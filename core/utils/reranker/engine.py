@@ -0,0 +1,52 @@
+import threading
+
+from core.utils.embedding.bucketing import plan_length_buckets
+from core.utils.embedding.registry import estimate_model_size
+
+
+class RerankerEngine:
+    """
+    Long lived cross-encoder reranker. Pairs are sorted by token length and scored in
+    batches limited by a padded token budget; calls are serialized so one loaded model
+    can be shared by all request threads.
+    """
+
+    def __init__(self, reranker, token_budget=16384, max_batch_size=64, max_length=512):
+        self.reranker = reranker
+        self.size_bytes = estimate_model_size(reranker)
+        self._token_budget = token_budget
+        self._max_batch_size = max_batch_size
+        self._max_length = max_length
+        self._lock = threading.Lock()
+
+    def _get_lengths(self, pairs):
+        tokenizer = getattr(self.reranker, "tokenizer", None)
+        if tokenizer is None:
+            return [len(query) + len(passage) for query, passage in pairs]
+        encoded = tokenizer(
+            [query for query, _ in pairs],
+            [passage for _, passage in pairs],
+            truncation=False,
+        )
+        return [min(len(ids), self._max_length) for ids in encoded["input_ids"]]
+
+    def compute_scores(self, pairs):
+        if not pairs:
+            return []
+        scores = [0.0] * len(pairs)
+        batches = plan_length_buckets(
+            self._get_lengths(pairs), self._token_budget, self._max_batch_size
+        )
+        with self._lock:
+            for batch in batches:
+                batch_scores = self.reranker.compute_score(
+                    [pairs[i] for i in batch],
+                    batch_size=len(batch),
+                    max_length=self._max_length,
+                )
+                # 只有一对时 FlagReranker 返回单个 float
+                if not isinstance(batch_scores, list):
+                    batch_scores = [batch_scores]
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+        return scores
@@ -0,0 +1,116 @@
+import gc
+import os
+import sys
+
+import numpy as np
+from loguru import logger
+
+from core.utils.embedding.onnx_backend import (
+    create_cpu_session,
+    prepare_onnx_model_file,
+)
+
+PARITY_CHECK_PAIRS = [
+    ["what is a panda?", "The giant panda is a bear species endemic to China."],
+    ["what is a panda?", "Paris is the capital of France."],
+    ["向量数据库是什么？", "向量数据库用于存储和检索文本的 embedding。"],
+    ["向量数据库是什么？", "今天天气很好，适合出去散步。"],
+    ["how to bake bread", "Mix flour, water, yeast and salt, then bake at 220°C."],
+]
+
+
+class OnnxReranker:
+    """
+    Cross-encoder reranker run through ONNX Runtime on CPU, optionally dynamically
+    quantized to int8. Exposes the same compute_score interface as FlagReranker (raw logits).
+    """
+
+    def __init__(self, model_name_or_path, onnx_dir, onnx_config):
+        from transformers import AutoTokenizer
+
+        self._max_length = onnx_config.get("maxLength", 512)
+        model_file = prepare_onnx_model_file(
+            model_name_or_path, onnx_dir, onnx_config, sequence_classification=True
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            onnx_dir, trust_remote_code=onnx_config.get("trustRemoteCode", False)
+        )
+        self._session = create_cpu_session(
+            model_file, onnx_config.get("intraOpThreads")
+        )
+        self._input_names = [item.name for item in self._session.get_inputs()]
+        self.size_bytes = os.path.getsize(model_file)
+        logger.info(f"Loaded onnx reranker model: {model_file}")
+
+    def compute_score(self, sentence_pairs, batch_size=64, max_length=None):
+        max_length = min(max_length or self._max_length, self._max_length)
+        scores = []
+        for start in range(0, len(sentence_pairs), batch_size):
+            batch = sentence_pairs[start : start + batch_size]
+            inputs = self.tokenizer(
+                [query for query, _ in batch],
+                [passage for _, passage in batch],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="np",
+            )
+            feeds = {
+                name: inputs[name].astype(np.int64)
+                for name in self._input_names
+                if name in inputs
+            }
+            logits = self._session.run(None, feeds)[0]
+            scores.extend(logits[:, 0].astype(np.float32).tolist())
+        return scores[0] if len(scores) == 1 else scores
+
+
+def check_reranker_parity(model_name_or_path, onnx_dir, onnx_config, pairs=None, min_correlation=0.99):
+    """
+    Compare the scores of the onnx reranker with FlagReranker on the same pairs.
+    Passes when the score correlation is high enough and the ranking of the pairs is unchanged.
+    Run by tests/test_onnx_parity.py or `python -m core.utils.reranker.onnx_backend`.
+    """
+    from FlagEmbedding import FlagReranker
+
+    pairs = pairs or PARITY_CHECK_PAIRS
+    torch_model = FlagReranker(model_name_or_path, use_fp16=False)
+    torch_scores = np.asarray(torch_model.compute_score(pairs), dtype=np.float32)
+    # 先释放 PyTorch 模型再加载 onnx，两个模型不同时占用内存
+    del torch_model
+    gc.collect()
+    onnx_scores = np.asarray(
+        OnnxReranker(model_name_or_path, onnx_dir, onnx_config).compute_score(pairs),
+        dtype=np.float32,
+    )
+    correlation = float(np.corrcoef(torch_scores, onnx_scores)[0, 1])
+    same_ranking = bool(
+        (np.argsort(-torch_scores) == np.argsort(-onnx_scores)).all()
+    )
+    result = {
+        "model": model_name_or_path,
+        "maxAbsDiff": float(np.abs(torch_scores - onnx_scores).max()),
+        "correlation": correlation,
+        "sameRanking": same_ranking,
+        "passed": correlation >= min_correlation and same_ranking,
+    }
+    logger.info(f"Onnx reranker parity check: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    # python -m core.utils.reranker.onnx_backend [reranker model name]
+    from core.config import reranker_config
+    from core.utils.reranker import (
+        DEFAULT_RERANKER_MODEL,
+        get_reranker_model_path,
+        get_reranker_onnx_dir,
+    )
+
+    model_name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_RERANKER_MODEL
+    result = check_reranker_parity(
+        get_reranker_model_path(model_name),
+        get_reranker_onnx_dir(model_name),
+        reranker_config.get("onnx", {}),
+    )
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,10 @@
+from loguru import logger
+from core.utils.embedding.client import server_config
+
+if __name__ == "__main__":
+    if not server_config.get("enabled", False):
+        logger.info("Embedding server is disabled, exit")
+    else:
+        from core.utils.embedding.server import run_embedding_server
+
+        run_embedding_server()
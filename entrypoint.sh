@@ -4,6 +4,9 @@
 
 flask db upgrade
 
+# Run shared embedding server (exits immediately if embeddings.server is disabled)
+python embedding_server.py &
+
 # Run worker
 python worker.py &
 
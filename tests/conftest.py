@@ -0,0 +1,16 @@
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# core.config 从当前目录读取 config.yaml，测试使用 config.yaml.example
+if not os.path.exists("config.yaml"):
+    config_dir = tempfile.mkdtemp(prefix="monkey-tools-test-")
+    shutil.copy(
+        os.path.join(ROOT_DIR, "config.yaml.example"),
+        os.path.join(config_dir, "config.yaml"),
+    )
+    os.chdir(config_dir)
@@ -0,0 +1,40 @@
+"""Metadata filter conformance cases shared by the unit tests and the live backend check"""
+
+DOCUMENTS = [
+    {"filename": "a.pdf", "user_id": "u1", "created_at": 1700000000, "page": 1, "ratio": 0.5},
+    {"filename": "b.pdf", "user_id": "u1", "created_at": 1700003600, "page": 2},
+    {"filename": "c.txt", "user_id": "u2", "created_at": 1700007200, "page": 10, "ratio": 1.5},
+    {"filename": "d.txt", "user_id": "u2", "created_at": 1700010800},
+    {"filename": "e.md", "user_id": "u3", "created_at": 1700014400, "page": 3, "ratio": 0.5},
+]
+
+# (filter, indexes of the matching DOCUMENTS)
+CASES = [
+    ({"filename": "a.pdf"}, [0]),
+    ({"user_id": ["u1", "u3"]}, [0, 1, 4]),
+    ({"user_id": {"in": ["u2"]}, "page": {"exists": True}}, [2]),
+    ({"page": {"gte": 2, "lt": 10}}, [1, 4]),
+    ({"created_at": {"gt": "2023-11-14T22:13:20+00:00"}}, [1, 2, 3, 4]),
+    ({"page": {"exists": False}}, [3]),
+    ({"or": [{"filename": "a.pdf"}, {"page": {"gte": 10}}]}, [0, 2]),
+    ({"not": {"user_id": "u1"}}, [2, 3, 4]),
+    ({"not": {"page": {"gt": 1}}}, [0, 3]),
+    ({"and": [{"user_id": "u2"}, {"not": {"filename": "c.txt"}}]}, [3]),
+    ({"page": 1}, [0]),
+    ({"page": [3, 10]}, [2, 4]),
+    # 旧的 {key: value} 过滤：None、"" 与 [] 表示不过滤该字段
+    ({"filename": "", "user_id": "u3"}, [4]),
+    ({"user_id": [], "page": 2}, [1]),
+    ({"filename": None, "page": {"lte": 1}}, [0]),
+    # 相等比较区分类型
+    ({"page": "1"}, []),
+    # 浮点数，数值之间按数值比较
+    ({"ratio": 0.5}, [0, 4]),
+    ({"ratio": [0.5, 1.5]}, [0, 2, 4]),
+    ({"page": 2.0}, [1]),
+    # 混合类型的 in，qdrant 不支持
+    ({"user_id": ["u3", 1]}, [4]),
+]
+
+# qdrant 的 MatchAny 只接受同一类型的值
+QDRANT_UNSUPPORTED = [{"user_id": ["u3", 1]}]
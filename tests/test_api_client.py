@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding.api_client import ApiEmbeddingClient  # noqa: E402
+
+
+def make_client(**api_config):
+    return ApiEmbeddingClient(
+        {"name": "api-model", "apiConfig": {"url": "http://localhost/embeddings", **api_config}}
+    )
+
+
+def test_retry_after_is_capped_by_max_backoff():
+    client = make_client(maxBackoff=10)
+    response = SimpleNamespace(headers={"Retry-After": "3600"})
+    assert client._get_retry_delay(0, response) == 10
+    response = SimpleNamespace(headers={"Retry-After": "2"})
+    assert client._get_retry_delay(0, response) == 2
+
+
+def test_exponential_backoff_is_capped_by_max_backoff():
+    client = make_client(maxBackoff=4)
+    assert 4 <= client._get_retry_delay(10) <= 4.5
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding.bucketing import get_model_max_length  # noqa: E402
+
+
+def test_max_length_from_model():
+    model = SimpleNamespace(max_seq_length=8192, tokenizer=SimpleNamespace(model_max_length=512))
+    assert get_model_max_length(model) == 8192
+
+
+def test_max_length_from_tokenizer():
+    model = SimpleNamespace(tokenizer=SimpleNamespace(model_max_length=8192))
+    assert get_model_max_length(model) == 8192
+
+
+def test_max_length_of_unset_tokenizer_falls_back_to_default():
+    # transformers 在未配置时返回 int(1e30)
+    model = SimpleNamespace(tokenizer=SimpleNamespace(model_max_length=int(1e30)))
+    assert get_model_max_length(model) == 512
+    assert get_model_max_length(model, default=256) == 256
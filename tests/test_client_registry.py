@@ -0,0 +1,84 @@
+import time
+
+from pydantic import BaseModel
+
+from core.storage.vectorstore.client_registry import ClientRegistry
+
+
+class BackendConfig(BaseModel):
+    url: str
+
+
+class FakeClient:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_same_config_returns_same_client():
+    registry = ClientRegistry()
+    first = registry.get("es", BackendConfig(url="http://a"), FakeClient)
+    assert registry.get("es", BackendConfig(url="http://a"), FakeClient) is first
+    assert registry.get("es", BackendConfig(url="http://b"), FakeClient) is not first
+
+
+def test_failed_health_check_rebuilds_client():
+    registry = ClientRegistry(health_check_interval=0)
+    config = BackendConfig(url="http://a")
+    health_check = lambda client: client.healthy
+    first = registry.get("es", config, FakeClient, health_check)
+    assert registry.get("es", config, FakeClient, health_check) is first
+
+    first.healthy = False
+    second = registry.get("es", config, FakeClient, health_check)
+    assert second is not first
+    assert registry.get("es", config, FakeClient, health_check) is second
+    # 其他线程可能还在使用旧的 client
+    assert not first.closed
+
+
+def test_replaced_client_is_closed_after_grace_period(monkeypatch):
+    from core.storage.vectorstore import client_registry
+
+    now = time.time()
+    monkeypatch.setattr(client_registry.time, "time", lambda: now)
+    registry = ClientRegistry(health_check_interval=0, retire_grace_period=60)
+    config = BackendConfig(url="http://a")
+    health_check = lambda client: client.healthy
+    first = registry.get("es", config, FakeClient, health_check)
+    now += 1
+    first.healthy = False
+    second = registry.get("es", config, FakeClient, health_check)
+
+    now += 30
+    registry.get("es", config, FakeClient)
+    assert not first.closed
+    now += 31
+    assert registry.get("es", config, FakeClient) is second
+    assert first.closed
+    assert not second.closed
+
+
+def test_health_check_exception_rebuilds_client():
+    registry = ClientRegistry(health_check_interval=0)
+    config = BackendConfig(url="http://a")
+
+    def health_check(client):
+        raise ConnectionError("down")
+
+    first = registry.get("es", config, FakeClient)
+    assert registry.get("es", config, FakeClient, health_check) is not first
+
+
+def test_close_all():
+    registry = ClientRegistry(health_check_interval=0)
+    config = BackendConfig(url="http://a")
+    retired = registry.get("es", config, FakeClient)
+    retired.healthy = False
+    client = registry.get("es", config, FakeClient, lambda client: client.healthy)
+    registry.close_all()
+    assert client.closed and retired.closed
+    assert registry.stats() == {}
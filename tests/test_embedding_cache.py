@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding.cache import EmbeddingCache  # noqa: E402
+
+TORCH = {"name": "BAAI/bge-base-zh-v1.5", "type": "local", "backend": "torch", "model_path": "/models/bge"}
+ONNX_INT8 = dict(TORCH, backend="onnx", onnx={"quantize": "int8"})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache({"disk": {"path": str(tmp_path / "embeddings.sqlite")}})
+
+
+def test_backends_do_not_share_vectors(cache):
+    cache.set_many(TORCH, ["hello"], np.ones((1, 4), dtype=np.float32))
+    assert cache.get_many(ONNX_INT8, ["hello"]) == [None]
+    assert cache.get_many(dict(ONNX_INT8, onnx={}), ["hello"]) == [None]
+    np.testing.assert_array_equal(cache.get_many(TORCH, ["hello"])[0], np.ones(4, dtype=np.float32))
+
+
+def test_reads_buffer_access_times(cache):
+    cache.set_many(TORCH, ["a", "b"], np.zeros((2, 4), dtype=np.float32))
+    conn = cache._get_conn()
+    before = dict(conn.execute("SELECT key, accessed_at FROM embeddings"))
+    cache.get_many(TORCH, ["a"])
+    assert dict(conn.execute("SELECT key, accessed_at FROM embeddings")) == before
+    # 下一次写入时一起提交
+    cache.set_many(TORCH, ["c"], np.zeros((1, 4), dtype=np.float32))
+    key = cache.make_key(TORCH, "a")
+    after = dict(conn.execute("SELECT key, accessed_at FROM embeddings"))
+    assert after[key] > before[key]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache({"disk": {"path": str(tmp_path / "embeddings.sqlite"), "maxSizeMB": 1}})
+    texts = [f"text {i}" for i in range(300)]
+    for text in texts:
+        cache.set_many(TORCH, [text], np.zeros((1, 1024), dtype=np.float32))
+    assert cache._disk_size(cache._get_conn()) <= 1024 * 1024
+    assert cache.stats()["evictions"] > 0
+    assert cache.get_many(TORCH, texts[:1]) == [None]
+    assert cache.get_many(TORCH, texts[-1:])[0] is not None
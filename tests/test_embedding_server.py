@@ -0,0 +1,38 @@
+import json
+import threading
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding import server  # noqa: E402
+
+
+@pytest.fixture
+def address(monkeypatch):
+    monkeypatch.setattr(server, "_schedulers", {})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.EmbeddingRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/encode", {"model": "unknown/model", "texts": ["hello"]}),
+        ("/rerank", {"model": "unknown/model", "pairs": [["q", "p"]]}),
+    ],
+)
+def test_unknown_model_is_rejected(address, path, body):
+    connection = HTTPConnection(*address)
+    connection.request("POST", path, body=json.dumps(body))
+    response = connection.getresponse()
+    assert response.status == 400
+    assert json.loads(response.read())["message"]
+    assert server._schedulers == {}
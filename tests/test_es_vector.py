@@ -0,0 +1,50 @@
+import pytest
+
+from core.storage.vectorstore.elasticsearch import es_vector
+from core.storage.vectorstore.elasticsearch.es_vector import (
+    ElasticSearchConfig,
+    ElasticsearchVectorStore,
+)
+
+
+class CountingClient:
+    def __init__(self, count):
+        self.count_value = count
+        self.calls = 0
+
+    def count(self, index, query):
+        self.calls += 1
+        return {"count": self.count_value}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    client = CountingClient(5)
+    monkeypatch.setattr(ElasticsearchVectorStore, "_init_client", lambda self, config: client)
+    monkeypatch.setattr(es_vector, "_filter_counts", {})
+    config = ElasticSearchConfig(url="http://localhost:9200", username="elastic", password="secret")
+    return ElasticsearchVectorStore("test_index", config)
+
+
+def test_filter_count_is_cached(store):
+    for _ in range(3):
+        assert store._plan_vector_search(metadata_filter={"user_id": "u1"})["mode"] == "exact"
+    assert store._client.calls == 1
+    store._plan_vector_search(metadata_filter={"user_id": "u2"})
+    assert store._client.calls == 2
+
+
+def test_filter_count_expires(store, monkeypatch):
+    store._plan_vector_search(metadata_filter={"user_id": "u1"})
+    now = es_vector.time.time()
+    monkeypatch.setattr(es_vector.time, "time", lambda: now + store._client_config.filter_count_ttl + 1)
+    store._plan_vector_search(metadata_filter={"user_id": "u1"})
+    assert store._client.calls == 2
+
+
+def test_explicit_mode_skips_count(store):
+    plan = store._plan_vector_search(
+        metadata_filter={"user_id": "u1"}, search_params={"mode": "approximate"}
+    )
+    assert plan["mode"] == "approximate"
+    assert store._client.calls == 0
@@ -0,0 +1,62 @@
+"""
+Run the filter conformance cases through the native pre-filter of the configured vector
+store. Needs config.yaml in the current directory, the backend and the embedding model:
+
+    FILTER_CONFORMANCE_MODEL=BAAI/bge-base-zh-v1.5 python -m pytest tests/test_filters_live.py
+
+A scratch collection is created and removed afterwards.
+"""
+import os
+import uuid
+
+import pytest
+
+from core.storage.vectorstore.filters import UnsupportedFilterError
+from filter_cases import CASES, DOCUMENTS
+
+MODEL = os.environ.get("FILTER_CONFORMANCE_MODEL")
+
+pytestmark = pytest.mark.skipif(not MODEL, reason="FILTER_CONFORMANCE_MODEL is not set")
+
+
+@pytest.fixture(scope="module")
+def vector_store():
+    from app import app
+    from core.models.document import Document
+    from core.models.knowledge_base import KnowledgeBaseEntity
+    from core.storage.vectorstore.vector_store_factory import VectorStoreFactory
+    from core.utils.embedding import get_model_config
+
+    model_config = get_model_config(MODEL)
+    knowledge_base = KnowledgeBaseEntity(
+        id=str(uuid.uuid4()),
+        embedding_model=model_config["name"],
+        dimension=model_config["dimension"],
+    )
+    with app.app_context():
+        store = VectorStoreFactory(knowledgebase=knowledge_base)
+        store.create_collection(dimension=knowledge_base.dimension)
+        try:
+            store.add_texts(
+                [
+                    Document(page_content=f"conformance document {i}", metadata=dict(metadata, doc_id=str(i)))
+                    for i, metadata in enumerate(DOCUMENTS)
+                ]
+            )
+            yield store
+        finally:
+            store.delete()
+
+
+@pytest.mark.parametrize("raw, expected", CASES)
+def test_native_pre_filter(vector_store, raw, expected):
+    try:
+        hits = vector_store.search_by_query_vector(
+            vector_store.embed_query("conformance document"),
+            metadata_filter=raw,
+            top_k=len(DOCUMENTS),
+            search_params={"mode": "exact"},
+        )
+    except UnsupportedFilterError as e:
+        pytest.skip(str(e))
+    assert sorted(int(hit.page_content.rsplit(" ", 1)[1]) for hit in hits) == expected
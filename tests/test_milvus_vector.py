@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("pymilvus")
+
+from core.storage.vectorstore.milvus.milvus_vector import MilvusVector  # noqa: E402
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(("query", kwargs))
+        return [{"id": 1}]
+
+    def delete(self, **kwargs):
+        self.calls.append(("delete", kwargs))
+
+
+@pytest.fixture
+def store():
+    # 不连接 milvus，只验证发出的请求
+    store = MilvusVector.__new__(MilvusVector)
+    store._collection_name = "test_collection"
+    store._client = RecordingClient()
+    return store
+
+
+@pytest.mark.parametrize("value", [None, "", []])
+def test_delete_by_empty_metadata_value_deletes_nothing(store, value):
+    store.delete_by_metadata_field("document_id", value)
+    assert store._client.calls == []
+
+
+def test_delete_by_metadata_field(store):
+    store.delete_by_metadata_field("document_id", "d1")
+    assert [name for name, _ in store._client.calls] == ["query", "delete"]
+    assert store._client.calls[1][1]["pks"] == [1]
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+# 对比需要 PyTorch 模型和 onnxruntime，本地没有模型文件时跳过
+pytest.importorskip("FlagEmbedding")
+pytest.importorskip("onnxruntime")
+
+from core.config import MODELS_FOLDER  # noqa: E402
+
+EMBEDDING_MODEL = os.environ.get("ONNX_PARITY_EMBEDDING_MODEL", "BAAI/bge-base-zh-v1.5")
+RERANKER_MODEL = os.environ.get("ONNX_PARITY_RERANKER_MODEL", "BAAI/bge-reranker-large")
+
+
+def local_model_path(model_name):
+    model_path = os.path.join(MODELS_FOLDER, model_name.split("/")[-1])
+    if not os.path.exists(model_path):
+        pytest.skip(f"模型文件不存在：{model_path}")
+    return model_path
+
+
+@pytest.mark.parametrize("quantize", [None, "int8"])
+def test_embedding_onnx_parity(tmp_path, quantize):
+    from core.utils.embedding.onnx_backend import check_parity
+
+    model_config = {
+        "name": EMBEDDING_MODEL,
+        "model_path": local_model_path(EMBEDDING_MODEL),
+        "onnx": {"path": str(tmp_path), "quantize": quantize},
+    }
+    result = check_parity(model_config)
+    assert result["passed"], result
+
+
+@pytest.mark.parametrize("quantize", [None, "int8"])
+def test_reranker_onnx_parity(tmp_path, quantize):
+    from core.utils.reranker.onnx_backend import check_reranker_parity
+
+    model_path = local_model_path(RERANKER_MODEL)
+    result = check_reranker_parity(model_path, str(tmp_path), {"quantize": quantize})
+    assert result["passed"], result
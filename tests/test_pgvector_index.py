@@ -0,0 +1,19 @@
+from core.storage.vectorstore.pgvector.pgvector_store import (
+    MAX_IDENTIFIER_LENGTH,
+    vector_index_name,
+)
+
+
+def test_vector_index_name_fits_postgres_identifier():
+    # KnowledgeBaseEntity.gen_collection_name_by_id of a uuid
+    collection_name = "vector_index_0b7e2f52_3c1d_4a8e_9f2b_6d5c4b3a2e1f"
+    name = vector_index_name(collection_name)
+    assert len(name) <= MAX_IDENTIFIER_LENGTH
+    assert collection_name in name
+
+
+def test_vector_index_name_of_long_collection_is_hashed():
+    name = vector_index_name("x" * 100)
+    assert len(name) <= MAX_IDENTIFIER_LENGTH
+    assert name == vector_index_name("x" * 100)
+    assert name != vector_index_name("y" * 100)
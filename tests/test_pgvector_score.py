@@ -0,0 +1,26 @@
+import math
+
+import pytest
+
+from core.storage.vectorstore.pgvector.pgvector_store import PGVectorConfig, PGVectorStore
+
+
+def make_store(distance):
+    # 不连接数据库，只计算 score
+    store = PGVectorStore.__new__(PGVectorStore)
+    store._client_config = PGVectorConfig(url="postgresql://localhost/test", distance=distance)
+    return store
+
+
+def test_l2_score_matches_elasticsearch_l2_norm():
+    # Elasticsearch l2_norm: _score = 1 / (1 + l2^2)
+    assert make_store("l2")._score(2.0) == pytest.approx(1 / (1 + 2.0**2))
+
+
+@pytest.mark.parametrize("distance", ["l2", "cosine", "ip"])
+def test_score_is_higher_for_closer_vectors(distance):
+    store = make_store(distance)
+    # <=> 与 <-> 越小越近，<#> 返回负的内积
+    closer, farther = (-0.9, -0.1) if distance == "ip" else (0.1, 0.9)
+    assert store._score(closer) > store._score(farther)
+    assert not math.isnan(store._score(closer))
@@ -0,0 +1,32 @@
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding import scheduler  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    monkeypatch.setattr(
+        scheduler,
+        "embeddings_config",
+        {"batching": {"enabled": True}, "models": [{"name": "BAAI/bge-base-zh-v1.5"}]},
+    )
+    monkeypatch.setattr(scheduler, "_schedulers", {})
+
+
+def encode(model_name, texts):
+    return [[float(len(text))] for text in texts]
+
+
+def test_scheduler_is_shared_per_model():
+    first = scheduler.get_embedding_scheduler("BAAI/bge-base-zh-v1.5", encode)
+    assert scheduler.get_embedding_scheduler("BAAI/bge-base-zh-v1.5", encode) is first
+    assert first.submit(["abc"]).result(timeout=5) == [[3.0]]
+
+
+def test_unknown_model_does_not_start_a_scheduler():
+    with pytest.raises(Exception, match="不支持的 embedding 模型"):
+        scheduler.get_embedding_scheduler("unknown/model", encode)
+    assert scheduler._schedulers == {}
@@ -0,0 +1,90 @@
+import pytest
+
+from core.models.document import Document
+from core.storage.vectorstore.elasticsearch import es_vector
+from core.storage.vectorstore.elasticsearch.es_vector import (
+    ElasticSearchConfig,
+    ElasticsearchVectorStore,
+)
+from core.storage.vectorstore.search_cache import SearchResultCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+class FakeElasticsearch:
+    """Documents indexed without a refresh are not searchable yet, like ES"""
+
+    def __init__(self):
+        self.pending = {}
+        self.visible = {}
+        self.searches = 0
+
+    def index(self, actions, refresh=False):
+        for action in actions:
+            self.pending[action["_id"]] = action["_source"]
+        if refresh:
+            self.visible.update(self.pending)
+            self.pending.clear()
+
+    def search(self, index, body):
+        self.searches += 1
+        return {
+            "hits": {
+                "hits": [
+                    {"_id": pk, "_score": 1.0, "_source": source}
+                    for pk, source in self.visible.items()
+                ]
+            }
+        }
+
+
+@pytest.fixture
+def store(monkeypatch):
+    client = FakeElasticsearch()
+    monkeypatch.setattr(ElasticsearchVectorStore, "_init_client", lambda self, config: client)
+    monkeypatch.setattr(
+        es_vector.helpers, "bulk", lambda client, actions, refresh=False: client.index(actions, refresh)
+    )
+    config = ElasticSearchConfig(
+        url="http://localhost:9200", username="elastic", password="secret", batch_size=2
+    )
+    return ElasticsearchVectorStore("test_index", config)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SearchResultCache({"ttl": 300})
+    redis = FakeRedis()
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    return cache
+
+
+def test_write_then_search_is_not_cached_stale(store, cache):
+    def search():
+        return cache.get_or_search(
+            "kb", "fulltext", {"query": "hello"}, lambda: store.search_by_full_text("hello")
+        )
+
+    assert search() == []
+    texts = [Document(page_content=f"hello {i}", metadata={"doc_id": str(i)}) for i in range(5)]
+    store.add_texts(texts, embeddings=[[0.0]] * len(texts))
+    cache.invalidate("kb")
+
+    # 写入返回时所有批次都已可见
+    assert len(search()) == 5
+    searches = store._client.searches
+    assert len(search()) == 5
+    assert store._client.searches == searches
+    assert cache.stats()["hits"] == 1
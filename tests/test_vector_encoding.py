@@ -0,0 +1,28 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+# core.utils.embedding 导入时会加载 FlagEmbedding / torch
+pytest.importorskip("FlagEmbedding")
+
+from core.utils.embedding.client import decode_vectors, encode_vectors  # noqa: E402
+
+
+def test_base64_round_trip():
+    vectors = np.random.default_rng(0).standard_normal((3, 8)).astype(np.float32)
+    # 经过 JSON 序列化，与 /embeddings 的 vectorsBase64 输出一致
+    payload = json.loads(json.dumps(encode_vectors(vectors)))
+    assert payload["dtype"] == "float32"
+    assert payload["shape"] == [3, 8]
+    decoded = decode_vectors(payload)
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, vectors)
+
+
+def test_base64_is_little_endian_rows():
+    vectors = np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float64)
+    payload = encode_vectors(vectors)
+    data = np.frombuffer(base64.b64decode(payload["data"]), dtype="<f4")
+    np.testing.assert_array_equal(data, [1.0, 2.0, 3.0, 4.0])
@@ -11,6 +11,8 @@ else:
 
 from core.queue.queue_name import QUEUE_NAME_PROCESS_FILE
 from core.queue.sub import consume_task_forever
+from core.utils.embedding import preload_models
 
 if __name__ == "__main__":
+    preload_models()
     consume_task_forever(QUEUE_NAME_PROCESS_FILE)